@@ -0,0 +1,232 @@
+import os
+import json
+import time
+
+from .database import connection
+from .dataset_reader import iter_sentences
+
+EXPORT_BATCH_SIZE = 1000
+INSERT_BATCH_SIZE = 5000
+# Largest /annotations/bulk body accepted; the whole body is parsed in memory
+MAX_BULK_BYTES = int(os.environ.get("MAX_BULK_ANNOTATION_BYTES", str(32 * 1024 * 1024)))
+
+
+def normalize_annotation(record, default_bot_id=None):
+    """
+    Validate one annotation record and return the (bot_id, sentence, intent,
+    entities_json) row to insert. Accepts "sentence" or "text" for the
+    sentence. Raises ValueError with a reason for invalid records.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("annotation must be a JSON object")
+    bot_id = record.get("bot_id", default_bot_id)
+    if isinstance(bot_id, bool) or not isinstance(bot_id, int):
+        raise ValueError("bot_id must be an integer")
+    sentence = record.get("sentence", record.get("text"))
+    if not isinstance(sentence, str) or not sentence.strip():
+        raise ValueError("sentence is required")
+    intent = record.get("intent")
+    if intent is not None and not isinstance(intent, str):
+        raise ValueError("intent must be a string")
+    entities = record.get("entities") or []
+    if isinstance(entities, str):
+        try:
+            entities = json.loads(entities)
+        except json.JSONDecodeError:
+            raise ValueError("entities must be a JSON list")
+    if not isinstance(entities, list):
+        raise ValueError("entities must be a list")
+    return bot_id, sentence, intent, json.dumps(entities)
+
+
+def parse_records(body, content_type=""):
+    """Decode a bulk payload: a JSON list, {"annotations": [...]}, or JSONL (one object per line)."""
+    text = body.decode("utf-8") if isinstance(body, bytes) else body
+    if "json" in content_type and "ndjson" not in content_type and "jsonl" not in content_type:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("annotations")
+        if not isinstance(data, list):
+            raise ValueError("JSON payload must be a list or an object with an 'annotations' list")
+        return data
+    records = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        if line.strip():
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                records.append(ValueError(f"line {line_no} is not valid JSON"))
+    return records
+
+
+def insert_annotations(records, default_bot_id=None):
+    """
+    Validate `records` and insert the valid ones with a single executemany
+    in one transaction. Returns (inserted_count, rejected) where rejected
+    lists {"index": i, "reason": "..."}.
+    """
+    rows, rejected = [], []
+    for i, record in enumerate(records):
+        try:
+            if isinstance(record, Exception):
+                raise record
+            rows.append(normalize_annotation(record, default_bot_id))
+        except ValueError as e:
+            rejected.append({"index": i, "reason": str(e)})
+    if rows:
+        with connection() as conn:
+            conn.executemany("INSERT INTO annotations (bot_id, sentence, intent, entities) VALUES (?, ?, ?, ?)", rows)
+    return len(rows), rejected
+
+
+def iter_annotations(bot_id, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield a bot's annotations as dicts in id order. Rows are read in
+    keyset-paged batches (id > last id), each on its own pooled connection
+    that is released before any row is yielded, so a slow consumer such as a
+    streamed export holds neither a connection nor a read transaction.
+    """
+    last_id = 0
+    while True:
+        with connection() as conn:
+            rows = conn.execute("SELECT id, sentence, intent, entities FROM annotations "
+                                "WHERE bot_id=? AND id>? ORDER BY id LIMIT ?",
+                                (bot_id, last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        for ann_id, sentence, intent, entities in rows:
+            try:
+                entities = json.loads(entities) if entities else []
+            except json.JSONDecodeError:
+                entities = []
+            yield {"id": ann_id, "bot_id": bot_id, "sentence": sentence, "intent": intent, "entities": entities}
+        if len(rows) < batch_size:
+            return
+
+
+def export_jsonl(bot_id):
+    """Stream a bot's annotations as JSONL lines."""
+    for annotation in iter_annotations(bot_id):
+        yield json.dumps(annotation, ensure_ascii=False) + "\n"
+
+
+def entity_spans(sentence, entities):
+    """
+    Character spans for stored entities. Entities with start/end offsets are
+    used as-is; ones with only text are located in the sentence left to right.
+    """
+    spans, cursor = [], 0
+    for ent in entities:
+        if not isinstance(ent, dict) or not ent.get("label"):
+            continue
+        start, end = ent.get("start"), ent.get("end")
+        if not isinstance(start, int) or not isinstance(end, int):
+            text = ent.get("text") or ""
+            start = sentence.find(text, cursor) if text else -1
+            if start < 0:
+                continue
+            end = start + len(text)
+        spans.append((start, end, ent["label"]))
+        cursor = end
+    return spans
+
+
+def export_docbin(bot_id, lang="en"):
+    """
+    Build a spaCy DocBin of a bot's annotations. Rows are read in batches and
+    only the compact DocBin is held in memory; a DocBin is one compressed
+    blob, so it is returned as bytes rather than streamed row by row.
+    """
+    import spacy
+    from spacy.tokens import DocBin
+    from spacy.util import filter_spans
+
+    nlp = spacy.blank(lang)
+    doc_bin = DocBin(attrs=["ENT_IOB", "ENT_TYPE"], store_user_data=True)
+    for annotation in iter_annotations(bot_id):
+        doc = nlp.make_doc(annotation["sentence"] or "")
+        spans = [doc.char_span(s, e, label=label, alignment_mode="contract")
+                 for s, e, label in entity_spans(doc.text, annotation["entities"])]
+        doc.ents = filter_spans([span for span in spans if span is not None])
+        if annotation["intent"]:
+            doc.user_data["intent"] = annotation["intent"]
+        doc_bin.add(doc)
+    return doc_bin.to_bytes()
+
+
+def annotate_dataset(bot_id, dataset_path, batch_size=256, n_process=1, skip_existing=True, progress=None):
+    """
+    Pre-label a bot's whole dataset: sentences are read in chunks, run
+    through the NER pipeline with nlp.pipe and written to the annotations
+    table in bulk inserts of INSERT_BATCH_SIZE rows (intent left empty). Sentences the
+    bot already has annotations for are skipped unless skip_existing=False.
+
+    `progress`, if given, is called after every bulk insert with running totals.
+    Returns a summary with sentences/sec.
+    """
+    from .chatbot import annotate_sentences
+
+    existing = set()
+    if skip_existing:
+        with connection() as conn:
+            existing = {row[0] for row in conn.execute("SELECT sentence FROM annotations WHERE bot_id=?", (bot_id,))}
+
+    seen = 0
+
+    def pending():
+        nonlocal seen
+        for chunk in iter_sentences(dataset_path):
+            seen += len(chunk)
+            for text in chunk:
+                if text not in existing:
+                    existing.add(text)
+                    yield text
+
+    start = time.perf_counter()
+    inserted = 0
+    records = []
+    # One nlp.pipe stream over the whole dataset (so n_process workers start once),
+    # flushed to the database in bulk batches.
+    for result in annotate_sentences(pending(), batch_size=batch_size, n_process=n_process):
+        records.append({"bot_id": bot_id, "sentence": result["text"], "entities": result["entities"]})
+        if len(records) >= INSERT_BATCH_SIZE:
+            inserted += insert_annotations(records)[0]
+            records = []
+            if progress is not None:
+                elapsed = time.perf_counter() - start
+                progress({"inserted": inserted, "seconds": round(elapsed, 3),
+                          "sentences_per_sec": round(inserted / max(elapsed, 1e-9), 1)})
+    if records:
+        inserted += insert_annotations(records)[0]
+
+    elapsed = time.perf_counter() - start
+    return {"bot_id": bot_id, "sentences": seen, "inserted": inserted, "skipped": seen - inserted,
+            "seconds": round(elapsed, 3), "sentences_per_sec": round(seen / max(elapsed, 1e-9), 1)}
+
+
+def update_ner_model(bot_id, model_path, dataset_path=None, progress=None, **kwargs):
+    """
+    Resume training of a bot's saved NER model on the annotations added
+    since it was last trained, instead of retraining from scratch. The id
+    of the newest annotation trained on is kept as "annotations_through" in
+    the model's meta.json; older annotations and the bot's annotated
+    dataset serve as rehearsal examples (see chatbot.update_spacy_model).
+    Raises ValueError when there is nothing new to train on.
+    """
+    from .chatbot import update_spacy_model
+
+    with open(os.path.join(model_path, "meta.json"), encoding="utf-8") as f:
+        through = json.load(f).get("annotations_through", 0)
+    new, old, last_id = [], [], through
+    for annotation in iter_annotations(bot_id):
+        pair = (annotation["sentence"], entity_spans(annotation["sentence"], annotation["entities"]))
+        if annotation["id"] > through:
+            new.append(pair)
+            last_id = annotation["id"]
+        else:
+            old.append(pair)
+    if not new:
+        raise ValueError("No new annotations since the NER model was last trained")
+    return update_spacy_model(model_path, new, rehearsal=old, dataset_path=dataset_path, progress=progress,
+                              meta={"annotations_through": last_id}, **kwargs)
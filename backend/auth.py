@@ -1,20 +1,195 @@
+import os
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
 from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from .database import SessionLocal, User
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-tokens = {}  # in-memory token store
+from .database import connection
+
+PBKDF2_ITERATIONS = int(os.environ.get("PBKDF2_ITERATIONS", "600000"))
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "10000"))
+# How long a worker trusts a cached token before re-checking the sessions table,
+# so a logout handled by another worker takes effect within this many seconds
+SESSION_REVALIDATE_SECONDS = float(os.environ.get("SESSION_REVALIDATE_SECONDS", "30"))
+# Expired rows are deleted at startup and then by a login at most this often
+SESSION_PURGE_INTERVAL_SECONDS = float(os.environ.get("SESSION_PURGE_INTERVAL_SECONDS", "3600"))
+
+HASH_SCHEME = "pbkdf2_sha256"
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+
+# ---------- password hashing ----------
+def hash_password(password, iterations=None):
+    """PBKDF2-HMAC-SHA256 hash stored as 'pbkdf2_sha256$<iterations>$<salt>$<hash>'."""
+    iterations = iterations or PBKDF2_ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return "$".join((HASH_SCHEME, str(iterations), base64.b64encode(salt).decode(), base64.b64encode(digest).decode()))
 
-def get_db():
-    db = SessionLocal()
+
+def verify_password(password, stored):
+    """
+    Check `password` against a stored hash. Returns (ok, needs_rehash):
+    needs_rehash is True for legacy plaintext passwords and for hashes made
+    with a different iteration count than PBKDF2_ITERATIONS.
+    """
+    if not stored:
+        return False, False
+    if not stored.startswith(HASH_SCHEME + "$"):
+        # Accounts created before passwords were hashed
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")), True
     try:
-        yield db
-    finally:
-        db.close()
+        _, iterations, salt, expected = stored.split("$")
+        iterations = int(iterations)
+        salt, expected = base64.b64decode(salt), base64.b64decode(expected)
+    except ValueError:
+        return False, False
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return hmac.compare_digest(digest, expected), iterations != PBKDF2_ITERATIONS
+
+
+# ---------- sessions ----------
+def _token_key(token):
+    # Only a digest of the token is stored, so the sessions table cannot be replayed
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class SessionStore:
+    """
+    Bearer-token sessions persisted in the sessions table and cached in
+    memory. A cached token is validated with a dict lookup; the table is
+    queried on a cache miss (e.g. after a restart or eviction) and once the
+    entry is `revalidate` seconds old, so tokens revoked by other workers
+    stop working. The cache holds at most `max_entries` tokens, least
+    recently used evicted first.
+    """
+
+    def __init__(self, ttl=SESSION_TTL_SECONDS, max_entries=SESSION_CACHE_SIZE, revalidate=SESSION_REVALIDATE_SECONDS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.revalidate = revalidate
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "revalidated": 0, "purged": 0}
+        self._last_purge = 0.0
+
+    def create(self, username):
+        """Start a session and return (token, expires_at)."""
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        expires_at = now + self.ttl
+        with connection() as conn:
+            conn.execute("INSERT INTO sessions (token_hash, username, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                         (_token_key(token), username, now, expires_at))
+        self._remember(_token_key(token), username, expires_at)
+        if now - self._last_purge >= SESSION_PURGE_INTERVAL_SECONDS:
+            self.purge_expired()
+        return token, expires_at
+
+    def cached(self, token):
+        """Username for a token from the in-memory cache only (no database access), else None."""
+        key = _token_key(token)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            now = time.time()
+            if entry[1] <= now:
+                del self._cache[key]
+                self._stats["expired"] += 1
+                return None
+            if now - entry[2] >= self.revalidate:
+                del self._cache[key]
+                self._stats["revalidated"] += 1
+                return None
+            self._cache.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def get(self, token):
+        """Username for a valid token, else None; falls back to the sessions table on a cache miss."""
+        username = self.cached(token)
+        if username is not None:
+            return username
+        with self._lock:
+            self._stats["misses"] += 1
+        key = _token_key(token)
+        now = time.time()
+        with connection() as conn:
+            row = conn.execute("SELECT username, expires_at FROM sessions WHERE token_hash=?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def revoke(self, token):
+        key = _token_key(token)
+        with self._lock:
+            self._cache.pop(key, None)
+        with connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE token_hash=?", (key,))
+
+    def purge_expired(self):
+        """Drop expired sessions from the table and the cache; returns the number of rows deleted."""
+        now = time.time()
+        with self._lock:
+            self._last_purge = now
+            for key in [k for k, (_, expires_at, _) in self._cache.items() if expires_at <= now]:
+                del self._cache[key]
+        with connection() as conn:
+            deleted = conn.execute("DELETE FROM sessions WHERE expires_at<=?", (now,)).rowcount
+        with self._lock:
+            self._stats["purged"] += deleted
+        return deleted
+
+    def _remember(self, key, username, expires_at):
+        with self._lock:
+            self._cache[key] = (username, expires_at, time.time())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"cached": len(self._cache), **self._stats}
+
+
+sessions = SessionStore()
+
+
+def authenticate(username, password):
+    """
+    Verify a login and return True on success. Legacy plaintext passwords
+    and hashes with an outdated cost factor are re-hashed on the way.
+    """
+    with connection() as conn:
+        row = conn.execute("SELECT password FROM users WHERE username=?", (username,)).fetchone()
+    if row is None:
+        # Spend the same time as a real check so usernames cannot be probed by timing
+        hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), b"\0" * 16, PBKDF2_ITERATIONS)
+        return False
+    ok, needs_rehash = verify_password(password, row[0])
+    if ok and needs_rehash:
+        with connection() as conn:
+            conn.execute("UPDATE users SET password=? WHERE username=?", (hash_password(password), username))
+    return ok
+
 
-def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)):
-    username = tokens.get(token)
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """FastAPI dependency: the username behind the request's bearer token."""
+    username = sessions.cached(token)
+    if username is None:
+        username = await run_in_threadpool(sessions.get, token)
     if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    user = db.query(User).filter(User.username == username).first()
-    return user
+        raise HTTPException(status_code=401, detail="Invalid or expired token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return username
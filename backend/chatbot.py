@@ -1,32 +1,308 @@
-import pandas as pd
+import os
+import re
+import copy
+import json
+import time
+import random
+import shutil
+import hashlib
+import tempfile
 import spacy
 import numpy as np
+from spacy.training import Example
+from spacy.util import compounding, fix_random_seed, minibatch
+from .nlp_registry import NER_MODEL, VECTORS_MODEL, registry
+from .dataset_reader import DatasetError, load_training_docs, make_doc
+from .dataset_store import dataset_store
+from .compact import EMBEDDING_DTYPE, PackedStrings, QuantizedMatrix
+from .metrics import timed
+from .vector_index import INDEX_KIND, _normalize_rows, build_index, load_index
+
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "256"))
+EMBED_N_PROCESS = int(os.environ.get("EMBED_N_PROCESS", "1"))
+
+# Trained models are cached on disk under <store>/v<ARTIFACT_VERSION>/<model>/<dataset sha256>/
+MODEL_STORE_DIR = os.environ.get("MODEL_STORE_DIR", os.path.join("backend", "models", "chatbot"))
+ARTIFACT_VERSION = 2
+
+FALLBACK_ANSWER = "Sorry, I didn't quite get that. Could you rephrase?"
+
+
+def vectors_model_version():
+    """
+    Version of the vectors model, recorded in saved artifacts. Read from the
+    installed package or the model directory's meta.json, so training through
+    the inference pool never loads the pipeline into this process.
+    """
+    from spacy.util import get_package_version, is_package, load_meta
+
+    if is_package(VECTORS_MODEL):
+        return get_package_version(VECTORS_MODEL)
+    meta_path = os.path.join(VECTORS_MODEL, "meta.json")
+    return load_meta(meta_path).get("version") if os.path.exists(meta_path) else None
+
+
+def embed_texts(texts, batch_size=EMBED_BATCH_SIZE, n_process=EMBED_N_PROCESS):
+    """
+    Normalized embedding matrix with one row per text.
+
+    Texts are streamed through nlp.pipe in batches; identical texts are
+    embedded once and their row is reused. The pipeline is pinned in the
+    registry until the last batch is done.
+    """
+    texts = list(texts)
+    unique = list(dict.fromkeys(texts))
+    with registry.using(VECTORS_MODEL, profile="vectors") as nlp:
+        vecs = np.zeros((len(unique), nlp.vocab.vectors_length), dtype=np.float32)
+        with timed("embed"):
+            for i, doc in enumerate(nlp.pipe(unique, batch_size=batch_size, n_process=n_process)):
+                vecs[i] = doc.vector
+    vecs = _normalize_rows(vecs)
+    if len(unique) == len(texts):
+        return vecs
+    position = {text: i for i, text in enumerate(unique)}
+    return vecs[[position[text] for text in texts]]
 
-nlp = spacy.load("en_core_web_md")
 
 class ChatBotModel:
-    def __init__(self, dataset_path):
-        self.df = pd.read_csv(dataset_path)
-        self.questions = self.df['question'].tolist()
-        self.answers = self.df['answer'].tolist()
-        self.question_vecs = [nlp(q).vector for q in self.questions]
+    """
+    Retrieval chatbot: answers with the stored answer whose question is most
+    similar to the user input.
+
+    Question embeddings are L2-normalized and stored as one matrix of
+    `embedding_dtype` (float32, float16 or int8 with per-row scales, see
+    compact.QuantizedMatrix), searched through a vector index (see
+    vector_index.py): `index` selects "exact", "ivf" or "auto", and
+    `index_params` tunes it. Questions and answers are packed into UTF-8
+    buffers (compact.PackedStrings). Matches scoring at or below
+    `min_score` are discarded and `fallback_answer` is returned when
+    nothing is left.
+
+    `embed`, if given, embeds the questions instead of embed_texts in this
+    process (the API passes InferencePool.embed_texts).
+    """
 
+    def __init__(self, dataset_path, min_score=0.0, fallback_answer=FALLBACK_ANSWER,
+                 batch_size=EMBED_BATCH_SIZE, n_process=EMBED_N_PROCESS, index=INDEX_KIND, index_params=None,
+                 embedding_dtype=EMBEDDING_DTYPE, embed=None):
+        questions = dataset_store.text_column(dataset_path, 'question')
+        self.questions = PackedStrings.from_list(questions)
+        self.answers = PackedStrings.from_list(dataset_store.text_column(dataset_path, 'answer'))
+        self.min_score = min_score
+        self.fallback_answer = fallback_answer
+        if embed is not None:
+            vectors = embed(questions)
+        else:
+            vectors = embed_texts(questions, batch_size=batch_size, n_process=n_process)
+        self.question_matrix = QuantizedMatrix.quantize(vectors, embedding_dtype)
+        self.index = build_index(self.question_matrix, index, **(index_params or {}))
+        self.meta = {}
+
+    # ---------- persistence ----------
+    def save(self, path, **meta):
+        """
+        Write the model to directory `path` as .npy arrays (embeddings,
+        per-row scales, packed strings and their offsets) plus meta.json.
+
+        The directory is written under a temporary name and renamed into
+        place, so readers never see a half-written artifact.
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        try:
+            self.question_matrix.save(tmp_dir, "vectors")
+            self.questions.save(tmp_dir, "questions")
+            self.answers.save(tmp_dir, "answers")
+            self.index.save(tmp_dir)
+            self.meta = {
+                "artifact_version": ARTIFACT_VERSION,
+                "rows": len(self.questions),
+                "dim": int(self.question_matrix.shape[1]),
+                "embedding_dtype": self.question_matrix.dtype,
+                "index": {"kind": self.index.kind, "params": self.index.params()},
+                "created_at": time.time(),
+                **meta,
+            }
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(self.meta, f, indent=2)
+            try:
+                os.rename(tmp_dir, path)
+            except OSError:
+                # Another worker saved the same artifact first; keep theirs.
+                if not os.path.exists(os.path.join(path, "meta.json")):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return path
+
+    @classmethod
+    def load(cls, path, min_score=0.0, fallback_answer=FALLBACK_ANSWER, index=INDEX_KIND, index_params=None):
+        """
+        Load a saved model. All arrays (embeddings and packed strings) are
+        memory-mapped read-only, so every worker process loading the same
+        artifact shares their pages.
+        """
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("artifact_version") != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported chatbot artifact version: {meta.get('artifact_version')}")
+        model = cls.__new__(cls)
+        model.question_matrix = QuantizedMatrix.load(path, "vectors")
+        model.questions = PackedStrings.load(path, "questions")
+        model.answers = PackedStrings.load(path, "answers")
+        model.index = load_index(path, model.question_matrix, meta.get("index"), index, **(index_params or {}))
+        model.min_score = min_score
+        model.fallback_answer = fallback_answer
+        model.meta = meta
+        return model
+
+    def nbytes(self):
+        """Memory held by this model: embeddings, index and packed strings."""
+        total = self.question_matrix.nbytes + self.questions.nbytes + self.answers.nbytes
+        for name in ("centroids", "order", "offsets"):
+            total += getattr(getattr(self.index, name, None), "nbytes", 0)
+        return int(total)
+
+    def bytes_per_question(self):
+        return round(self.nbytes() / max(1, len(self.questions)), 1)
+
+    def _embed(self, texts):
+        return embed_texts(texts, n_process=1)
+
+    def revised(self, keep=None, questions=(), answers=(), embed=None):
+        """
+        Copy of the model holding the rows at positions `keep` (all when
+        None) followed by the new question/answer pairs. Only the new
+        questions are embedded and the index is updated in place of a
+        rebuild, so small edits cost milliseconds instead of a retrain.
+        The original model is left untouched for requests still using it.
+        `embed` is as in the constructor.
+        """
+        questions, answers = list(questions), list(answers)
+        if len(questions) != len(answers):
+            raise ValueError("questions and answers must have the same length")
+        matrix, kept_questions, kept_answers = self.question_matrix, self.questions, self.answers
+        if keep is not None:
+            keep = np.asarray(keep, dtype=np.intp)
+            matrix, kept_questions, kept_answers = matrix.take(keep), kept_questions.take(keep), kept_answers.take(keep)
+        if questions:
+            matrix = matrix.append((embed or self._embed)(questions))
+        model = copy.copy(self)
+        model.questions = kept_questions.extend(questions)
+        model.answers = kept_answers.extend(answers)
+        model.question_matrix = matrix
+        model.index = self.index.updated(matrix, keep)
+        model.meta = {}
+        return model
+
+    def search_many(self, user_inputs, top_k=3):
+        """Rank stored answers for every input; returns one list of matches per input."""
+        user_inputs = list(user_inputs)
+        if not user_inputs:
+            return []
+        if not self.questions:
+            return [[] for _ in user_inputs]
+        return self.search_vectors(self._embed(user_inputs), top_k)
+
+    @timed("vector_search")
+    def search_vectors(self, queries, top_k=3):
+        """Like search_many, for inputs already embedded with embed_texts (one row per input)."""
+        if not self.questions:
+            return [[] for _ in range(len(queries))]
+        indices, scores = self.index.search(queries, top_k)
+        results = []
+        for row_indices, row_scores in zip(indices, scores):
+            results.append([
+                {"question": self.questions[i], "answer": self.answers[i], "score": float(score)}
+                for i, score in zip(row_indices, row_scores) if i >= 0 and score > self.min_score
+            ])
+        return results
+
+    def search(self, user_input, top_k=3):
+        """Top-k matches for a single input as dicts of question, answer and score."""
+        return self.search_many([user_input], top_k)[0]
+
+    def get_responses(self, user_inputs):
+        """Best answer for each input, scored together in one batch."""
+        return [matches[0]["answer"] if matches else self.fallback_answer
+                for matches in self.search_many(user_inputs, top_k=1)]
+
+    @timed("chat_get_response")
     def get_response(self, user_input):
-        user_vec = nlp(user_input).vector
-        sims = [self._cosine_similarity(user_vec, qv) for qv in self.question_vecs]
-        best_idx = sims.index(max(sims))
-        return self.answers[best_idx]
+        return self.get_responses([user_input])[0]
+
+
+def dataset_hash(dataset_path, chunk_size=1 << 20):
+    """SHA-256 of the dataset file contents."""
+    digest = hashlib.sha256()
+    with open(dataset_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_path(dataset_path, store_dir=MODEL_STORE_DIR, model_name=VECTORS_MODEL):
+    """Directory holding the trained model for this dataset content and vectors model."""
+    safe_name = re.sub(r"[^\w.-]+", "_", model_name).strip("_")
+    return os.path.join(store_dir, f"v{ARTIFACT_VERSION}", safe_name, dataset_hash(dataset_path))
+
+
+def remove_artifact(sha256, store_dir=MODEL_STORE_DIR, model_name=VECTORS_MODEL):
+    """Delete the saved model for dataset contents `sha256`; models already loaded from it keep working."""
+    safe_name = re.sub(r"[^\w.-]+", "_", model_name).strip("_")
+    shutil.rmtree(os.path.join(store_dir, f"v{ARTIFACT_VERSION}", safe_name, sha256), ignore_errors=True)
 
-    def _cosine_similarity(self, v1, v2):
-        return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2) + 1e-9)
 
-def train_bot(dataset_path):
-    return ChatBotModel(dataset_path)
+def train_bot(dataset_path, store_dir=MODEL_STORE_DIR, min_score=0.0, fallback_answer=FALLBACK_ANSWER,
+              index=INDEX_KIND, index_params=None, **kwargs):
+    """
+    Return a trained ChatBotModel for `dataset_path`.
+
+    If an artifact for the same dataset contents and vectors model already
+    exists it is memory-mapped instead of re-embedding; otherwise the model
+    is trained and saved. Pass store_dir=None to skip the on-disk cache.
+    Other keyword arguments (e.g. `embed`) go to ChatBotModel.
+    """
+    options = dict(min_score=min_score, fallback_answer=fallback_answer, index=index, index_params=index_params)
+    if store_dir is None:
+        return ChatBotModel(dataset_path, **options, **kwargs)
+    path = artifact_path(dataset_path, store_dir)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        model = ChatBotModel(dataset_path, **options, **kwargs)
+        model.save(path, model_name=VECTORS_MODEL, model_version=vectors_model_version(),
+                   dataset_sha256=os.path.basename(path))
+    return ChatBotModel.load(path, **options)
+
+
+def revise_bot(model, dataset_path, keep=None, questions=(), answers=(), store_dir=MODEL_STORE_DIR,
+               index=INDEX_KIND, index_params=None, embed=None):
+    """
+    Model for `dataset_path`, a revision of the dataset `model` was trained
+    on that keeps the rows at positions `keep` and appends the given
+    question/answer pairs. Built with ChatBotModel.revised (only the new
+    questions are embedded) and saved as the dataset's artifact, so a
+    restart loads it like one made by train_bot.
+    """
+    options = dict(min_score=model.min_score, fallback_answer=model.fallback_answer, index=index,
+                   index_params=index_params)
+    if store_dir is None:
+        return model.revised(keep, questions, answers, embed=embed)
+    path = artifact_path(dataset_path, store_dir)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        revised = model.revised(keep, questions, answers, embed=embed)
+        removed = 0 if keep is None else len(model.questions) - len(keep)
+        revised.save(path, model_name=VECTORS_MODEL, model_version=vectors_model_version(),
+                     dataset_sha256=os.path.basename(path), revised_from=model.meta.get("dataset_sha256"),
+                     rows_added=len(questions), rows_removed=removed)
+    return ChatBotModel.load(path, **options)
+
 
-def get_bot_response(model, user_input):
+def get_bot_response(model, user_input, top_k=None):
+    if top_k:
+        return model.search(user_input, top_k)
     return model.get_response(user_input)
-import random
-from spacy.training import Example
+
 
 # ---------- NEW FUNCTION: Annotate a sentence ----------
 def annotate_sentence(sentence):
@@ -34,70 +310,221 @@ def annotate_sentence(sentence):
     Analyzes a sentence using spaCy and returns detected entities.
     Example:
       Input: "Book flight from Delhi to Jaipur on Jan 15th"
-      Output: {"text": ..., "entities": [{"text": "Delhi", "label": "GPE"}, ...]}
+      Output: {"text": ..., "entities": [{"text": "Delhi", "label": "GPE", "start": 17, "end": 22}, ...]}
     """
-    nlp = spacy.load("en_core_web_sm")
-    doc = nlp(sentence)
-    entities = [{"text": ent.text, "label": ent.label_} for ent in doc.ents]
+    with registry.using(NER_MODEL, profile="ner") as nlp:
+        with timed("ner"):
+            doc = nlp(sentence)
+    entities = [{"text": ent.text, "label": ent.label_, "start": ent.start_char, "end": ent.end_char}
+                for ent in doc.ents]
     return {"text": sentence, "entities": entities}
 
 
+def annotate_sentences(sentences, batch_size=256, n_process=1):
+    """
+    Batched version of annotate_sentence: streams `sentences` through
+    nlp.pipe and yields one {"text", "entities"} dict per sentence, in order.
+    The pipeline stays pinned in the registry until the generator is done.
+    """
+    with registry.using(NER_MODEL, profile="ner") as nlp:
+        for doc in nlp.pipe(sentences, batch_size=batch_size, n_process=n_process):
+            entities = [{"text": ent.text, "label": ent.label_, "start": ent.start_char, "end": ent.end_char}
+                        for ent in doc.ents]
+            yield {"text": doc.text, "entities": entities}
+
+
 # ---------- NEW FUNCTION: Train spaCy model on annotated dataset ----------
-def train_spacy_model(dataset_path):
+def train_spacy_model(dataset_path, output_path=None, progress=None, max_epochs=30, patience=3,
+                      dev_fraction=0.2, batch_start=4.0, batch_stop=32.0, batch_compound=1.001,
+                      dropout=0.2, seed=0):
     """
-    Trains a simple spaCy NER model from an annotated dataset (CSV/JSON).
+    Trains a simple spaCy NER model from an annotated dataset (CSV/JSON/JSONL).
     The dataset must have columns: 'text' and 'entities',
     where entities is a list of tuples [(start, end, label), ...].
+    Rows that fail validation are skipped and reported in the metrics
+    (see dataset_reader.read_docs).
+
+    Examples are built once and trained in minibatches whose size compounds
+    from `batch_start` to `batch_stop`. A `dev_fraction` of the data is held
+    out and scored after every epoch; the best epoch by entity F1 is saved
+    to `output_path` (default backend/models/trained_model), and training
+    stops once F1 has not improved for `patience` epochs.
+
+    `progress`, if given, is called after every epoch with a dict of
+    epoch, losses, precision/recall/f1, examples_per_sec and seconds; it may
+    raise to abort training.
+
+    Returns (model_path, metrics) where metrics holds the best epoch's
+    precision, recall and f1 (0-1).
+    """
+    # Initialize model
+    fix_random_seed(seed)
+    random.seed(seed)
+    nlp = spacy.blank("en")
+    nlp.add_pipe("ner")
+
+    # Parse and validate the dataset (cached as a DocBin after the first run)
+    docs, rejected = load_training_docs(dataset_path, nlp)
+    if not docs:
+        raise ValueError("No valid annotated data found for training")
+
+    # Build every Example once; labels are picked up by nlp.initialize
+    examples = [Example(nlp.make_doc(doc.text), doc) for doc in docs]
+    random.shuffle(examples)
+    n_dev = int(len(examples) * dev_fraction) if len(examples) >= 5 else 0
+    dev_examples, train_examples = examples[:n_dev], examples[n_dev:]
+    # Too little data for a held-out split: score on the training data instead
+    eval_examples = dev_examples or train_examples
+
+    model_path = output_path or os.path.join("backend", "models", "trained_model")
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+
+    optimizer = nlp.initialize(lambda: train_examples)
+    batch_sizes = compounding(batch_start, batch_stop, batch_compound)
+    best = {"precision": 0.0, "recall": 0.0, "f1": -1.0, "epoch": 0}
+    epochs_without_improvement = 0
+    for epoch in range(1, max_epochs + 1):
+        random.shuffle(train_examples)
+        losses = {}
+        start = time.perf_counter()
+        for batch in minibatch(train_examples, size=batch_sizes):
+            nlp.update(batch, drop=dropout, sgd=optimizer, losses=losses)
+        seconds = time.perf_counter() - start
+
+        # nlp.evaluate runs the pipeline over the dev docs and scores them with spaCy's Scorer
+        with nlp.use_params(optimizer.averages):
+            scores = nlp.evaluate(eval_examples)
+        metrics = {"precision": float(scores.get("ents_p") or 0.0), "recall": float(scores.get("ents_r") or 0.0),
+                   "f1": float(scores.get("ents_f") or 0.0)}
+        event = {"epoch": epoch, "losses": {k: float(v) for k, v in losses.items()},
+                 **{k: round(v, 4) for k, v in metrics.items()}, "seconds": round(seconds, 3),
+                 "examples_per_sec": round(len(train_examples) / max(seconds, 1e-9), 1)}
+        if progress is None:
+            print(f"Epoch {epoch} Losses: {event['losses']} P/R/F: "
+                  f"{event['precision']}/{event['recall']}/{event['f1']}")
+        else:
+            progress(event)
+
+        if metrics["f1"] > best["f1"]:
+            best = {**metrics, "epoch": epoch}
+            epochs_without_improvement = 0
+            # Save the best checkpoint
+            with nlp.use_params(optimizer.averages):
+                nlp.to_disk(model_path)
+        else:
+            epochs_without_improvement += 1
+            if epochs_without_improvement >= patience:
+                break
+
+    metrics = {
+        "precision": round(best["precision"], 4),
+        "recall": round(best["recall"], 4),
+        "f1": round(best["f1"], 4),
+        "best_epoch": best["epoch"],
+        "epochs": epoch,
+        "train_examples": len(train_examples),
+        "dev_examples": len(dev_examples),
+        "rejected_rows": len(rejected),
+        "rejected_sample": rejected[:20],
+    }
+    return model_path, metrics
+
+
+# ---------- Resume NER training on new annotations ----------
+def update_spacy_model(model_path, examples, rehearsal=(), dataset_path=None, output_path=None, progress=None,
+                       epochs=5, rehearsal_ratio=2.0, batch_size=8, dropout=0.2, seed=0, meta=None):
     """
-    import os
-    import pandas as pd
+    Continue training the NER model saved at `model_path` on new annotated
+    `examples` ((text, [(start, end, label), ...]) pairs) instead of
+    starting again from a blank pipeline. Labels the model has not seen
+    are added to it.
 
-    # Load dataset
-    df = pd.read_csv(dataset_path) if dataset_path.endswith(".csv") else pd.read_json(dataset_path)
+    So the model does not forget what it already knows, every epoch also
+    trains on a fresh random sample of rehearsal_ratio * len(examples)
+    earlier examples, drawn from `rehearsal` and from the annotated dataset
+    at `dataset_path` (if it has text/entities columns). A slice of that
+    pool is held out and scored after every epoch as "retained" P/R/F.
 
-    # Validate dataset
-    if "text" not in df.columns or "entities" not in df.columns:
-        raise ValueError("Dataset must have 'text' and 'entities' columns")
+    The model is saved to `output_path` (default: over `model_path`) with
+    `meta` merged into its meta.json. `progress` is called after every
+    epoch as in train_spacy_model. Returns (model_path, metrics).
+    """
+    fix_random_seed(seed)
+    rng = random.Random(seed)
+    nlp = spacy.load(model_path)
+    ner = nlp.get_pipe("ner")
 
-    TRAIN_DATA = []
-    for _, row in df.iterrows():
-        if isinstance(row["entities"], str):
-            # Convert from string representation to list
+    def to_examples(pairs):
+        built, rejected = [], 0
+        for text, spans in pairs:
             try:
-                row["entities"] = eval(row["entities"])
-            except:
-                continue
-        TRAIN_DATA.append((row["text"], {"entities": row["entities"]}))
+                built.append(Example(nlp.make_doc(text), make_doc(nlp, text, spans, alignment_mode="contract")))
+            except ValueError:
+                rejected += 1
+        return built, rejected
 
-    if not TRAIN_DATA:
-        raise ValueError("No valid annotated data found for training")
+    new_examples, rejected = to_examples(examples)
+    if not new_examples:
+        raise ValueError("No valid new annotations to train on")
+    pool, _ = to_examples(rehearsal)
+    if dataset_path is not None:
+        try:
+            docs, _ = load_training_docs(dataset_path, nlp)
+        except DatasetError:
+            docs = []  # not an annotated dataset; rehearse on earlier annotations only
+        pool.extend(Example(nlp.make_doc(doc.text), doc) for doc in docs)
+    rng.shuffle(pool)
+    n_held_out = min(len(pool) // 5, 500)
+    held_out, pool = pool[:n_held_out], pool[n_held_out:]
 
-    # Initialize model
-    nlp = spacy.blank("en")
-    ner = nlp.add_pipe("ner")
+    known = set(ner.labels)
+    added = sorted({ent.label_ for eg in new_examples for ent in eg.reference.ents} - known)
+    for label in added:
+        ner.add_label(label)
+    optimizer = nlp.resume_training()
 
-    # Add entity labels
-    for _, annotations in TRAIN_DATA:
-        for ent in annotations["entities"]:
-            ner.add_label(ent[2])
+    def score(evaluation):
+        if not evaluation:
+            return {"precision": None, "recall": None, "f1": None}
+        with nlp.use_params(optimizer.averages):
+            scores = nlp.evaluate(evaluation)
+        return {"precision": round(float(scores.get("ents_p") or 0.0), 4),
+                "recall": round(float(scores.get("ents_r") or 0.0), 4), "f1": round(float(scores.get("ents_f") or 0.0), 4)}
 
-    # Train model
-    optimizer = nlp.begin_training()
-    for i in range(10):  # 10 epochs
-        random.shuffle(TRAIN_DATA)
+    n_rehearse = min(int(len(new_examples) * rehearsal_ratio), len(pool))
+    for epoch in range(1, epochs + 1):
+        train_examples = new_examples + rng.sample(pool, n_rehearse)
+        rng.shuffle(train_examples)
         losses = {}
-        for text, annotations in TRAIN_DATA:
-            doc = nlp.make_doc(text)
-            example = Example.from_dict(doc, annotations)
-            nlp.update([example], drop=0.2, sgd=optimizer, losses=losses)
-        print(f"Epoch {i+1} Losses: {losses}")
-
-    # Save model
-    model_dir = "backend/models"
-    os.makedirs(model_dir, exist_ok=True)
-    model_path = os.path.join(model_dir, "trained_model")
-    nlp.to_disk(model_path)
-
-    # Dummy accuracy (for now)
-    accuracy = round(100 - losses.get("ner", 0) / len(TRAIN_DATA), 2)
-    return model_path, accuracy
+        start = time.perf_counter()
+        for batch in minibatch(train_examples, size=batch_size):
+            nlp.update(batch, drop=dropout, sgd=optimizer, losses=losses)
+        seconds = time.perf_counter() - start
+        new_scores, retained = score(new_examples), score(held_out)
+        event = {"epoch": epoch, "losses": {k: float(v) for k, v in losses.items()}, **new_scores,
+                 "retained_f1": retained["f1"], "seconds": round(seconds, 3),
+                 "examples_per_sec": round(len(train_examples) / max(seconds, 1e-9), 1)}
+        if progress is None:
+            print(f"Epoch {epoch} Losses: {event['losses']} P/R/F: "
+                  f"{event['precision']}/{event['recall']}/{event['f1']} retained F: {event['retained_f1']}")
+        else:
+            progress(event)
+
+    model_path = output_path or model_path
+    nlp.meta.update(meta or {})
+    with nlp.use_params(optimizer.averages):
+        nlp.to_disk(model_path)
+
+    metrics = {
+        **new_scores,
+        "retained_precision": retained["precision"],
+        "retained_recall": retained["recall"],
+        "retained_f1": retained["f1"],
+        "epochs": epochs,
+        "new_examples": len(new_examples),
+        "rehearsal_examples": n_rehearse,
+        "held_out_examples": len(held_out),
+        "labels_added": added,
+        "rejected_rows": rejected,
+    }
+    return model_path, metrics
@@ -0,0 +1,157 @@
+import os
+
+import numpy as np
+
+# Storage type of chatbot embedding matrices: "float32", "float16", or "int8"
+# (scalar-quantized with one float32 scale per row). int8 is 4x smaller than
+# float32 and searches about as fast; float16 halves memory but NumPy's
+# float16 -> float32 conversion makes exact search several times slower.
+EMBEDDING_DTYPE = os.environ.get("EMBEDDING_DTYPE", "int8")
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+
+class QuantizedMatrix:
+    """
+    Embedding matrix stored as float32, float16 or int8. int8 rows carry a
+    float32 scale each (row = data * scale, scale = max |value| / 127), so
+    every row keeps its own dynamic range.
+
+    Indexing returns dequantized float32 rows, so the vector indexes use it
+    like an ndarray and only ever expand the rows they are reading.
+    """
+
+    def __init__(self, data, scales=None):
+        self.data = data
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, matrix, dtype=EMBEDDING_DTYPE):
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unknown embedding dtype: {dtype}")
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if dtype != "int8":
+            return cls(matrix.astype(dtype, copy=False))
+        scales = (np.abs(matrix).max(axis=1) / 127).astype(np.float32) if len(matrix) else np.zeros(0, np.float32)
+        safe = np.where(scales > 0, scales, 1.0)
+        return cls(np.rint(matrix / safe[:, None]).astype(np.int8), scales)
+
+    @property
+    def dtype(self):
+        return str(self.data.dtype)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        rows = np.asarray(self.data[index], dtype=np.float32)
+        if self.scales is not None:
+            rows = rows * np.asarray(self.scales[index])[..., None]
+        return rows
+
+    def dot(self, queries, index=slice(None)):
+        """
+        queries @ self[index].T. Scales are applied to the scores rather
+        than to the rows, so the rows are only converted to float32. Rows
+        and queries are unit vectors, so scores are clipped to [-1, 1]:
+        rounding to int8 or float16 can push a cosine just past 1.
+        """
+        scores = queries @ np.asarray(self.data[index], dtype=np.float32).T
+        if self.scales is not None:
+            scores *= self.scales[index]
+        return np.clip(scores, -1.0, 1.0, out=scores)
+
+    def __array__(self, dtype=None, copy=None):
+        rows = self[:]
+        return rows if dtype is None else rows.astype(dtype)
+
+    def take(self, indices):
+        """Matrix of the rows at `indices`, still quantized."""
+        return QuantizedMatrix(self.data[indices], self.scales[indices] if self.scales is not None else None)
+
+    def append(self, rows):
+        """Matrix with float32 `rows` quantized to this matrix's dtype and appended."""
+        extra = QuantizedMatrix.quantize(np.asarray(rows, dtype=np.float32).reshape(-1, self.shape[1]), self.dtype)
+        scales = np.concatenate([self.scales, extra.scales]) if self.scales is not None else None
+        return QuantizedMatrix(np.concatenate([np.asarray(self.data), extra.data]), scales)
+
+    def save(self, path, name):
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(self.data))
+        if self.scales is not None:
+            np.save(os.path.join(path, f"{name}_scales.npy"), self.scales)
+
+    @classmethod
+    def load(cls, path, name, mmap_mode="r"):
+        scales_path = os.path.join(path, f"{name}_scales.npy")
+        scales = np.load(scales_path, mmap_mode=mmap_mode) if os.path.exists(scales_path) else None
+        return cls(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode), scales)
+
+
+class PackedStrings:
+    """
+    Read-only sequence of strings kept as one UTF-8 byte buffer plus an
+    offsets array (string i is buffer[offsets[i]:offsets[i + 1]]). Costs
+    the text itself plus 8 bytes per string, instead of a str object (~50
+    bytes of overhead) each, and can be memory-mapped from disk.
+    """
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.offsets.nbytes
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _raw(self, i):
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("string index out of range")
+        return self._raw(i).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._raw(i).decode("utf-8")
+
+    def take(self, indices):
+        """Strings at `indices`, packed, without decoding them."""
+        raw = [self._raw(i) for i in indices]
+        offsets = np.zeros(len(raw) + 1, dtype=np.int64)
+        np.cumsum([len(r) for r in raw], out=offsets[1:])
+        return PackedStrings(np.frombuffer(b"".join(raw), dtype=np.uint8), offsets)
+
+    def extend(self, strings):
+        """These strings followed by `strings`, packed."""
+        extra = PackedStrings.from_list(strings)
+        return PackedStrings(np.concatenate([np.asarray(self.buffer), extra.buffer]),
+                             np.concatenate([self.offsets, extra.offsets[1:] + self.offsets[-1]]))
+
+    def save(self, path, name):
+        np.save(os.path.join(path, f"{name}.npy"), np.asarray(self.buffer))
+        np.save(os.path.join(path, f"{name}_offsets.npy"), self.offsets)
+
+    @classmethod
+    def load(cls, path, name, mmap_mode="r"):
+        return cls(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, f"{name}_offsets.npy"), mmap_mode=mmap_mode))
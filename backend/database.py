@@ -1,10 +1,140 @@
 import sqlite3, os
 import json
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+from .metrics import timed
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "chatbot.db")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Applied to every connection. WAL lets readers run alongside a writer, and
+# synchronous=NORMAL is durable enough in WAL mode while avoiding an fsync per commit.
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", BUSY_TIMEOUT_MS),
+    ("cache_size", -20000),        # ~20 MB page cache
+    ("mmap_size", 268435456),      # 256 MB
+    ("temp_store", "MEMORY"),
+)
 
 def get_connection():
-    return sqlite3.connect(DB_PATH)
+    """Open a new, tuned connection. The caller must close it; prefer `connection()`."""
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections. At most `size` connections are
+    open; callers block (up to the busy timeout) when all are checked out.
+    A forked child process starts with a fresh pool.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._pid = os.getpid()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection; commits on success, rolls back on error. A
+        connection whose rollback fails is closed rather than handed to the
+        next caller in an unknown transaction state.
+        """
+        with timed("db_acquire"):
+            conn = self._acquire()
+        reusable = False
+        try:
+            with timed("db_transaction"):
+                yield conn
+                conn.commit()
+            reusable = True
+        except BaseException:
+            try:
+                conn.rollback()
+                reusable = True
+            except Exception:
+                pass  # the original error is the one to report
+            raise
+        finally:
+            if reusable:
+                self._idle.put(conn)
+            else:
+                self._discard(conn)
+
+    def _acquire(self):
+        deadline = time.monotonic() + BUSY_TIMEOUT_MS / 1000
+        while True:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+                try:
+                    return self._idle.get_nowait()
+                except queue.Empty:
+                    if self._created < self.size:
+                        self._created += 1
+                        break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise sqlite3.OperationalError("Timed out waiting for a pooled database connection")
+            # Short waits, so a slot freed by a discarded connection is noticed too
+            try:
+                return self._idle.get(timeout=min(remaining, 0.1))
+            except queue.Empty:
+                pass
+        try:
+            return get_connection()
+        except BaseException:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _discard(self, conn):
+        """Close a checked-out connection and free its slot."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            if self._pid == os.getpid():
+                self._created -= 1
+
+    def close_all(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+
+pool = ConnectionPool()
+
+
+def connection():
+    """`with connection() as conn:` - a pooled connection wrapped in a transaction."""
+    return pool.connection()
+
+
+def _add_column(cur, table, column, decl):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists (migrates older databases)."""
+    if column not in {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
 
 def init_db():
     conn = get_connection()
@@ -37,6 +167,10 @@ def init_db():
             owner_username TEXT
         )
     """)
+    # Uploads are stored content-addressed; filename is relative to the upload directory
+    _add_column(cur, "datasets", "original_filename", "TEXT")
+    _add_column(cur, "datasets", "content_hash", "TEXT")
+    _add_column(cur, "datasets", "size_bytes", "INTEGER")
     
     # Annotations table
     cur.execute("""
@@ -49,10 +183,55 @@ def init_db():
         )
     """)
     
+    # Login sessions; only a SHA-256 of each bearer token is stored
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY,
+            username TEXT,
+            created_at REAL,
+            expires_at REAL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+
+    # Background jobs (training runs) and their progress events
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT,
+            bot_id INTEGER,
+            owner_username TEXT,
+            status TEXT,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL,
+            result TEXT,
+            error TEXT
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS job_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT,
+            created_at REAL,
+            data TEXT
+        )
+    """)
+    # API process that queued the job, so a restarting worker only fails jobs whose owner is gone
+    _add_column(cur, "jobs", "owner_host", "TEXT")
+    _add_column(cur, "jobs", "owner_pid", "INTEGER")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_job_events_job_id ON job_events (job_id, id)")
+
+    # Indexes for the per-user / per-bot lookups every endpoint does
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bots_owner_username ON bots (owner_username)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_datasets_bot_id ON datasets (bot_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_datasets_content_hash ON datasets (content_hash)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_annotations_bot_id ON annotations (bot_id)")
+
     conn.commit()
     conn.close()
 
 # Initialize DB on import
 if __name__ == "__main__":
     init_db()
-    print("✅ Database initialized with tables: users, bots, datasets, annotations")
+    print("✅ Database initialized with tables: users, bots, datasets, annotations, sessions, jobs, job_events")
@@ -0,0 +1,277 @@
+import os
+import ast
+import json
+import hashlib
+import tempfile
+
+CHUNK_SIZE = int(os.environ.get("DATASET_CHUNK_SIZE", "10000"))
+DOCBIN_CACHE_DIR = os.environ.get("DOCBIN_CACHE_DIR", os.path.join("backend", "models", "docbin"))
+# Bump when parsing/validation rules change so stale DocBin caches are ignored.
+READER_VERSION = 1
+
+
+class DatasetError(ValueError):
+    """The dataset as a whole cannot be used (missing file, columns, format)."""
+
+
+def _format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".json":
+        return "json"
+    return "csv"
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Yield lists of (row_number, text, entities) tuples from a CSV, JSON or
+    JSONL dataset with 'text' and 'entities' fields, chunk_size rows at a time.
+    Entities are returned raw (string or list); see parse_entities.
+    """
+    import pandas as pd
+
+    fmt = _format(path)
+    if fmt == "csv":
+        try:
+            header = pd.read_csv(path, nrows=0).columns
+        except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
+            raise DatasetError(f"Could not read CSV: {e}")
+        if "text" not in header or "entities" not in header:
+            raise DatasetError("Dataset must have 'text' and 'entities' columns")
+        row = 1
+        reader = pd.read_csv(path, usecols=["text", "entities"], dtype=str, keep_default_na=False,
+                             chunksize=chunk_size)
+        for chunk in reader:
+            texts = chunk["text"].tolist()
+            yield list(zip(range(row, row + len(texts)), texts, chunk["entities"].tolist()))
+            row += len(texts)
+        return
+
+    if fmt == "jsonl":
+        records = _iter_jsonl(path)
+    else:
+        # A JSON array has to be decoded in one go; only the validation below is chunked.
+        with open(path, encoding="utf-8") as f:
+            records = json.load(f)
+        if not isinstance(records, list):
+            raise DatasetError("JSON dataset must be a list of objects")
+        records = iter(records)
+
+    chunk = []
+    for row, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            record = {}  # rejected later as a row without text
+        chunk.append((row, record.get("text"), record.get("entities")))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_sentences(path, columns=("question", "sentence", "text"), chunk_size=CHUNK_SIZE):
+    """
+    Yield lists of sentences, chunk_size at a time, from the first of
+    `columns` present in a CSV, JSON or JSONL dataset. Empty cells are skipped.
+    """
+    import pandas as pd
+
+    fmt = _format(path)
+    if fmt == "csv":
+        try:
+            header = pd.read_csv(path, nrows=0).columns
+        except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
+            raise DatasetError(f"Could not read CSV: {e}")
+        column = next((c for c in columns if c in header), None)
+        if column is None:
+            raise DatasetError(f"Dataset must contain one of the columns: {', '.join(columns)}")
+        for chunk in pd.read_csv(path, usecols=[column], dtype=str, keep_default_na=False, chunksize=chunk_size):
+            yield [text for text in chunk[column].tolist() if text.strip()]
+        return
+
+    if fmt == "jsonl":
+        records = _iter_jsonl(path)
+    else:
+        with open(path, encoding="utf-8") as f:
+            records = json.load(f)
+        if not isinstance(records, list):
+            raise DatasetError("JSON dataset must be a list of objects")
+    chunk = []
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        text = next((record[c] for c in columns if isinstance(record.get(c), str)), None)
+        if text and text.strip():
+            chunk.append(text)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iter_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+
+
+def parse_entities(value):
+    """
+    Decode an entity list into [(start, end, label), ...] without executing
+    anything: JSON first, then Python literals via ast.literal_eval. Dict
+    items with start/end/label keys are accepted too. Raises ValueError
+    with a reason when the value is not a valid entity list.
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return []
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            try:
+                value = ast.literal_eval(value)
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                raise ValueError("entities is not a valid JSON or Python literal list")
+    if value is None:
+        return []
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("entities must be a list")
+
+    spans = []
+    for item in value:
+        if isinstance(item, dict):
+            item = (item.get("start"), item.get("end"), item.get("label"))
+        if not isinstance(item, (list, tuple)) or len(item) != 3:
+            raise ValueError(f"entity {item!r} is not a (start, end, label) triple")
+        start, end, label = item
+        if isinstance(start, bool) or isinstance(end, bool) or not isinstance(start, int) or not isinstance(end, int):
+            raise ValueError(f"entity {item!r} has non-integer offsets")
+        if not isinstance(label, str) or not label:
+            raise ValueError(f"entity {item!r} has no label")
+        spans.append((start, end, label))
+    return spans
+
+
+def make_doc(nlp, text, spans, alignment_mode="strict"):
+    """
+    Build a Doc with `spans` set as its entities. Raises ValueError when a
+    span is out of range, does not align to token boundaries, or overlaps
+    another span.
+    """
+    doc = nlp.make_doc(text)
+    ents = []
+    for start, end, label in spans:
+        if not 0 <= start < end <= len(text):
+            raise ValueError(f"span ({start}, {end}) is outside the text")
+        span = doc.char_span(start, end, label=label, alignment_mode=alignment_mode)
+        if span is None:
+            raise ValueError(f"span ({start}, {end}, {label!r}) does not align with token boundaries")
+        ents.append(span)
+    try:
+        doc.ents = ents
+    except ValueError:
+        raise ValueError("entity spans overlap")
+    return doc
+
+
+def read_docs(path, nlp, chunk_size=CHUNK_SIZE, alignment_mode="strict"):
+    """
+    Parse and validate an annotated dataset.
+
+    Returns (docs, rejected) where rejected is a list of
+    {"row": n, "reason": "..."} for rows that were skipped.
+    """
+    docs, rejected = [], []
+    for chunk in iter_chunks(path, chunk_size):
+        for row, text, raw_entities in chunk:
+            if not isinstance(text, str) or not text.strip():
+                rejected.append({"row": row, "reason": "missing text"})
+                continue
+            try:
+                docs.append(make_doc(nlp, text, parse_entities(raw_entities), alignment_mode))
+            except ValueError as e:
+                rejected.append({"row": row, "reason": str(e)})
+    return docs, rejected
+
+
+def _file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_training_docs(path, nlp, cache_dir=DOCBIN_CACHE_DIR, alignment_mode="strict"):
+    """
+    Like read_docs, but caches the parsed docs as a spaCy DocBin keyed by the
+    dataset's content hash, so later trainings on the same file skip parsing.
+    Pass cache_dir=None to disable the cache.
+    """
+    if not os.path.exists(path):
+        raise DatasetError(f"Dataset file not found: {path}")
+    if cache_dir is None:
+        return read_docs(path, nlp, alignment_mode=alignment_mode)
+
+    key = f"{_file_hash(path)}-v{READER_VERSION}-{alignment_mode}"
+    docbin_path = os.path.join(cache_dir, f"{key}.spacy")
+    report_path = os.path.join(cache_dir, f"{key}.json")
+    if os.path.exists(docbin_path) and os.path.exists(report_path):
+        with open(report_path, encoding="utf-8") as f:
+            rejected = json.load(f)["rejected"]
+        from spacy.tokens import DocBin
+
+        return list(DocBin().from_disk(docbin_path).get_docs(nlp.vocab)), rejected
+
+    docs, rejected = read_docs(path, nlp, alignment_mode=alignment_mode)
+    os.makedirs(cache_dir, exist_ok=True)
+    write_docbin(docs, docbin_path)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"rows": len(docs) + len(rejected), "rejected": rejected}, f)
+    os.replace(tmp_path, report_path)
+    return docs, rejected
+
+
+def write_docbin(docs, out_path):
+    """Serialize docs (with their entities) to a .spacy DocBin file."""
+    from spacy.tokens import DocBin
+
+    doc_bin = DocBin(attrs=["ENT_IOB", "ENT_TYPE"], docs=docs)
+    # A unique temporary name, so concurrent writers of one cache entry don't clobber each other's file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(out_path)), prefix=".tmp-")
+    os.close(fd)
+    try:
+        doc_bin.to_disk(tmp_path)
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return out_path
+
+
+if __name__ == "__main__":
+    import argparse
+    import spacy
+
+    parser = argparse.ArgumentParser(description="Validate an annotated NER dataset and optionally write a DocBin")
+    parser.add_argument("dataset", help="CSV, JSON or JSONL file with 'text' and 'entities'")
+    parser.add_argument("--docbin", help="write the valid rows to this .spacy file")
+    parser.add_argument("--lang", default="en")
+    args = parser.parse_args()
+
+    docs, rejected = read_docs(args.dataset, spacy.blank(args.lang))
+    for item in rejected:
+        print(f"row {item['row']}: {item['reason']}")
+    print(f"{len(docs)} valid rows, {len(rejected)} rejected")
+    if args.docbin:
+        write_docbin(docs, args.docbin)
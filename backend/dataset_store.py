@@ -0,0 +1,201 @@
+import os
+import glob
+import json
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .metrics import timed
+from .model_cache import dataset_version
+
+COLUMNAR_DIR = os.environ.get("COLUMNAR_DIR", os.path.join("uploads", ".columnar"))
+DATASET_CACHE_ENTRIES = int(os.environ.get("DATASET_CACHE_ENTRIES", "32"))
+HEAD_ROWS = 100
+
+_pq = False  # pyarrow.parquet once imported, None when pyarrow is missing
+
+
+def _parquet():
+    """pyarrow.parquet, imported on first use; None falls back to one pickle per column."""
+    global _pq
+    if _pq is False:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            pq = None
+        _pq = pq
+    return _pq
+
+
+@timed("read_dataset")
+def read_dataset(dataset_path, **kwargs):
+    """Parse an uploaded CSV, JSON or JSONL file into a DataFrame."""
+    import pandas as pd
+
+    ext = os.path.splitext(dataset_path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return pd.read_json(dataset_path, lines=True, **kwargs)
+    if ext == ".json":
+        return pd.read_json(dataset_path, **kwargs)
+    return pd.read_csv(dataset_path, **kwargs)
+
+
+def _key(dataset_path):
+    # Keyed by file identity, so hard links to one upload (see dataset_upload.py) share a copy
+    st = os.stat(dataset_path)
+    ident = f"{st.st_dev:x}-{st.st_ino:x}"
+    return ident, f"{ident}-{dataset_version(dataset_path)}"
+
+
+def columnar_path(dataset_path):
+    """Where the columnar copy of the dataset's current version lives."""
+    _, key = _key(dataset_path)
+    return os.path.join(COLUMNAR_DIR, f"{key}.parquet" if _parquet() is not None else key)
+
+
+@timed("dataset_convert")
+def convert(dataset_path):
+    """
+    Parse the dataset once and store it column by column: as Parquet when
+    pyarrow is available, otherwise as a directory with one pickle per
+    column plus a small pickled head. Older copies of the same file are
+    removed. Returns the columnar path.
+    """
+    path = columnar_path(dataset_path)
+    if os.path.exists(path):
+        return path
+    df = read_dataset(dataset_path)
+    # Nested values from JSON datasets (e.g. entity lists) are stored as JSON strings, and
+    # columns mixing types (e.g. numbers and strings) as strings, which Parquet can hold
+    for column in df.columns[df.dtypes == object]:
+        if df[column].map(lambda v: isinstance(v, (list, dict))).any():
+            df[column] = df[column].map(lambda v: json.dumps(v) if isinstance(v, (list, dict)) else v)
+        present = df[column].notna()
+        if df.loc[present, column].map(type).nunique() > 1:
+            df.loc[present, column] = df.loc[present, column].astype(str)
+    os.makedirs(COLUMNAR_DIR, exist_ok=True)
+    digest, _ = _key(dataset_path)
+    for stale in glob.glob(os.path.join(COLUMNAR_DIR, f"{digest}-*")):
+        if stale != path:
+            shutil.rmtree(stale) if os.path.isdir(stale) else os.remove(stale)
+
+    # A unique temporary name per call: threads of one process may convert the same file at once
+    if _parquet() is not None:
+        fd, tmp_path = tempfile.mkstemp(dir=COLUMNAR_DIR, prefix=".tmp-")
+        os.close(fd)
+    else:
+        tmp_path = tempfile.mkdtemp(dir=COLUMNAR_DIR, prefix=".tmp-")
+    try:
+        if _parquet() is not None:
+            df.to_parquet(tmp_path, index=False, row_group_size=10000)
+        else:
+            columns = [str(c) for c in df.columns]
+            with open(os.path.join(tmp_path, "columns.json"), "w", encoding="utf-8") as f:
+                json.dump(columns, f)
+            with open(os.path.join(tmp_path, "head.pkl"), "wb") as f:
+                pickle.dump(df.head(HEAD_ROWS), f, protocol=pickle.HIGHEST_PROTOCOL)
+            for i, column in enumerate(df.columns):
+                with open(os.path.join(tmp_path, f"col_{i}.pkl"), "wb") as f:
+                    pickle.dump(df[column].to_numpy(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another worker stored this version first; the path is keyed by version, so keep theirs
+            if not os.path.exists(path):
+                raise
+    finally:
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def remove_columnar(dataset_path):
+    """Delete every columnar copy of the dataset file."""
+    digest, _ = _key(dataset_path)
+    for stale in glob.glob(os.path.join(COLUMNAR_DIR, f"{digest}-*")):
+        shutil.rmtree(stale) if os.path.isdir(stale) else os.remove(stale)
+
+
+class DatasetStore:
+    """
+    Reads datasets through their columnar copy, keeping recent results in
+    an in-memory LRU. Entries are keyed by the file's mtime and size, so an
+    overwritten upload is converted and read again.
+    """
+
+    def __init__(self, max_entries=DATASET_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def head(self, dataset_path, n=10):
+        """First `n` rows as a DataFrame; only the first row group / head file is read."""
+        return self._cached(dataset_path, ("head", n), lambda path: self._read_head(path, n))
+
+    def columns(self, dataset_path):
+        return self._cached(dataset_path, ("columns",), self._read_columns)
+
+    def column(self, dataset_path, name):
+        """One column as a list; other columns are never read. Raises KeyError if absent."""
+        if name not in self.columns(dataset_path):
+            raise KeyError(name)
+        return self._cached(dataset_path, ("column", name), lambda path: self._read_column(path, name))
+
+    def text_column(self, dataset_path, name):
+        """Like column(), with values as strings and missing cells as ""."""
+        return self._cached(dataset_path, ("text", name),
+                            lambda path: ["" if v is None or v != v else str(v) for v in self.column(dataset_path, name)])
+
+    def _cached(self, dataset_path, what, read):
+        key = (_key(dataset_path)[0], what)
+        version = dataset_version(dataset_path)
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None and hit[0] == version:
+                self._cache.move_to_end(key)
+                return hit[1]
+        value = read(convert(dataset_path))
+        with self._lock:
+            self._cache[key] = (version, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return value
+
+    @staticmethod
+    def _read_head(path, n):
+        import pandas as pd
+
+        pq = _parquet()
+        if pq is not None:
+            batch = next(pq.ParquetFile(path).iter_batches(batch_size=n), None)
+            return batch.to_pandas() if batch is not None else pd.read_parquet(path)
+        if n <= HEAD_ROWS:
+            with open(os.path.join(path, "head.pkl"), "rb") as f:
+                return pickle.load(f).head(n)
+        columns = DatasetStore._read_columns(path)
+        return pd.DataFrame({c: DatasetStore._read_column(path, c)[:n] for c in columns})
+
+    @staticmethod
+    def _read_columns(path):
+        pq = _parquet()
+        if pq is not None:
+            return list(pq.ParquetFile(path).schema_arrow.names)
+        with open(os.path.join(path, "columns.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _read_column(path, name):
+        pq = _parquet()
+        if pq is not None:
+            return pq.read_table(path, columns=[name]).column(name).to_pylist()
+        index = DatasetStore._read_columns(path).index(name)
+        with open(os.path.join(path, f"col_{index}.pkl"), "rb") as f:
+            return pickle.load(f).tolist()
+
+
+dataset_store = DatasetStore()
@@ -0,0 +1,387 @@
+import os
+import io
+import csv
+import json
+import codecs
+import shutil
+import hashlib
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from .dataset_reader import DatasetError
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(512 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1 << 20
+HEADER_LIMIT = 64 * 1024  # the header row / first record must fit in this many characters
+FORM_FIELDS_LIMIT = 64 * 1024  # bytes of the non-file form fields sent alongside an upload
+
+ALLOWED_EXTENSIONS = (".csv", ".json", ".jsonl", ".ndjson")
+# A dataset is either question/answer pairs (chatbot) or text/entities rows (NER)
+REQUIRED_COLUMNS = (("question", "answer"), ("text", "entities"))
+
+
+class UploadTooLarge(DatasetError):
+    """The upload exceeds MAX_UPLOAD_BYTES."""
+
+
+def check_columns(columns):
+    columns = set(columns)
+    if not any(set(required) <= columns for required in REQUIRED_COLUMNS):
+        raise DatasetError("Dataset must have 'question' and 'answer' columns, or 'text' and 'entities' columns")
+
+
+class _CsvValidator:
+    """Checks the header row as soon as it has arrived."""
+
+    def __init__(self):
+        self._head = ""
+        self.done = False
+
+    def feed(self, text):
+        if self.done:
+            return
+        self._head += text
+        if "\n" in self._head:
+            self._check(self._head)
+        elif len(self._head) > HEADER_LIMIT:
+            raise DatasetError("CSV header row is too long")
+
+    def close(self):
+        if not self.done:
+            self._check(self._head)
+
+    def _check(self, text):
+        header = next(csv.reader(io.StringIO(text.lstrip("\ufeff"))), None)
+        if not header:
+            raise DatasetError("CSV file is empty")
+        check_columns(h.strip() for h in header)
+        self.done = True
+
+
+class _JsonlValidator:
+    """Every line must be a JSON object; the first one is checked for the required keys."""
+
+    def __init__(self):
+        self._partial = ""
+        self._line_no = 0
+        self._checked = False
+
+    def feed(self, text):
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def close(self):
+        self._line(self._partial)
+        if not self._checked:
+            raise DatasetError("JSONL file has no records")
+
+    def _line(self, line):
+        self._line_no += 1
+        if not line.strip():
+            return
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            raise DatasetError(f"line {self._line_no} is not valid JSON")
+        if not isinstance(record, dict):
+            raise DatasetError(f"line {self._line_no} is not a JSON object")
+        if not self._checked:
+            check_columns(record)
+            self._checked = True
+
+
+class _JsonValidator:
+    """
+    A JSON array cannot be parsed piece by piece with the standard library,
+    so only its opening is checked: it must be a list whose first object has
+    the required keys. The full parse happens when the dataset is converted.
+    """
+
+    def __init__(self):
+        self._head = ""
+        self.done = False
+
+    def feed(self, text):
+        if self.done:
+            return
+        self._head += text
+        self._check(final=len(self._head) > HEADER_LIMIT)
+
+    def close(self):
+        if not self.done:
+            self._check(final=True)
+
+    def _check(self, final):
+        head = self._head.lstrip("\ufeff \t\r\n")
+        if not head:
+            if final:
+                raise DatasetError("JSON file is empty")
+            return
+        if head[0] != "[":
+            raise DatasetError("JSON dataset must be a list of objects")
+        try:
+            record, _ = json.JSONDecoder().raw_decode(head[1:].lstrip())
+        except json.JSONDecodeError:
+            if final:
+                raise DatasetError("JSON dataset must start with an object")
+            return
+        if not isinstance(record, dict):
+            raise DatasetError("JSON dataset must be a list of objects")
+        check_columns(record)
+        self.done = True
+
+
+def _validator(ext):
+    if ext == ".csv":
+        return _CsvValidator()
+    if ext == ".json":
+        return _JsonValidator()
+    return _JsonlValidator()
+
+
+class UploadWriter:
+    """
+    receive_upload fed chunk by chunk, for bodies that arrive incrementally:
+    write() each chunk as it comes, then finish() returns (tmp_path, sha256,
+    size). The same limits and checks apply; on any error abort() removes
+    the partial file.
+    """
+
+    def __init__(self, filename, upload_dir, max_bytes=MAX_UPLOAD_BYTES):
+        ext = os.path.splitext(filename or "")[1].lower()
+        if ext not in ALLOWED_EXTENSIONS:
+            raise DatasetError(f"Unsupported file type '{ext}'; upload one of: {', '.join(ALLOWED_EXTENSIONS)}")
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._validator = _validator(ext)
+        incoming = os.path.join(upload_dir, ".incoming")
+        os.makedirs(incoming, exist_ok=True)
+        self.tmp_path = os.path.join(incoming, f"{os.getpid()}-{os.urandom(8).hex()}{ext}")
+        self._out = open(self.tmp_path, "wb")
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Dataset exceeds the upload limit of {self.max_bytes} bytes")
+        self._digest.update(chunk)
+        try:
+            self._validator.feed(self._decoder.decode(chunk))
+        except UnicodeDecodeError:
+            raise DatasetError(f"Dataset is not valid UTF-8 (near byte {self.size - len(chunk)})")
+        self._out.write(chunk)
+
+    def finish(self):
+        self._out.close()
+        try:
+            self._validator.feed(self._decoder.decode(b"", final=True))
+        except UnicodeDecodeError:
+            raise DatasetError("Dataset is not valid UTF-8 (truncated character at end of file)")
+        self._validator.close()
+        return self.tmp_path, self._digest.hexdigest(), self.size
+
+    def abort(self):
+        self._out.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def receive_upload(fileobj, filename, upload_dir, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Stream an uploaded dataset into `<upload_dir>/.incoming` in fixed-size
+    chunks. While copying, the SHA-256 is computed, the bytes are decoded as
+    UTF-8 and the schema is checked, so memory use stays bounded whatever the file size.
+    Raises UploadTooLarge once `max_bytes` is passed, and DatasetError for
+    other invalid uploads. On failure nothing is left behind.
+
+    Returns (tmp_path, sha256, size).
+    """
+    writer = UploadWriter(filename, upload_dir, max_bytes)
+    try:
+        for chunk in iter(lambda: fileobj.read(UPLOAD_CHUNK_SIZE), b""):
+            writer.write(chunk)
+        return writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+class MultipartUpload:
+    """
+    Parses a multipart/form-data body as it arrives, so the dataset is never
+    buffered in memory or a spooled temp file before it is checked: the part
+    named `file_field` goes straight into an UploadWriter, other fields are
+    kept as strings (FORM_FIELDS_LIMIT bytes in all). feed() each body chunk,
+    then finish() returns (fields, filename, (tmp_path, sha256, size)).
+    Raises UploadTooLarge and DatasetError like receive_upload; on failure
+    call abort().
+    """
+
+    def __init__(self, content_type, upload_dir, file_field="file", max_bytes=MAX_UPLOAD_BYTES):
+        kind, options = parse_options_header(content_type)
+        if kind != b"multipart/form-data" or not options.get(b"boundary"):
+            raise DatasetError("Expected a multipart/form-data body")
+        self.upload_dir = upload_dir
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.fields = {}
+        self.filename = None
+        self.writer = None
+        self._field_bytes = 0
+        self._complete = False
+        self._parser = MultipartParser(options[b"boundary"], {
+            "on_part_begin": self._part_begin, "on_header_field": self._header_field,
+            "on_header_value": self._header_value, "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished, "on_part_data": self._part_data,
+            "on_part_end": self._part_end, "on_end": self._end,
+        })
+
+    def feed(self, chunk):
+        try:
+            self._parser.write(chunk)
+        except ValueError as e:
+            if isinstance(e, DatasetError):
+                raise
+            raise DatasetError(f"Malformed multipart body: {e}")
+
+    def finish(self):
+        if not self._complete:
+            raise DatasetError("Multipart body ended early")
+        if self.writer is None:
+            raise DatasetError(f"No file was uploaded in the '{self.file_field}' field")
+        return self.fields, self.filename, self.writer.finish()
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.abort()
+
+    # ---------- parser callbacks ----------
+    def _part_begin(self):
+        self._headers, self._header_name, self._header_value = {}, b"", b""
+        self._part, self._value = None, []
+
+    def _header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def _header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name, self._header_value = b"", b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        if name == self.file_field and b"filename" in options:
+            if self.writer is not None:
+                raise DatasetError(f"Only one file may be uploaded in the '{self.file_field}' field")
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            self.writer = UploadWriter(self.filename, self.upload_dir, self.max_bytes)
+            self._part = self.writer
+        else:
+            self._part = name
+
+    def _part_data(self, data, start, end):
+        if self._part is self.writer:
+            self.writer.write(data[start:end])
+            return
+        self._field_bytes += end - start
+        if self._field_bytes > FORM_FIELDS_LIMIT:
+            raise UploadTooLarge(f"Form fields exceed {FORM_FIELDS_LIMIT} bytes")
+        self._value.append(data[start:end])
+
+    def _part_end(self):
+        if self._part is not self.writer:
+            self.fields[self._part] = b"".join(self._value).decode("utf-8", "replace")
+
+    def _end(self):
+        self._complete = True
+
+
+def store_upload(tmp_path, sha256, bot_id, upload_dir):
+    """
+    Move a received upload into content-addressed storage and link it into
+    the bot's directory:
+
+        <upload_dir>/objects/<sha256><ext>         one copy per distinct content
+        <upload_dir>/bots/<bot_id>/<sha256><ext>   hard link to the object
+
+    Identical datasets uploaded for other bots reuse the existing object, and
+    since the links share one inode, the columnar cache is shared too.
+    Returns the bot's dataset path relative to `upload_dir`.
+    """
+    ext = os.path.splitext(tmp_path)[1]
+    objects = os.path.join(upload_dir, "objects")
+    os.makedirs(objects, exist_ok=True)
+    object_path = os.path.join(objects, f"{sha256}{ext}")
+    if os.path.exists(object_path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, object_path)
+
+    relative = os.path.join("bots", str(bot_id), f"{sha256}{ext}")
+    bot_path = os.path.join(upload_dir, relative)
+    os.makedirs(os.path.dirname(bot_path), exist_ok=True)
+    if not os.path.exists(bot_path):
+        try:
+            os.link(object_path, bot_path)
+        except OSError:  # no hard links on this filesystem
+            shutil.copyfile(object_path, bot_path)
+    return relative
+
+
+def revise_dataset(dataset_path, upload_dir, keep=None, rows=()):
+    """
+    Write a revision of a dataset holding the rows at positions `keep` (all
+    of them when None) followed by `rows` (dicts of column values), in the
+    dataset's own format. The new file goes through receive_upload like an
+    upload (size limit, validation, hashing); returns its (tmp_path,
+    sha256, size) for store_upload.
+    """
+    import pandas as pd
+    from .dataset_store import read_dataset
+
+    ext = os.path.splitext(dataset_path)[1].lower()
+    # Read every cell as-is so untouched rows are written back unchanged
+    if ext in (".json", ".jsonl", ".ndjson"):
+        df = read_dataset(dataset_path, dtype=False)
+    else:
+        df = read_dataset(dataset_path, dtype=str, keep_default_na=False)
+    if keep is not None:
+        df = df.iloc[list(keep)]
+    if rows:
+        df = pd.concat([df, pd.DataFrame(list(rows))], ignore_index=True)
+    if ext in (".jsonl", ".ndjson"):
+        text = df.to_json(orient="records", lines=True, force_ascii=False)
+    elif ext == ".json":
+        text = df.to_json(orient="records", force_ascii=False)
+    else:
+        text = df.to_csv(index=False)
+    return receive_upload(io.BytesIO(text.encode("utf-8")), os.path.basename(dataset_path), upload_dir)
+
+
+def release_upload(relative, upload_dir):
+    """
+    Remove a bot's link to a stored dataset (a path returned by
+    store_upload). The object itself, and its columnar copy, are deleted
+    once no other bot links to it. Any other path, such as a dataset
+    uploaded before content-addressed storage that several bots may share,
+    is left alone; returns whether the link was released.
+    """
+    from .dataset_store import remove_columnar
+
+    parts = os.path.normpath(relative).split(os.sep)
+    if len(parts) != 3 or parts[0] != "bots":
+        return False
+    bot_path = os.path.join(upload_dir, relative)
+    object_path = os.path.join(upload_dir, "objects", os.path.basename(relative))
+    if os.path.exists(bot_path):
+        os.remove(bot_path)
+    if os.path.exists(object_path) and os.stat(object_path).st_nlink == 1:
+        remove_columnar(object_path)
+        os.remove(object_path)
+    return True
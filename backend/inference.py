@@ -0,0 +1,229 @@
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from .metrics import metrics, timed
+from .nlp_registry import NER_MODEL, VECTORS_MODEL, get_nlp, registry
+
+# 0 runs inference on one thread of the API process instead of a process pool
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", "5"))
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "64"))
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZES = metrics.histogram("nlu_inference_batch_size", "Items per micro-batch sent to the inference pool.",
+                                labels=("batcher",), buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+
+# ---------- worker side ----------
+def preload_worker():
+    """
+    Pool initializer: load the pipelines once per worker, before the first
+    request. A pipeline that fails to load is reported instead of raised,
+    so the other one keeps serving (an initializer that raises breaks the
+    whole pool). Returns {"warm": [...], "errors": {spec: message}}.
+    """
+    errors = {}
+    for name, profile in ((NER_MODEL, "ner"), (VECTORS_MODEL, "vectors")):
+        try:
+            get_nlp(name, profile=profile)
+        except Exception as e:
+            logger.warning("Could not preload %s:%s: %s", name, profile, e)
+            errors[f"{name}:{profile}"] = str(e)
+    return {"warm": registry.readiness()["warm"], "errors": errors}
+
+
+def ner_batch(texts):
+    """Entities for each text, from one nlp.pipe pass."""
+    with registry.using(NER_MODEL, profile="ner") as nlp:
+        return [[{"text": ent.text, "label": ent.label_, "start": ent.start_char, "end": ent.end_char}
+                 for ent in doc.ents]
+                for doc in nlp.pipe(texts, batch_size=max(len(texts), 1))]
+
+
+def embed_batch(texts):
+    """Normalized query vectors for each text (rows of one float32 matrix)."""
+    from .chatbot import embed_texts
+
+    return list(embed_texts(texts, batch_size=max(len(texts), 1), n_process=1))
+
+
+# ---------- API side ----------
+class MicroBatcher:
+    """
+    Coalesces concurrent calls into batches. The first item waits at most
+    `window_ms` for others to arrive (or until `max_batch` are queued), then
+    the whole batch is sent to `fn` on the pool's executor; every caller
+    gets its own result back.
+    """
+
+    def __init__(self, name, fn, pool, max_batch=MAX_BATCH_SIZE, window_ms=BATCH_WINDOW_MS):
+        self.name = name
+        self.fn = fn
+        self.pool = pool
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self._pending = []
+        self._timer = None
+        self._stats = {"batches": 0, "items": 0, "max_batch_seen": 0}
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        self._stats["batches"] += 1
+        self._stats["items"] += len(batch)
+        self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(batch))
+        BATCH_SIZES.observe(len(batch), batcher=self.name)
+        try:
+            # Timed from the API process: metrics recorded inside pool workers would not reach /metrics
+            with timed(f"{self.name}_batch"):
+                results = await self._execute([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _execute(self, items):
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self.pool.executor
+            try:
+                return await loop.run_in_executor(executor, self.fn, items)
+            except BrokenExecutor:
+                # A worker died (crash, OOM kill): replace the pool and retry the batch once on the new one
+                logger.warning("Inference pool broken; restarting it")
+                self.pool.reset(executor)
+                if attempt:
+                    raise
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["mean_batch"] = round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+
+class InferencePool:
+    """
+    Runs spaCy inference off the request path: in `workers` spawned
+    processes (each preloading the pipelines through `preload_worker`) or,
+    with workers=0, on a single background thread. Requests go through
+    micro-batchers, so concurrent /annotate and /chat calls share one
+    nlp.pipe call.
+    """
+
+    def __init__(self, workers=INFERENCE_WORKERS, max_batch=MAX_BATCH_SIZE, window_ms=BATCH_WINDOW_MS):
+        self.workers = workers
+        self._executor = None
+        self._warmup = []
+        self._lock = threading.Lock()
+        self.ner = MicroBatcher("ner", ner_batch, self, max_batch, window_ms)
+        self.embed = MicroBatcher("embed", embed_batch, self, max_batch, window_ms)
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    # spawn: forking a threaded server process is not safe
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                         initializer=preload_worker)
+                else:
+                    self._executor = ThreadPoolExecutor(1, thread_name_prefix="inference")
+            return self._executor
+
+    def start(self):
+        """Start the workers now so their models load before traffic arrives."""
+        self._warmup = [self.executor.submit(preload_worker) for _ in range(max(self.workers, 1))]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self._warmup = []
+
+    def reset(self, broken):
+        """Replace the executor `broken` with a fresh one (warmed up again if `start()` was called)."""
+        with self._lock:
+            if self._executor is not broken:  # another batch already replaced it
+                return
+            self._executor = None
+            restart = bool(self._warmup)
+        broken.shutdown(wait=False, cancel_futures=True)
+        if restart:
+            self.start()
+
+    def readiness(self):
+        """Whether `start()` has finished loading the workers' pipelines, and which ones are warm."""
+        warmup = list(self._warmup)
+        done = [f for f in warmup if f.done() and not f.cancelled()]
+        results = [f.result() for f in done if f.exception() is None]
+        errors = [str(f.exception()) for f in done if f.exception() is not None]
+        errors += sorted({f"{spec}: {message}" for result in results for spec, message in result["errors"].items()})
+        models = sorted({spec for result in results for spec in result["warm"]})
+        return {"workers": self.workers, "started": bool(warmup), "warm": bool(warmup) and len(done) == len(warmup)
+                and not errors, "models": models, "errors": errors}
+
+    def embed_texts(self, texts, batch_size=256):
+        """
+        Normalized vectors for many texts as one float32 matrix, embedded in
+        the pool `batch_size` texts per task. Blocks, so call it from a worker
+        thread; bulk work (intent training, batch prediction) goes through it
+        so the API process does not load the vectors model itself.
+        """
+        import numpy as np
+
+        texts = list(texts)
+        rows = []
+        for start in range(0, len(texts), batch_size):
+            rows.extend(self._call(embed_batch, texts[start:start + batch_size]))
+        return np.stack(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+
+    def _call(self, fn, items):
+        for attempt in range(2):
+            executor = self.executor
+            try:
+                return executor.submit(fn, items).result()
+            except BrokenExecutor:
+                logger.warning("Inference pool broken; restarting it")
+                self.reset(executor)
+                if attempt:
+                    raise
+
+    async def annotate(self, text):
+        """Entities in `text` as [{"text", "label", "start", "end"}]."""
+        return await self.ner.submit(text)
+
+    async def embed_query(self, text):
+        """Normalized query vector for `text`."""
+        return await self.embed.submit(text)
+
+    def stats(self):
+        return {"workers": self.workers, "ner": self.ner.stats(), "embed": self.embed.stats()}
+
+
+inference = InferencePool()
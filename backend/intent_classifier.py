@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import shutil
+import threading
+from collections import OrderedDict
+
+from .annotations import iter_annotations
+from .metrics import timed
+from .nlp_registry import VECTORS_MODEL
+
+INTENT_MODEL_DIR = os.environ.get("INTENT_MODEL_DIR", os.path.join("backend", "models", "intent"))
+INTENT_PREDICTION_CACHE_SIZE = int(os.environ.get("INTENT_PREDICTION_CACHE_SIZE", "10000"))
+INTENT_MODEL_CACHE_SIZE = int(os.environ.get("INTENT_MODEL_CACHE_SIZE", "64"))
+
+
+def normalize_text(text):
+    """
+    Lowercased with whitespace collapsed. Sentences are embedded in this
+    form for training and prediction alike, so it is also the cache key.
+    """
+    return " ".join(text.lower().split())
+
+
+def _embed_here(texts):
+    from .chatbot import embed_texts  # loads the vectors model on first use
+
+    return embed_texts(texts, n_process=1)
+
+
+def _softmax(logits):
+    import numpy as np
+
+    logits = logits - logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    return logits / logits.sum(axis=1, keepdims=True)
+
+
+def fit_softmax(X, y, n_classes, epochs=300, lr=2.0, momentum=0.9, l2=1e-4, weights=None, bias=None):
+    """
+    Multinomial logistic regression by full-batch gradient descent with
+    momentum. `weights`/`bias` warm-start the fit (extra classes start at
+    zero). Returns (weights, bias).
+    """
+    import numpy as np
+
+    n, dim = X.shape
+    W = np.zeros((dim, n_classes), dtype=np.float32)
+    b = np.zeros(n_classes, dtype=np.float32)
+    if weights is not None:
+        W[:, :weights.shape[1]] = weights
+        b[:len(bias)] = bias
+    onehot = np.zeros((n, n_classes), dtype=np.float32)
+    onehot[np.arange(n), y] = 1.0
+    vW, vb = np.zeros_like(W), np.zeros_like(b)
+    for _ in range(epochs):
+        grad = (_softmax(X @ W + b) - onehot) / n
+        vW = momentum * vW - lr * (X.T @ grad + l2 * W)
+        vb = momentum * vb - lr * grad.sum(axis=0)
+        W += vW
+        b += vb
+    return W, b
+
+
+class IntentClassifier:
+    """
+    Softmax head over the normalized spaCy document vectors of annotated
+    sentences (the same vectors the chatbot uses, see chatbot.embed_texts).
+    Features are centred on the training mean before the linear layer.
+    Callers embed normalize_text(sentence), as training does.
+
+    Ranked predictions are kept in an LRU of `cache_size` entries keyed by
+    normalized text, so repeated sentences skip embedding entirely.
+    """
+
+    def __init__(self, labels, weights, bias, mean, meta=None, cache_size=INTENT_PREDICTION_CACHE_SIZE):
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.meta = meta or {}
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    # ---------- prediction ----------
+    @timed("intent_predict")
+    def predict_vectors(self, vectors, top_k=5):
+        """Ranked [{"intent", "score"}] per row of `vectors` (normalized doc vectors); scores are probabilities."""
+        import numpy as np
+
+        probs = _softmax((np.asarray(vectors, dtype=np.float32) - self.mean) @ self.weights + self.bias)
+        k = min(top_k, len(self.labels))
+        best = np.argsort(-probs, axis=1, kind="stable")[:, :k]
+        return [[{"intent": self.labels[j], "score": round(float(row[j]), 4)} for j in ranked]
+                for row, ranked in zip(probs, best)]
+
+    def lookup(self, text, top_k=5):
+        """Cached prediction for `text`, or None."""
+        key = (normalize_text(text), top_k)
+        with self._lock:
+            intents = self._cache.get(key)
+            if intents is None:
+                self._stats["misses"] += 1
+                return None
+            self._cache.move_to_end(key)
+            self._stats["hits"] += 1
+            return intents
+
+    def remember(self, text, top_k, intents):
+        key = (normalize_text(text), top_k)
+        with self._lock:
+            self._cache[key] = intents
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def predict(self, texts, top_k=5, embed=None):
+        """
+        Ranked intents for each text. Cached texts are answered from the
+        LRU; the rest are embedded together with `embed` (a function from
+        texts to normalized vectors, such as inference.embed_texts; by
+        default chatbot.embed_texts in this process).
+        """
+        texts = list(texts)
+        results = [self.lookup(text, top_k) for text in texts]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            predicted = self.predict_vectors((embed or _embed_here)([normalize_text(texts[i]) for i in missing]),
+                                             top_k)
+            for i, intents in zip(missing, predicted):
+                results[i] = intents
+                self.remember(texts[i], top_k, intents)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {"labels": len(self.labels), "cached": len(self._cache), **self._stats}
+
+    # ---------- persistence ----------
+    def save(self, path, features=None, targets=None):
+        """
+        Write weights.npz and meta.json (plus the training features, when
+        given, so the next training embeds only new annotations) to
+        directory `path`, replacing an earlier model there.
+        """
+        import numpy as np
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = os.path.join(parent, f".tmp-{os.path.basename(path)}-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.savez(os.path.join(tmp_dir, "weights.npz"), weights=self.weights, bias=self.bias, mean=self.mean)
+        if features is not None:
+            np.savez(os.path.join(tmp_dir, "features.npz"), X=features, y=targets)
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({**self.meta, "labels": self.labels}, f, indent=2)
+        old_dir = None
+        if os.path.exists(path):
+            old_dir = f"{tmp_dir}-old"
+            os.rename(path, old_dir)
+        os.rename(tmp_dir, path)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+        return path
+
+    @classmethod
+    def load(cls, path, cache_size=INTENT_PREDICTION_CACHE_SIZE):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        import numpy as np
+
+        data = np.load(os.path.join(path, "weights.npz"))
+        return cls(meta.pop("labels"), data["weights"], data["bias"], data["mean"], meta, cache_size)
+
+
+def _load_features(path):
+    """Cached (X, y, labels, annotations_through) of an earlier training, if made with the current vectors model."""
+    import numpy as np
+
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        data = np.load(os.path.join(path, "features.npz"))
+    except (OSError, ValueError):
+        return None
+    if meta.get("model_name") != VECTORS_MODEL:
+        return None
+    return data["X"], data["y"], meta["labels"], meta.get("annotations_through", 0)
+
+
+def train_intent_classifier(bot_id, path, epochs=300, dev_fraction=0.2, seed=0, embed=None):
+    """
+    Train a bot's intent classifier on its annotations that have an intent
+    and save it to `path`. Document vectors of annotations seen by the
+    previous training are reused from its features.npz; only annotations
+    added since are embedded, with `embed` as in IntentClassifier.predict.
+    Returns (classifier, metrics).
+    """
+    import numpy as np
+
+    cached = _load_features(path)
+    X, y, labels, through = cached if cached is not None else (None, None, [], 0)
+    label_ids = {label: i for i, label in enumerate(labels)}
+    texts, targets, last_id = [], [], through
+    for annotation in iter_annotations(bot_id):
+        if annotation["id"] <= through:
+            continue
+        last_id = annotation["id"]
+        intent = (annotation["intent"] or "").strip()
+        if intent and annotation["sentence"]:
+            texts.append(normalize_text(annotation["sentence"]))
+            targets.append(label_ids.setdefault(intent, len(label_ids)))
+    labels = list(label_ids)
+    new_X = (embed or _embed_here)(texts) if texts else None
+    if new_X is not None:
+        X = new_X if X is None else np.vstack([X, new_X])
+        y = np.asarray(targets, dtype=np.int64) if y is None else np.concatenate([y, targets])
+    if X is None or len(set(y.tolist())) < 2:
+        raise ValueError("Need annotations with at least two different intents to train")
+
+    start = time.perf_counter()
+    mean = X.mean(axis=0)
+    features = X - mean
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(features))
+    n_dev = int(len(features) * dev_fraction) if len(features) >= 20 else 0
+    dev, train = order[:n_dev], order[n_dev:]
+    weights, bias = fit_softmax(features[train], y[train], len(labels), epochs=epochs)
+    dev_accuracy = None
+    if n_dev:
+        dev_accuracy = float(np.mean(np.argmax(features[dev] @ weights + bias, axis=1) == y[dev]))
+        # Final model: all examples, warm-started from the split's weights
+        weights, bias = fit_softmax(features, y, len(labels), epochs=epochs, weights=weights, bias=bias)
+    train_accuracy = float(np.mean(np.argmax(features @ weights + bias, axis=1) == y))
+    seconds = time.perf_counter() - start
+
+    metrics = {
+        "examples": int(len(X)),
+        "new_examples": len(texts),
+        "intents": len(labels),
+        "train_accuracy": round(train_accuracy, 4),
+        "dev_accuracy": round(dev_accuracy, 4) if dev_accuracy is not None else None,
+        "train_seconds": round(seconds, 3),
+    }
+    meta = {"model_name": VECTORS_MODEL, "annotations_through": last_id, "dim": int(X.shape[1]),
+            "created_at": time.time(), **metrics}
+    classifier = IntentClassifier(labels, weights, bias, mean.astype(np.float32), meta)
+    classifier.save(path, features=X, targets=y)
+    return classifier, metrics
+
+
+class IntentClassifierCache:
+    """Loaded intent classifiers per bot, reloaded when the saved model changes; LRU bounded."""
+
+    def __init__(self, model_dir=INTENT_MODEL_DIR, max_bots=INTENT_MODEL_CACHE_SIZE):
+        self.model_dir = model_dir
+        self.max_bots = max_bots
+        self._classifiers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, bot_id):
+        return os.path.join(self.model_dir, f"bot_{bot_id}")
+
+    def get(self, bot_id):
+        """The bot's trained classifier, or None if it has not been trained."""
+        try:
+            version = os.stat(os.path.join(self.path(bot_id), "meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._classifiers.get(bot_id)
+            if cached is not None and cached[0] == version:
+                self._classifiers.move_to_end(bot_id)
+                return cached[1]
+        try:
+            classifier = IntentClassifier.load(self.path(bot_id))
+        except FileNotFoundError:  # replaced while loading
+            return None
+        self._put(bot_id, version, classifier)
+        return classifier
+
+    def train(self, bot_id, **kwargs):
+        """Train (or retrain) the bot's classifier and start serving it; returns the training metrics."""
+        classifier, metrics = train_intent_classifier(bot_id, self.path(bot_id), **kwargs)
+        self._put(bot_id, os.stat(os.path.join(self.path(bot_id), "meta.json")).st_mtime_ns, classifier)
+        return metrics
+
+    def _put(self, bot_id, version, classifier):
+        with self._lock:
+            self._classifiers[bot_id] = (version, classifier)
+            self._classifiers.move_to_end(bot_id)
+            while len(self._classifiers) > self.max_bots:
+                self._classifiers.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"bots": len(self._classifiers),
+                    "classifiers": {bot_id: c.stats() for bot_id, (_, c) in self._classifiers.items()}}
+
+
+intent_classifiers = IntentClassifierCache()
@@ -0,0 +1,108 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from .dataset_reader import DatasetError
+from .dataset_store import dataset_store
+from .model_cache import dataset_version
+
+INTENT_INDEX_CACHE_SIZE = int(os.environ.get("INTENT_INDEX_CACHE_SIZE", "64"))
+
+TOKEN_RE = re.compile(r"\w+")
+STOP_WORDS = frozenset("a an the to from of in on at for my me i you is are be can please and or".split())
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+class IntentIndex:
+    """
+    BM25 inverted index over a bot's dataset questions.
+
+    Each posting stores its precomputed BM25 term weight, so scoring a query
+    only touches the postings of the query's terms and sums weights.
+    """
+
+    def __init__(self, questions, k1=1.5, b=0.75):
+        import numpy as np
+
+        self.questions = list(dict.fromkeys(q for q in questions if q))
+        postings = {}
+        doc_len = np.zeros(len(self.questions), dtype=np.float32)
+        for doc_id, question in enumerate(self.questions):
+            tokens = tokenize(question)
+            doc_len[doc_id] = len(tokens)
+            for term in tokens:
+                tf = postings.setdefault(term, {})
+                tf[doc_id] = tf.get(doc_id, 0) + 1
+
+        n_docs = len(self.questions)
+        avg_len = float(doc_len.mean()) if n_docs else 0.0
+        norm = k1 * (1 - b + b * doc_len / max(avg_len, 1e-9))
+        self.postings = {}
+        for term, tf in postings.items():
+            ids = np.fromiter(tf.keys(), dtype=np.int32, count=len(tf))
+            freqs = np.fromiter(tf.values(), dtype=np.float32, count=len(tf))
+            idf = np.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            self.postings[term] = (ids, (idf * freqs * (k1 + 1) / (freqs + norm[ids])).astype(np.float32))
+
+    def __len__(self):
+        return len(self.questions)
+
+    def search(self, text, top_k=5):
+        """Ranked [{"intent": question, "score": bm25}] for the questions sharing terms with `text`."""
+        import numpy as np
+
+        hits = [self.postings[t] for t in dict.fromkeys(tokenize(text)) if t in self.postings]
+        if not hits:
+            return []
+        ids = np.concatenate([h[0] for h in hits])
+        weights = np.concatenate([h[1] for h in hits])
+        candidates, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype(np.float32)
+        k = min(top_k, len(candidates))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [{"intent": self.questions[candidates[i]], "score": round(float(scores[i]), 4)} for i in best]
+
+
+class IntentIndexCache:
+    """Per-bot IntentIndex cache, rebuilt when the dataset file changes; LRU bounded."""
+
+    def __init__(self, max_bots=INTENT_INDEX_CACHE_SIZE):
+        self.max_bots = max_bots
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, bot_id, dataset_path):
+        version = dataset_version(dataset_path)
+        with self._lock:
+            cached = self._indexes.get(bot_id)
+            if cached is not None and cached[0] == version:
+                self._indexes.move_to_end(bot_id)
+                return cached[1]
+        return self.build(bot_id, dataset_path, version)
+
+    def build(self, bot_id, dataset_path, version=None):
+        version = version or dataset_version(dataset_path)
+        columns = dataset_store.columns(dataset_path)
+        column = next((c for c in ("question", "sentence") if c in columns), None)
+        if column is None:
+            raise DatasetError("Dataset must contain 'question' or 'sentence' column")
+        questions = dataset_store.text_column(dataset_path, column)
+        index = IntentIndex(questions)
+        with self._lock:
+            self._indexes[bot_id] = (version, index)
+            self._indexes.move_to_end(bot_id)
+            while len(self._indexes) > self.max_bots:
+                self._indexes.popitem(last=False)
+        return index
+
+    def discard(self, bot_id):
+        with self._lock:
+            self._indexes.pop(bot_id, None)
+
+
+intent_indexes = IntentIndexCache()
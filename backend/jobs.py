@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .database import connection
+
+TRAINING_WORKERS = int(os.environ.get("TRAINING_WORKERS", "2"))
+MAX_JOBS_PER_USER = int(os.environ.get("MAX_JOBS_PER_USER", "1"))
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", "16"))
+
+ACTIVE_STATUSES = ("queued", "running", "cancelling")
+FINAL_STATUSES = ("finished", "failed", "cancelled")
+
+
+class JobLimitError(Exception):
+    """Raised when a user or the whole scheduler has too many active jobs."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when its job has been cancelled."""
+
+
+# ---------- persistence helpers (used by the API process and the workers) ----------
+def _update_job(job_id, **fields):
+    cols = ", ".join(f"{name}=?" for name in fields)
+    with connection() as conn:
+        conn.execute(f"UPDATE jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+
+
+def _job_status(job_id):
+    with connection() as conn:
+        row = conn.execute("SELECT status FROM jobs WHERE id=?", (job_id,)).fetchone()
+    return row[0] if row else None
+
+
+def add_job_event(job_id, data):
+    with connection() as conn:
+        conn.execute("INSERT INTO job_events (job_id, created_at, data) VALUES (?, ?, ?)",
+                     (job_id, time.time(), json.dumps(data)))
+
+
+def get_job(job_id):
+    with connection() as conn:
+        cur = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,))
+        row = cur.fetchone()
+        columns = [col[0] for col in cur.description]
+    if row is None:
+        return None
+    job = dict(zip(columns, row))
+    if job["result"]:
+        job["result"] = json.loads(job["result"])
+    return job
+
+
+def get_job_events(job_id, after_id=0):
+    with connection() as conn:
+        rows = conn.execute("SELECT id, data FROM job_events WHERE job_id=? AND id>? ORDER BY id",
+                            (job_id, after_id)).fetchall()
+    return [(event_id, json.loads(data)) for event_id, data in rows]
+
+
+# ---------- worker side ----------
+def _run_job(job_id, work):
+    """
+    Run `work(progress)` as job `job_id` and record its outcome; the
+    JSON-serializable result is stored on success. `progress` stores an
+    event and raises JobCancelled once the job has been cancelled.
+    """
+    status = _job_status(job_id)
+    if status == "cancelling":
+        _update_job(job_id, status="cancelled", finished_at=time.time())
+    if status != "queued":
+        return
+    _update_job(job_id, status="running", started_at=time.time())
+
+    def progress(event):
+        add_job_event(job_id, event)
+        if _job_status(job_id) == "cancelling":
+            raise JobCancelled()
+
+    try:
+        result = work(progress)
+    except JobCancelled:
+        _update_job(job_id, status="cancelled", finished_at=time.time())
+    except Exception as e:
+        _update_job(job_id, status="failed", finished_at=time.time(), error=str(e))
+    else:
+        _update_job(job_id, status="finished", finished_at=time.time(), result=json.dumps(result))
+
+
+def run_ner_training_job(job_id, dataset_path, output_path):
+    """Entry point executed in a pool process for NER training jobs."""
+    from .chatbot import train_spacy_model
+
+    def work(progress):
+        model_path, metrics = train_spacy_model(dataset_path, output_path=output_path, progress=progress)
+        return {"model_path": model_path, **metrics}
+
+    _run_job(job_id, work)
+
+
+def run_ner_update_job(job_id, bot_id, model_path, dataset_path):
+    """Entry point executed in a pool process for incremental NER updates on new annotations."""
+    from .annotations import update_ner_model
+
+    def work(progress):
+        path, metrics = update_ner_model(bot_id, model_path, dataset_path=dataset_path, progress=progress)
+        return {"model_path": path, **metrics}
+
+    _run_job(job_id, work)
+
+
+def run_annotate_batch_job(job_id, bot_id, dataset_path, batch_size, n_process):
+    """Entry point executed in a pool process for dataset pre-annotation jobs."""
+    from .annotations import annotate_dataset
+
+    _run_job(job_id, lambda progress: annotate_dataset(bot_id, dataset_path, batch_size=batch_size,
+                                                       n_process=n_process, progress=progress))
+
+
+# ---------- API side ----------
+def _process_alive(pid):
+    if pid == os.getpid():  # a recycled pid; the owner was an earlier process
+        return False
+    if os.name == "nt":  # os.kill would terminate it; without a safe check, assume it is gone
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobScheduler:
+    """
+    Runs training jobs in a bounded process pool so HTTP workers never block
+    on them. Job state lives in the jobs/job_events tables, which the pool
+    processes update directly; the scheduler enforces per-user and global
+    limits on queued + running jobs.
+    """
+
+    def __init__(self, max_workers=TRAINING_WORKERS, max_per_user=MAX_JOBS_PER_USER, max_queued=MAX_QUEUED_JOBS):
+        self.max_workers = max_workers
+        self.max_per_user = max_per_user
+        self.max_queued = max_queued
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # spawn: forking a threaded server process is not safe
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def recover(self):
+        """
+        Mark jobs left active by a server process that is gone as failed.
+        Jobs queued by sibling API workers that are still running, or by
+        processes on other hosts, are left alone.
+        """
+        host = socket.gethostname()
+        with connection() as conn:
+            rows = conn.execute(f"SELECT id, owner_host, owner_pid FROM jobs "
+                                f"WHERE status IN ({','.join('?' * len(ACTIVE_STATUSES))})",
+                                ACTIVE_STATUSES).fetchall()
+            orphaned = [job_id for job_id, owner_host, owner_pid in rows
+                        if owner_pid is None or (owner_host == host and not _process_alive(owner_pid))]
+            conn.executemany("UPDATE jobs SET status='failed', error='Server restarted', finished_at=? WHERE id=?",
+                             [(time.time(), job_id) for job_id in orphaned])
+
+    def submit(self, kind, fn, *args, bot_id=None, username=None):
+        """Queue `fn(job_id, *args)` in the pool and return the new job id."""
+        with self._lock:
+            placeholders = ",".join("?" * len(ACTIVE_STATUSES))
+            with connection() as conn:
+                active = conn.execute(f"SELECT COUNT(*) FROM jobs WHERE status IN ({placeholders})",
+                                      ACTIVE_STATUSES).fetchone()[0]
+                mine = conn.execute(f"SELECT COUNT(*) FROM jobs WHERE owner_username=? AND status IN ({placeholders})",
+                                    (username, *ACTIVE_STATUSES)).fetchone()[0]
+                if mine >= self.max_per_user:
+                    raise JobLimitError(f"User already has {mine} active job(s); the limit is {self.max_per_user}")
+                if active >= self.max_queued:
+                    raise JobLimitError("Too many jobs queued, try again later")
+
+                job_id = uuid.uuid4().hex
+                conn.execute("INSERT INTO jobs (id, kind, bot_id, owner_username, status, created_at, owner_host, "
+                             "owner_pid) VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                             (job_id, kind, bot_id, username, time.time(), socket.gethostname(), os.getpid()))
+
+            future = self.executor.submit(fn, job_id, *args)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+        return job_id
+
+    def cancel(self, job_id):
+        """Cancel a queued job immediately or ask a running one to stop after its current epoch."""
+        status = _job_status(job_id)
+        if status is None or status in FINAL_STATUSES:
+            return status
+        future = self._futures.get(job_id)
+        if status == "queued" and future is not None and future.cancel():
+            _update_job(job_id, status="cancelled", finished_at=time.time())
+            return "cancelled"
+        _update_job(job_id, status="cancelling")
+        return "cancelling"
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _on_done(self, job_id, future):
+        self._futures.pop(job_id, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        # A crashed worker never got to record its own outcome.
+        if error is not None and _job_status(job_id) in ACTIVE_STATUSES:
+            _update_job(job_id, status="failed", finished_at=time.time(), error=str(error) or type(error).__name__)
+
+
+scheduler = JobScheduler()
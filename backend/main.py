@@ -1,17 +1,36 @@
-from fastapi import FastAPI, Form, HTTPException, UploadFile, File
+from fastapi import Depends, FastAPI, Form, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from backend.database import get_connection, init_db
+from backend.database import connection, init_db
+from backend import annotations
+from backend.auth import authenticate, get_current_user, hash_password, oauth2_scheme, sessions
+from backend.nlp_registry import preload_from_env, registry
+from backend.model_cache import model_cache
+from backend.intent_index import intent_indexes
+from backend.intent_classifier import intent_classifiers, normalize_text
+from backend.dataset_store import convert as convert_dataset, dataset_store
+from backend.dataset_reader import DatasetError
+from backend.dataset_upload import (MAX_UPLOAD_BYTES, MultipartUpload, UploadTooLarge, release_upload, revise_dataset,
+                                    store_upload)
+from backend.inference import inference
+from backend.metrics import (HTTP_REQUESTS, HTTP_SECONDS, METRICS_TOKEN, PROFILE_REQUESTS, RequestProfiler, metrics,
+                             new_request_id)
+from backend.jobs import (JobLimitError, FINAL_STATUSES, get_job, get_job_events, run_annotate_batch_job,
+                          run_ner_training_job, run_ner_update_job, scheduler)
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import sqlite3
 import os
-import shutil
 import secrets
-import pandas as pd
-import spacy
+import asyncio
+import time
 import io
 import json
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
-init_db()
 
 # --- Allow frontend access ---
 app.add_middleware(
@@ -23,184 +42,617 @@ app.add_middleware(
 )
 
 UPLOAD_DIR = "uploads"
+# Upper bound for the top_k of /chat and /predict_intents
+MAX_TOP_K = int(os.environ.get("MAX_TOP_K", "50"))
+# Upper bound for the nlp.pipe worker processes one /annotate_batch run may start
+MAX_ANNOTATE_PROCESSES = int(os.environ.get("MAX_ANNOTATE_PROCESSES", "4"))
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+
+# Multipart framing around the file; requests larger than the limit plus this are refused unread
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.url.path == "/create_bot":
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+            return JSONResponse(status_code=413,
+                                content={"detail": f"Dataset exceeds the upload limit of {MAX_UPLOAD_BYTES} bytes"})
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """
+    Tag every request with an X-Request-ID and record its latency by route.
+    With PROFILE_REQUESTS=1, a request sent with `X-Profile: 1` is run
+    under cProfile and dumped to PROFILE_DIR/<request id>.prof.
+    """
+    request_id = new_request_id(request.headers.get("x-request-id"))
+    start = time.perf_counter()
+    if PROFILE_REQUESTS and request.headers.get("x-profile") == "1":
+        with RequestProfiler(request_id) as profiler:
+            response = await call_next(request)
+        response.headers["X-Profile-Path"] = profiler.path if profiler.active else "busy"
+    else:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    route = route.path if route is not None else "unmatched"
+    HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route)
+    HTTP_REQUESTS.inc(method=request.method, route=route, status=str(response.status_code))
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.on_event("startup")
+def start_up():
+    """
+    Create the tables, then warm up in the background: NLP_PRELOAD pipelines
+    load on a thread and the inference workers load theirs, while /login and
+    friends are already served. /ready turns 200 once both are warm.
+    """
+    init_db()
+    sessions.purge_expired()
+    preload_from_env(background=True)
+    inference.start()
+    scheduler.recover()
+
+
+@app.on_event("shutdown")
+def stop_jobs():
+    inference.shutdown()
+    scheduler.shutdown()
+
+
+# ---------------- METRICS ----------------
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics(request: Request):
+    """
+    Prometheus metrics. Aggregates only: routes are labelled by template
+    (/chat/{bot_id}), never by bot or user. Requires METRICS_TOKEN as a
+    bearer token when that is set.
+    """
+    if METRICS_TOKEN and not secrets.compare_digest(request.headers.get("authorization", ""),
+                                                    f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# ---------------- READINESS ----------------
+@app.get("/ready")
+def ready(response: Response):
+    """503 until the startup warm-up has finished; lists the models warm in this process and the inference pool."""
+    nlp = registry.readiness()
+    pool = inference.readiness()
+    is_ready = pool["warm"] and not nlp["preloading"] and not nlp["errors"]
+    response.status_code = 200 if is_ready else 503
+    return {"ready": is_ready, "nlp": nlp, "inference": pool,
+            "chatbot_models": model_cache.stats()["models"], "intent_classifiers": intent_classifiers.stats()["bots"]}
+
+
+# ---------------- NLP MODEL STATS ----------------
+@app.get("/nlp_stats")
+def nlp_stats(username: str = Depends(get_current_user)):
+    return registry.stats()
+
+
+# ---------------- DATASET LOOKUP ----------------
+def get_dataset_path(bot_id, username):
+    """Path of the bot's dataset; 404 unless the bot belongs to `username`."""
+    with connection() as conn:
+        row = conn.execute("SELECT filename FROM datasets WHERE bot_id=? AND owner_username=?",
+                           (bot_id, username)).fetchone()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Dataset not found for this bot")
+    dataset_path = os.path.join(UPLOAD_DIR, row[0])
+    if not os.path.exists(dataset_path):
+        raise HTTPException(status_code=404, detail="Dataset file missing")
+    return dataset_path
+
+
+def owned_bot_ids(username):
+    with connection() as conn:
+        return {row[0] for row in conn.execute("SELECT id FROM bots WHERE owner_username=?", (username,))}
+
+
+def require_bots(bot_ids, username):
+    """404 unless every bot in `bot_ids` belongs to `username`."""
+    bot_ids = {b for b in bot_ids if isinstance(b, int) and not isinstance(b, bool)}
+    if not bot_ids:
+        return
+    with connection() as conn:
+        owned = conn.execute(f"SELECT COUNT(*) FROM bots WHERE owner_username=? AND id IN ({','.join('?' * len(bot_ids))})",
+                             (username, *bot_ids)).fetchone()[0]
+    if owned != len(bot_ids):
+        raise HTTPException(status_code=404, detail="Bot not found")
+
+
 # ---------------- REGISTER ----------------
 @app.post("/register")
 def register(username: str = Form(...), password: str = Form(...)):
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-        conn.commit()
+        with connection() as conn:
+            conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hash_password(password)))
         return {"message": "User registered successfully"}
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Username already exists")
-    finally:
-        conn.close()
 
 
 # ---------------- LOGIN ----------------
 @app.post("/login")
 def login(username: str = Form(...), password: str = Form(...)):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username=? AND password=?", (username, password))
-    user = cur.fetchone()
-    conn.close()
-
-    if user:
-        token = secrets.token_hex(16)
-        return {"token": token, "username": username}
+    if authenticate(username, password):
+        token, expires_at = sessions.create(username)
+        return {"token": token, "token_type": "bearer", "username": username, "expires_at": expires_at}
     else:
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
 
-# ---------------- CREATE BOT ----------------
-@app.post("/create_bot")
-def create_bot(name: str = Form(...), file: UploadFile = File(...), username: str = Form(...)):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("INSERT INTO bots (name, owner_username) VALUES (?, ?)", (name, username))
-    bot_id = cur.lastrowid
+@app.post("/logout")
+def logout(token: str = Depends(oauth2_scheme)):
+    sessions.revoke(token)
+    return {"message": "Logged out"}
 
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
 
-    cur.execute(
-        "INSERT INTO datasets (bot_id, filename, owner_username) VALUES (?, ?, ?)",
-        (bot_id, file.filename, username),
-    )
-    conn.commit()
-    conn.close()
+# ---------------- LIST BOTS ----------------
+@app.get("/bots")
+def list_bots(username: str = Depends(get_current_user)):
+    with connection() as conn:
+        rows = conn.execute("SELECT id, name FROM bots WHERE owner_username=? ORDER BY id", (username,)).fetchall()
+    return [{"id": bot_id, "name": name} for bot_id, name in rows]
 
-    return {"message": "Bot created successfully", "bot_id": bot_id}
 
+# ---------------- CREATE BOT ----------------
+@app.post("/create_bot", openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {
+    "schema": {"type": "object", "required": ["name", "file"],
+               "properties": {"name": {"type": "string"}, "file": {"type": "string", "format": "binary"}}}}}}})
+async def create_bot(request: Request, username: str = Depends(get_current_user)):
+    """
+    Create a bot from a multipart form with `name` and a dataset `file`. The
+    body is parsed as it arrives and the file streamed, hashed and validated
+    into uploads/.incoming before anything is recorded, so a body over
+    MAX_UPLOAD_BYTES is refused (413) without being buffered, also when it
+    is sent chunked without a Content-Length.
+    """
+    try:
+        upload = MultipartUpload(request.headers.get("content-type", ""), UPLOAD_DIR, max_bytes=MAX_UPLOAD_BYTES)
+        try:
+            body_bytes = 0
+            async for chunk in request.stream():
+                body_bytes += len(chunk)
+                if body_bytes > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+                    raise UploadTooLarge(f"Dataset exceeds the upload limit of {MAX_UPLOAD_BYTES} bytes")
+                await run_in_threadpool(upload.feed, chunk)
+            fields, original_filename, (tmp_path, sha256, size) = await run_in_threadpool(upload.finish)
+        except BaseException:
+            upload.abort()
+            raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except DatasetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    name = fields.get("name")
+    if not name:
+        os.remove(tmp_path)
+        raise HTTPException(status_code=422, detail="Form field 'name' is required")
+    bot_id = await run_in_threadpool(register_bot, name, username, tmp_path, sha256, size, original_filename)
+    return {"message": "Bot created successfully", "bot_id": bot_id, "sha256": sha256, "size_bytes": size}
+
+
+def register_bot(name, username, tmp_path, sha256, size, original_filename):
+    """Record a bot for a received upload, move the file into storage and prepare its dataset."""
+    try:
+        with connection() as conn:
+            bot_id = conn.execute("INSERT INTO bots (name, owner_username) VALUES (?, ?)", (name, username)).lastrowid
+            filename = store_upload(tmp_path, sha256, bot_id, UPLOAD_DIR)
+            conn.execute(
+                "INSERT INTO datasets (bot_id, filename, owner_username, original_filename, content_hash, size_bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (bot_id, filename, username, original_filename, sha256, size),
+            )
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    file_path = os.path.join(UPLOAD_DIR, filename)
 
-# ---------------- FETCH DATASET PREVIEW ----------------
-@app.get("/dataset_preview/{bot_id}")
-def dataset_preview(bot_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT filename FROM datasets WHERE bot_id=?", (bot_id,))
-    row = cur.fetchone()
-    conn.close()
+    # Parse once into columnar storage and build the intent index now, so
+    # preview and /annotate never parse the raw upload
+    try:
+        convert_dataset(file_path)
+        intent_indexes.build(bot_id, file_path)
+    except ValueError:
+        pass  # unparsable or not a question dataset; the endpoints report it
+    return bot_id
+
+
+# ---------------- EDIT DATASET ROWS ----------------
+def revise_bot_dataset(bot_id, username, rows=(), remove=()):
+    """
+    Store a new revision of a bot's question/answer dataset with `rows`
+    appended and every row whose question is in `remove` dropped, and
+    derive its chatbot model from the current one instead of retraining.
+    """
+    # Held throughout, so concurrent edits of one bot apply one after the other
+    with model_cache.lock(bot_id):
+        dataset_path = get_dataset_path(bot_id, username)
+        try:
+            questions = dataset_store.text_column(dataset_path, "question")
+            dataset_store.column(dataset_path, "answer")
+        except KeyError as e:
+            raise HTTPException(status_code=400, detail=f"Dataset is missing column {e}")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Could not read dataset — check file format or encoding.")
+        remove = set(remove)
+        keep = [i for i, question in enumerate(questions) if question not in remove] if remove else None
+        removed = len(questions) - len(keep) if keep is not None else 0
+        if not rows and not removed:
+            return {"bot_id": bot_id, "added": 0, "removed": 0, "questions": len(questions)}
+        from backend.chatbot import dataset_hash, remove_artifact  # loads spaCy on first use
+
+        old_sha256 = dataset_hash(dataset_path)
 
-    if not row:
-        raise HTTPException(status_code=404, detail="Dataset not found")
+        try:
+            tmp_path, sha256, size = revise_dataset(dataset_path, UPLOAD_DIR, keep, rows)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except DatasetError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            with connection() as conn:
+                filename = store_upload(tmp_path, sha256, bot_id, UPLOAD_DIR)
+                conn.execute("UPDATE datasets SET filename=?, content_hash=?, size_bytes=? WHERE bot_id=?",
+                             (filename, sha256, size, bot_id))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        new_path = os.path.join(UPLOAD_DIR, filename)
+
+        model, seconds = model_cache.revise(bot_id, dataset_path, new_path, keep,
+                                            [row["question"] for row in rows], [row["answer"] for row in rows],
+                                            embed=inference.embed_texts)
+        convert_dataset(new_path)
+        intent_indexes.build(bot_id, new_path)
+        if os.path.abspath(new_path) != os.path.abspath(dataset_path):
+            old_filename = os.path.relpath(dataset_path, UPLOAD_DIR)
+            release_upload(old_filename, UPLOAD_DIR)
+            # The superseded model goes too, unless another bot's dataset has the same contents
+            with connection() as conn:
+                in_use = conn.execute("SELECT 1 FROM datasets WHERE content_hash=? OR filename=? LIMIT 1",
+                                      (old_sha256, old_filename)).fetchone()
+            if not in_use:
+                remove_artifact(old_sha256)
+
+    return {"bot_id": bot_id, "added": len(rows), "removed": removed, "questions": len(model.questions),
+            "sha256": sha256, "size_bytes": size, "update_seconds": round(seconds, 3)}
+
+
+@app.post("/bots/{bot_id}/rows")
+def add_dataset_rows(bot_id: int, data: dict, username: str = Depends(get_current_user)):
+    """Append question/answer pairs ({"rows": [{"question": ..., "answer": ...}]}); only they are embedded."""
+    rows = data.get("rows")
+    if not isinstance(rows, list) or not rows:
+        raise HTTPException(status_code=400, detail="rows must be a non-empty list")
+    for row in rows:
+        if (not isinstance(row, dict) or not isinstance(row.get("question"), str) or not row["question"].strip()
+                or not isinstance(row.get("answer"), str)):
+            raise HTTPException(status_code=400, detail="Every row needs a 'question' and an 'answer' string")
+    return revise_bot_dataset(bot_id, username, rows=[{"question": r["question"], "answer": r["answer"]} for r in rows])
+
+
+@app.delete("/bots/{bot_id}/rows")
+def delete_dataset_rows(bot_id: int, data: dict, username: str = Depends(get_current_user)):
+    """Remove every row whose question is listed in {"questions": [...]}."""
+    questions = data.get("questions")
+    if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+        raise HTTPException(status_code=400, detail="questions must be a list of strings")
+    return revise_bot_dataset(bot_id, username, remove=questions)
 
-    file_path = os.path.join(UPLOAD_DIR, row[0])
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
 
-    df = pd.read_csv(file_path)
-    return df.head(10).to_dict(orient="records")
+# ---------------- FETCH DATASET PREVIEW ----------------
+@app.get("/dataset_preview/{bot_id}")
+def dataset_preview(bot_id: int, username: str = Depends(get_current_user)):
+    file_path = get_dataset_path(bot_id, username)
+    try:
+        df = dataset_store.head(file_path, 10)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Could not read dataset — check file format or encoding.")
+    # Missing cells come back as NaN, which JSON cannot encode
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
 
 
 # ---------------- ANNOTATE SENTENCE ----------------
 @app.post("/annotate")
-def annotate(sentence: str = Form(...), bot_id: int = Form(...)):
+async def annotate(sentence: str = Form(...), bot_id: int = Form(...), username: str = Depends(get_current_user)):
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT filename FROM datasets WHERE bot_id=?", (bot_id,))
-        row = cur.fetchone()
-        conn.close()
-
-        if not row:
-            raise HTTPException(status_code=404, detail="Dataset not found for this bot")
+        dataset_path = await run_in_threadpool(get_dataset_path, bot_id, username)
+        # A trained intent classifier wins; otherwise intents are the closest dataset questions
+        classifier = await run_in_threadpool(intent_classifiers.get, bot_id)
+        if classifier is None:
+            try:
+                index = await run_in_threadpool(intent_indexes.get, bot_id, dataset_path)
+            except DatasetError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Could not read dataset — check file format or encoding.")
+            if not len(index):
+                raise HTTPException(status_code=400, detail="Empty dataset file uploaded")
+
+        # NER runs in the inference pool, batched with concurrent requests
+        entities = await inference.annotate(sentence)
+
+        if classifier is not None:
+            intents = classifier.lookup(sentence)
+            if intents is None:
+                # Embedded in the pool like /chat queries; the softmax head itself takes microseconds
+                vector = await inference.embed_query(normalize_text(sentence))
+                intents = classifier.predict_vectors(vector[None, :])[0]
+                classifier.remember(sentence, 5, intents)
+            source = "classifier"
+        else:
+            intents = index.search(sentence, top_k=5)
+            source = "dataset"
+        intent = intents[0]["intent"] if intents else "Unknown"
+
+        return {"intent": intent, "intents": intents, "intent_source": source, "entities": entities}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Annotation failed for bot %s", bot_id)
+        raise HTTPException(status_code=500, detail=f"Error during annotation: {str(e)}")
 
-        dataset_path = os.path.join(UPLOAD_DIR, row[0])
-        if not os.path.exists(dataset_path):
-            raise HTTPException(status_code=404, detail="Dataset file missing")
 
-        
+# ---------------- INTENT CLASSIFIER ----------------
+@app.post("/train_intent/{bot_id}")
+def train_intent(bot_id: int, username: str = Depends(get_current_user)):
+    """Train the bot's intent classifier on its annotations that have an intent."""
+    require_bots([bot_id], username)
+    try:
+        # Embedded in the inference pool, which already holds the vectors model
+        metrics = intent_classifiers.train(bot_id, embed=inference.embed_texts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Intent classifier trained", "bot_id": bot_id, **metrics}
+
+
+@app.post("/predict_intents/{bot_id}")
+def predict_intents(bot_id: int, data: dict, username: str = Depends(get_current_user)):
+    """Ranked intents for {"sentences": [...], "top_k": 5}, predicted in one batch."""
+    require_bots([bot_id], username)
+    sentences, top_k = data.get("sentences"), data.get("top_k", 5)
+    if not isinstance(sentences, list) or not all(isinstance(s, str) for s in sentences):
+        raise HTTPException(status_code=400, detail="sentences must be a list of strings")
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or not 1 <= top_k <= MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"top_k must be an integer from 1 to {MAX_TOP_K}")
+    classifier = intent_classifiers.get(bot_id)
+    if classifier is None:
+        raise HTTPException(status_code=400, detail="No intent classifier yet; run /train_intent first")
+    return {"predictions": classifier.predict(sentences, top_k, embed=inference.embed_texts)}
+
+
+@app.get("/intent_stats")
+def intent_stats(username: str = Depends(get_current_user)):
+    """Prediction cache stats of the caller's loaded intent classifiers."""
+    stats = intent_classifiers.stats()
+    owned = owned_bot_ids(username)
+    classifiers = {bot_id: c for bot_id, c in stats["classifiers"].items() if bot_id in owned}
+    return {"bots": len(classifiers), "classifiers": classifiers}
+
+
+# ---------------- BATCH ANNOTATE DATASET ----------------
+@app.post("/annotate_batch/{bot_id}")
+def annotate_batch(bot_id: int, batch_size: int = Form(256), n_process: int = Form(1),
+                   background: bool = Form(False), username: str = Depends(get_current_user)):
+    """
+    Run NER over every sentence of the bot's dataset and store the entity
+    suggestions as annotations. With background=true the work is queued as
+    a job (see /jobs/{id}) instead of running inside the request.
+    n_process may be at most MAX_ANNOTATE_PROCESSES.
+    """
+    if not 1 <= n_process <= MAX_ANNOTATE_PROCESSES:
+        raise HTTPException(status_code=400, detail=f"n_process must be an integer from 1 to {MAX_ANNOTATE_PROCESSES}")
+    if batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be a positive integer")
+    dataset_path = get_dataset_path(bot_id, username)
+    if background:
         try:
-          df = pd.read_csv(dataset_path, encoding='utf-8')
-        except Exception:
-            raise HTTPException(status_code=400, detail="Could not read CSV — check file format or encoding.")
+            job_id = scheduler.submit("annotate_batch", run_annotate_batch_job, bot_id, dataset_path,
+                                      batch_size, n_process, bot_id=bot_id, username=username)
+        except JobLimitError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        return {"job_id": job_id, "status": "queued"}
+    try:
+        return annotations.annotate_dataset(bot_id, dataset_path, batch_size=batch_size, n_process=n_process)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Empty dataset file uploaded")
 
-        possible_cols = [col.lower() for col in df.columns]
-        if "question" not in possible_cols and "sentence" not in possible_cols:
-            raise HTTPException(status_code=400, detail="Dataset must contain 'question' or 'sentence' column")
+# ---------------- SAVE ANNOTATIONS ----------------
+@app.post("/save_annotation")
+def save_annotation(data: dict, username: str = Depends(get_current_user)):
+    require_bots([data.get("bot_id")], username)
+    _, rejected = annotations.insert_annotations([data])
+    if rejected:
+        raise HTTPException(status_code=400, detail=rejected[0]["reason"])
+    return {"message": "Annotation saved successfully!"}
 
-        nlp = spacy.load("en_core_web_sm")
-        doc = nlp(sentence)
 
-        entities = [{"text": ent.text, "label": ent.label_} for ent in doc.ents]
+@app.post("/annotations/bulk")
+async def save_annotations_bulk(request: Request, bot_id: Optional[int] = None,
+                                username: str = Depends(get_current_user)):
+    """
+    Insert many annotations in one transaction. The body is a JSON list (or
+    {"annotations": [...]}) or JSONL of at most annotations.MAX_BULK_BYTES;
+    `bot_id` fills in records without one.
+    """
+    too_large = HTTPException(status_code=413, detail=f"Body exceeds the limit of {annotations.MAX_BULK_BYTES} "
+                                                      "bytes; send smaller batches")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > annotations.MAX_BULK_BYTES:
+        raise too_large
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > annotations.MAX_BULK_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    body = b"".join(chunks)
+    try:
+        records = annotations.parse_records(body, request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    bot_ids = [bot_id] + [r.get("bot_id") for r in records if isinstance(r, dict)]
+    await run_in_threadpool(require_bots, bot_ids, username)
+    inserted, rejected = await run_in_threadpool(annotations.insert_annotations, records, bot_id)
+    return {"inserted": inserted, "rejected": rejected}
+
+
+@app.get("/annotations/export/{bot_id}")
+def export_annotations(bot_id: int, format: str = "jsonl", username: str = Depends(get_current_user)):
+    require_bots([bot_id], username)
+    if format == "jsonl":
+        return StreamingResponse(annotations.export_jsonl(bot_id), media_type="application/x-ndjson",
+                                 headers={"Content-Disposition": f"attachment; filename=bot_{bot_id}.jsonl"})
+    if format == "docbin":
+        return Response(annotations.export_docbin(bot_id), media_type="application/octet-stream",
+                        headers={"Content-Disposition": f"attachment; filename=bot_{bot_id}.spacy"})
+    raise HTTPException(status_code=400, detail="format must be 'jsonl' or 'docbin'")
+
+
+# ---------------- TRAIN & CHAT ----------------
+@app.post("/train_bot/{bot_id}")
+def train_bot_endpoint(bot_id: int, username: str = Depends(get_current_user)):
+    dataset_path = get_dataset_path(bot_id, username)
+    try:
+        model, seconds = model_cache.get_or_train(bot_id, dataset_path, retrain=True, embed=inference.embed_texts)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Dataset is missing column {e}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Could not read dataset — check file format or encoding.")
+    return {
+        "message": "Bot trained successfully",
+        "bot_id": bot_id,
+        "questions": len(model.questions),
+        "index": model.index.kind,
+        "embedding_dtype": model.question_matrix.dtype,
+        "bytes_per_question": model.bytes_per_question(),
+        "train_seconds": round(seconds, 3),
+    }
+
+
+@app.post("/chat/{bot_id}")
+async def chat(bot_id: int, message: str = Form(...), top_k: int = Form(1), username: str = Depends(get_current_user)):
+    if not 1 <= top_k <= MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"top_k must be an integer from 1 to {MAX_TOP_K}")
+    try:
+        model, _ = await run_in_threadpool(lambda: model_cache.get_or_train(bot_id, get_dataset_path(bot_id, username),
+                                                                            embed=inference.embed_texts))
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Dataset is missing column {e}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Could not read dataset — check file format or encoding.")
+    # The message is embedded in the inference pool (batched across bots); only the index search runs here
+    query = await inference.embed_query(message)
+    matches = (await run_in_threadpool(model.search_vectors, query[None, :], top_k))[0]
+    reply = matches[0]["answer"] if matches else model.fallback_answer
+    return {"reply": reply, "matches": matches}
 
-        column_name = "question" if "question" in df.columns else "sentence"
-        matching_intents = [
-            q for q in df[column_name].astype(str).tolist() if any(word.lower() in q.lower() for word in sentence.split())
-        ]
-        intent = matching_intents[0] if matching_intents else "Unknown"
 
-        return {"intent": intent, "entities": entities}
+@app.get("/model_cache_stats")
+def model_cache_stats(username: str = Depends(get_current_user)):
+    return model_cache.stats()
 
-    except Exception as e:
-        print("ANNOTATE ERROR:", e)
-        raise HTTPException(status_code=500, detail=f"Error during annotation: {str(e)}")
 
+@app.get("/inference_stats")
+def inference_stats(username: str = Depends(get_current_user)):
+    return inference.stats()
 
-# ---------------- SAVE ANNOTATION ----------------
-@app.post("/save_annotation")
-def save_annotation(workspace_name: str = Form(...), text: str = Form(...),
-                    intent: str = Form(...), entities: str = Form(...)):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS annotations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            workspace_name TEXT,
-            text TEXT,
-            intent TEXT,
-            entities TEXT
-        )
-    """)
-    cur.execute("INSERT INTO annotations (workspace_name, text, intent, entities) VALUES (?, ?, ?, ?)",
-                (workspace_name, text, intent, entities))
-    conn.commit()
-    conn.close()
-    return {"message": "Annotation saved successfully"}
-# ---------------- FETCH USER BOTS ----------------
-@app.get("/bots")
-def get_bots(username: str):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, name FROM bots WHERE owner_username=?", (username,))
-    bots = [{"id": row[0], "name": row[1]} for row in cur.fetchall()]
-    conn.close()
-    return bots
-@app.post("/save_annotation")
-async def save_annotation(data: dict):
-    import sqlite3
-    conn = sqlite3.connect("chatbot.db")
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS annotations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            bot_id INTEGER,
-            sentence TEXT,
-            intent TEXT,
-            entities TEXT
-        )
-    """)
-    
-    bot_id = data.get("bot_id")
-    sentence = data.get("sentence")
-    intent = data.get("intent")
-    entities = json.dumps(data.get("entities", []))  # Store as JSON
-
-    c.execute(
-        "INSERT INTO annotations (bot_id, sentence, intent, entities) VALUES (?, ?, ?, ?)",
-        (bot_id, sentence, intent, entities)
-    )
-    conn.commit()
-    conn.close()
 
-    return {"message": "Annotation saved successfully!"}
+# ---------------- BACKGROUND JOBS ----------------
+def ner_model_path(bot_id):
+    return os.path.join("backend", "models", "ner", f"bot_{bot_id}")
+
+
+@app.post("/train_ner/{bot_id}")
+def train_ner(bot_id: int, username: str = Depends(get_current_user)):
+    dataset_path = get_dataset_path(bot_id, username)
+    try:
+        job_id = scheduler.submit("train_ner", run_ner_training_job, dataset_path, ner_model_path(bot_id),
+                                  bot_id=bot_id, username=username)
+    except JobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.post("/train_ner/{bot_id}/update")
+def update_ner(bot_id: int, username: str = Depends(get_current_user)):
+    """
+    Resume the bot's trained NER model on annotations added since its last
+    training (with rehearsal on earlier data) instead of a full retrain.
+    """
+    dataset_path = get_dataset_path(bot_id, username)
+    model_path = ner_model_path(bot_id)
+    if not os.path.exists(os.path.join(model_path, "meta.json")):
+        raise HTTPException(status_code=400, detail="No trained NER model yet; run /train_ner first")
+    try:
+        job_id = scheduler.submit("update_ner", run_ner_update_job, bot_id, model_path, dataset_path,
+                                  bot_id=bot_id, username=username)
+    except JobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job_id, "status": "queued"}
+
+
+def get_user_job(job_id, username):
+    job = get_job(job_id)
+    if not job or job["owner_username"] != username:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str, username: str = Depends(get_current_user)):
+    return get_user_job(job_id, username)
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str, username: str = Depends(get_current_user)):
+    get_user_job(job_id, username)
+    status = scheduler.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, "status": status}
+
+
+@app.get("/jobs/{job_id}/events")
+def job_events(job_id: str, last_event_id: int = 0, poll_interval: float = 0.5,
+               username: str = Depends(get_current_user)):
+    """
+    Server-sent events: one `progress` event per epoch, then a final `status`
+    event. The stream polls from the event loop (poll_interval is clamped to
+    0.1-5 s), so a connected client does not hold a threadpool thread.
+    """
+    get_user_job(job_id, username)
+    poll_interval = min(max(poll_interval, 0.1), 5.0)
+
+    async def stream():
+        last_id = last_event_id
+        while True:
+            for event_id, data in await run_in_threadpool(get_job_events, job_id, last_id):
+                last_id = event_id
+                yield f"id: {event_id}\nevent: progress\ndata: {json.dumps(data)}\n\n"
+            job = await run_in_threadpool(get_job, job_id)
+            if job["status"] in FINAL_STATUSES:
+                # Drain events written between the last poll and completion.
+                for event_id, data in await run_in_threadpool(get_job_events, job_id, last_id):
+                    last_id = event_id
+                    yield f"id: {event_id}\nevent: progress\ndata: {json.dumps(data)}\n\n"
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+                return
+            await asyncio.sleep(poll_interval)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
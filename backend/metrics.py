@@ -0,0 +1,202 @@
+import os
+import time
+import uuid
+import bisect
+import cProfile
+import functools
+import threading
+
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "0") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join("backend", "profiles"))
+# When set, /metrics requires `Authorization: Bearer <METRICS_TOKEN>` (for the scraper)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Histogram with cumulative buckets, as Prometheus expects."""
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(bound))])} "
+                                 f"{cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(name, lambda: Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(name, lambda: Histogram(name, help_text, labels, buckets))
+
+    def _register(self, name, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+OPERATION_SECONDS = metrics.histogram("nlu_operation_duration_seconds",
+                                      "Time spent in instrumented operations.", labels=("operation",))
+OPERATION_ERRORS = metrics.counter("nlu_operation_errors_total",
+                                   "Instrumented operations that raised.", labels=("operation",))
+HTTP_SECONDS = metrics.histogram("nlu_http_request_duration_seconds",
+                                 "HTTP request latency by route.", labels=("method", "route"))
+HTTP_REQUESTS = metrics.counter("nlu_http_requests_total",
+                                "HTTP requests by route and status code.", labels=("method", "route", "status"))
+
+
+class timed:
+    """
+    Record how long an operation takes in nlu_operation_duration_seconds.
+    Use as a context manager (`with timed("db_transaction"):`) or a
+    decorator (`@timed("vector_search")`); exceptions are counted in
+    nlu_operation_errors_total and re-raised.
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        OPERATION_SECONDS.observe(time.perf_counter() - self._start, operation=self.operation)
+        if exc_type is not None:
+            OPERATION_ERRORS.inc(operation=self.operation)
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(self.operation):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+# ---------- per-request profiling ----------
+_profile_lock = threading.Lock()
+
+
+def new_request_id(header_value=None):
+    """The caller's X-Request-ID if it is a safe file name, else a fresh one."""
+    if header_value and len(header_value) <= 64 and header_value.replace("-", "").replace("_", "").isalnum():
+        return header_value
+    return uuid.uuid4().hex
+
+
+class RequestProfiler:
+    """
+    cProfile for a single request, written to PROFILE_DIR/<request_id>.prof
+    (open with pstats or snakeviz). Only one request is profiled at a time,
+    since Python allows one active profiler; `active` is False when another
+    request holds it. The profiler sees the event loop thread, so requests
+    interleaved on the loop appear too, while work handed to the thread or
+    inference pools shows up only as the awaiting call.
+    """
+
+    def __init__(self, request_id, profile_dir=PROFILE_DIR):
+        self.path = os.path.join(profile_dir, f"{request_id}.prof")
+        self.active = False
+        self._profiler = None
+
+    def __enter__(self):
+        if _profile_lock.acquire(blocking=False):
+            self.active = True
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.active:
+            try:
+                self._profiler.disable()
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._profiler.dump_stats(self.path)
+            finally:
+                _profile_lock.release()
+        return False
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MODEL_CACHE_MB = int(os.environ.get("MODEL_CACHE_MB", "512"))
+
+
+def dataset_version(dataset_path):
+    """Cheap version stamp for a dataset file (mtime + size); no file contents are read."""
+    st = os.stat(dataset_path)
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+class ModelCache:
+    """
+    In-process LRU cache of trained ChatBotModel instances keyed by
+    (bot_id, dataset version). The least recently used models are evicted
+    once the models' combined nbytes() exceeds `max_bytes`; the most recent
+    model is always kept.
+    """
+
+    def __init__(self, max_mb=MODEL_CACHE_MB):
+        self.max_bytes = max_mb * 1024 * 1024
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._bot_locks = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, bot_id, version):
+        with self._lock:
+            model = self._models.get((bot_id, version))
+            if model is None:
+                self._stats["misses"] += 1
+                return None
+            self._models.move_to_end((bot_id, version))
+            self._stats["hits"] += 1
+            return model
+
+    def put(self, bot_id, version, model):
+        with self._lock:
+            # A new dataset version replaces every older model of the same bot.
+            for key in [k for k in self._models if k[0] == bot_id and k != (bot_id, version)]:
+                self._remove(key)
+            self._models[(bot_id, version)] = model
+            self._models.move_to_end((bot_id, version))
+            self._sizes[(bot_id, version)] = model.nbytes()
+            while len(self._models) > 1 and sum(self._sizes.values()) > self.max_bytes:
+                self._remove(next(iter(self._models)))
+                self._stats["evictions"] += 1
+        return model
+
+    def discard(self, bot_id):
+        with self._lock:
+            for key in [k for k in self._models if k[0] == bot_id]:
+                self._remove(key)
+
+    def get_or_train(self, bot_id, dataset_path, retrain=False, embed=None):
+        """
+        Return the cached model for the bot's current dataset, training (or
+        loading the saved artifact) on a miss; `embed` embeds the questions
+        (see chatbot.ChatBotModel). Returns (model, seconds spent training,
+        or 0.0 on a cache hit).
+        """
+        version = dataset_version(dataset_path)
+        if not retrain:
+            model = self.get(bot_id, version)
+            if model is not None:
+                return model, 0.0
+        # Concurrent misses for one bot train it once.
+        with self.lock(bot_id):
+            model = None if retrain else self.get(bot_id, version)
+            if model is not None:
+                return model, 0.0
+            from .chatbot import train_bot  # loads the vectors model on first use
+
+            start = time.perf_counter()
+            model = train_bot(dataset_path, embed=embed)
+            return self.put(bot_id, version, model), time.perf_counter() - start
+
+    def lock(self, bot_id):
+        """The lock serializing training and revisions of one bot's model."""
+        with self._lock:
+            return self._bot_locks.setdefault(bot_id, threading.Lock())
+
+    def revise(self, bot_id, dataset_path, new_dataset_path, keep=None, questions=(), answers=(), embed=None):
+        """
+        Cache the model for `new_dataset_path`, a revision of `dataset_path`
+        keeping the rows at positions `keep` and appending the given pairs,
+        derived from the current model so only the added questions are
+        embedded (see chatbot.revise_bot). The caller must hold
+        lock(bot_id). Returns (model, seconds spent).
+        """
+        from .chatbot import revise_bot, train_bot
+
+        start = time.perf_counter()
+        model = self.get(bot_id, dataset_version(dataset_path))
+        if model is None:
+            model = train_bot(dataset_path, embed=embed)
+        model = revise_bot(model, new_dataset_path, keep, questions, answers, embed=embed)
+        return self.put(bot_id, dataset_version(new_dataset_path), model), time.perf_counter() - start
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "models": len(self._models),
+                    "bytes": sum(self._sizes.values()), "max_bytes": self.max_bytes}
+
+    def _remove(self, key):
+        self._models.pop(key, None)
+        self._sizes.pop(key, None)
+
+
+model_cache = ModelCache()
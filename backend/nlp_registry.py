@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .metrics import timed
+
+# Components each use case can live without. Excluded components are never
+# loaded, which saves both load time and memory.
+PROFILES = {
+    "full": (),
+    "ner": ("tagger", "parser", "attribute_ruler", "lemmatizer", "senter"),
+    "vectors": ("tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner", "senter"),
+}
+
+NER_MODEL = os.environ.get("NER_MODEL", "en_core_web_sm")
+VECTORS_MODEL = os.environ.get("VECTORS_MODEL", "en_core_web_md")
+
+MAX_MODELS = int(os.environ.get("NLP_MAX_MODELS", "4"))
+MEMORY_BUDGET_MB = int(os.environ.get("NLP_MEMORY_BUDGET_MB", "0"))  # 0 = no budget
+
+
+def _rss_bytes():
+    """Resident set size of this process, or 0 when it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+def _estimate_size(nlp, rss_delta):
+    """Best-effort memory footprint of a loaded pipeline."""
+    if rss_delta > 0:
+        return rss_delta
+    return int(nlp.vocab.vectors.data.nbytes)
+
+
+class _Entry:
+    def __init__(self, nlp, size, load_seconds):
+        self.nlp = nlp
+        self.size = size
+        self.load_seconds = load_seconds
+        self.refs = 0
+
+
+class NlpRegistry:
+    """
+    Process-wide cache of loaded spaCy pipelines.
+
+    Each (model, profile) pair is loaded once per worker process. Pipelines
+    are evicted least-recently-used first when more than `max_models` are
+    loaded or their estimated size exceeds `memory_budget_mb`; pipelines
+    currently held through `using()` are never evicted.
+    """
+
+    def __init__(self, max_models=MAX_MODELS, memory_budget_mb=MEMORY_BUDGET_MB):
+        self.max_models = max_models
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading = {}
+        self._preloading = set()
+        self._preload_errors = {}
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0,
+                       "load_seconds": 0.0, "hit_seconds": 0.0}
+
+    def get(self, name, profile="full"):
+        """Return the pipeline for `name`, loading it on first use."""
+        return self._acquire(name, profile, hold=False)
+
+    @contextmanager
+    def using(self, name, profile="full"):
+        """Borrow a pipeline, pinning it in the cache for the duration."""
+        nlp = self._acquire(name, profile, hold=True)
+        try:
+            yield nlp
+        finally:
+            with self._lock:
+                entry = self._entries.get((name, profile))
+                if entry is not None and entry.refs > 0:
+                    entry.refs -= 1
+                self._evict()
+
+    def preload(self, specs, background=False):
+        """
+        Load `specs` (iterable of "model" or "model:profile" strings) eagerly.
+        With background=True they load on a daemon thread and this returns at
+        once; `readiness()` reports them as preloading until they are warm.
+        """
+        keys = []
+        for spec in specs:
+            spec = spec.strip()
+            if spec:
+                name, _, profile = spec.partition(":")
+                keys.append((name, profile or "full"))
+        with self._lock:
+            self._preloading.update(keys)
+        if not background:
+            return self._preload(keys)
+        threading.Thread(target=self._preload, args=(keys,), name="nlp-preload", daemon=True).start()
+
+    def _preload(self, keys):
+        for name, profile in keys:
+            try:
+                self.get(name, profile)
+            except Exception as e:
+                with self._lock:
+                    self._preload_errors[f"{name}:{profile}"] = str(e)
+                    self._preloading.difference_update(keys)
+                raise
+            with self._lock:
+                self._preloading.discard((name, profile))
+
+    def loaded(self):
+        with self._lock:
+            return [{"model": name, "profile": profile, "size_bytes": e.size,
+                     "load_seconds": round(e.load_seconds, 4), "refs": e.refs}
+                    for (name, profile), e in self._entries.items()]
+
+    def readiness(self):
+        """Pipelines warm in this process, those still being preloaded, and preloads that failed."""
+        with self._lock:
+            return {"warm": [f"{name}:{profile}" for name, profile in self._entries],
+                    "preloading": [f"{name}:{profile}" for name, profile in sorted(self._preloading)],
+                    "errors": dict(self._preload_errors)}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+            stats["avg_load_seconds"] = round(stats["load_seconds"] / stats["loads"], 4) if stats["loads"] else 0.0
+            stats["avg_hit_seconds"] = round(stats["hit_seconds"] / stats["hits"], 6) if stats["hits"] else 0.0
+            stats["load_seconds"] = round(stats["load_seconds"], 4)
+            stats["hit_seconds"] = round(stats["hit_seconds"], 6)
+            stats["models"] = self.loaded()
+            return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # ---------- internals ----------
+    def _acquire(self, name, profile, hold):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown pipeline profile: {profile}")
+        key = (name, profile)
+        start = time.perf_counter()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if hold:
+                    entry.refs += 1
+                self._stats["hits"] += 1
+                self._stats["hit_seconds"] += time.perf_counter() - start
+                return entry.nlp
+            self._stats["misses"] += 1
+            # One loader per key; concurrent callers wait for it instead of loading twice.
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load(name, profile)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                if hold:
+                    entry.refs += 1
+                self._loading.pop(key, None)
+                self._evict()
+                return entry.nlp
+
+    def _load(self, name, profile):
+        import spacy  # imported with the first pipeline, not with the API
+
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        with timed("spacy_load"):
+            nlp = spacy.load(name, exclude=list(PROFILES[profile]))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats["loads"] += 1
+            self._stats["load_seconds"] += elapsed
+        return _Entry(nlp, _estimate_size(nlp, _rss_bytes() - rss_before), elapsed)
+
+    def _evict(self):
+        def over_budget():
+            if len(self._entries) > self.max_models:
+                return True
+            if self.memory_budget:
+                return sum(e.size for e in self._entries.values()) > self.memory_budget
+            return False
+
+        for key in list(self._entries):
+            if not over_budget():
+                break
+            if self._entries[key].refs == 0 and len(self._entries) > 1:
+                del self._entries[key]
+                self._stats["evictions"] += 1
+
+
+registry = NlpRegistry()
+
+
+def get_nlp(name, profile="full"):
+    """Shortcut for `registry.get`."""
+    return registry.get(name, profile)
+
+
+def preload_from_env(background=False):
+    """Preload pipelines listed in NLP_PRELOAD, e.g. "en_core_web_sm:ner,en_core_web_md:vectors"."""
+    registry.preload(os.environ.get("NLP_PRELOAD", "").split(","), background=background)
@@ -0,0 +1,308 @@
+import os
+import copy
+import json
+import time
+
+import numpy as np
+
+# "auto" uses the exact index for small bots and IVF once a bot has more
+# than ANN_MIN_ROWS questions.
+INDEX_KIND = os.environ.get("CHATBOT_INDEX", "auto")
+ANN_MIN_ROWS = int(os.environ.get("ANN_MIN_ROWS", "20000"))
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", "8"))
+# Quantized matrices are converted to float32 this many rows at a time during
+# search; small chunks stay in cache, which keeps int8 search near float32 speed
+SEARCH_CHUNK_ROWS = 1024
+
+
+def _normalize_rows(matrix):
+    """L2-normalize each row so cosine similarity becomes a dot product."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.maximum(norms, 1e-9)).astype(np.float32, copy=False)
+
+
+def _top_k(scores, k):
+    """Column indices of the k best scores in every row of `scores`, best first."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.intp)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def _inner_products(matrix, queries, rows=None, chunk_size=SEARCH_CHUNK_ROWS):
+    """
+    queries @ matrix[rows].T (all rows when None) for an ndarray or a
+    compact.QuantizedMatrix, which is read chunk_size rows at a time.
+    """
+    if isinstance(matrix, np.ndarray):
+        return queries @ (matrix if rows is None else matrix[rows]).T
+    n = len(matrix) if rows is None else len(rows)
+    scores = np.empty((len(queries), n), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        index = slice(start, start + chunk_size) if rows is None else rows[start:start + chunk_size]
+        scores[:, start:start + chunk_size] = matrix.dot(queries, index)
+    return scores
+
+
+def _empty_result(n_queries, k):
+    return np.full((n_queries, k), -1, dtype=np.intp), np.full((n_queries, k), -np.inf, dtype=np.float32)
+
+
+class ExactIndex:
+    """Brute-force inner-product search over a normalized embedding matrix."""
+
+    kind = "exact"
+
+    def __init__(self, matrix, **params):
+        self.matrix = matrix
+
+    def params(self):
+        return {}
+
+    def search(self, queries, k):
+        """
+        Return (indices, scores), each of shape (len(queries), min(k, rows)),
+        best first. Missing results are padded with index -1 and score -inf.
+        """
+        k = min(k, len(self.matrix))  # before allocating: k may come straight from a request
+        indices, scores = _empty_result(len(queries), max(k, 0))
+        if k <= 0:
+            return indices, scores
+        all_scores = _inner_products(self.matrix, queries)
+        best = _top_k(all_scores, k)
+        indices[:, :best.shape[1]] = best
+        scores[:, :best.shape[1]] = np.take_along_axis(all_scores, best, axis=1)
+        return indices, scores
+
+    def updated(self, matrix, keep=None):
+        """Index over `matrix` after rows were kept/appended (see IVFIndex.updated)."""
+        return ExactIndex(matrix)
+
+    def save(self, path):
+        pass
+
+    @classmethod
+    def load(cls, path, matrix, **params):
+        return cls(matrix)
+
+
+class IVFIndex:
+    """
+    Inverted-file index: questions are partitioned into `nlist` clusters with
+    spherical k-means and a query only scores the questions in its `nprobe`
+    closest clusters. Raising `nprobe` trades latency for recall; with
+    nprobe == nlist the search is exact.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, matrix, nlist=None, nprobe=IVF_NPROBE, n_iter=10, sample_size=50000, seed=0):
+        self.matrix = matrix
+        self.nprobe = nprobe
+        n = len(matrix)
+        self.nlist = max(1, min(nlist or int(np.sqrt(n)), n)) if n else 1
+        self.n_iter = n_iter
+        self.seed = seed
+        if n:
+            self.centroids = self._train(sample_size)
+            assign = self._assign(matrix)
+        else:
+            self.centroids = np.zeros((1, matrix.shape[1]), dtype=np.float32)
+            assign = np.zeros(0, dtype=np.intp)
+        self._set_lists(assign)
+
+    def params(self):
+        return {"nlist": self.nlist, "nprobe": self.nprobe, "n_iter": self.n_iter, "seed": self.seed}
+
+    def _train(self, sample_size):
+        rng = np.random.default_rng(self.seed)
+        data = self.matrix
+        if len(data) > sample_size:
+            data = data[np.sort(rng.choice(len(data), sample_size, replace=False))]
+        data = np.asarray(data, dtype=np.float32)
+        centroids = data[rng.choice(len(data), self.nlist, replace=False)].copy()
+        for _ in range(self.n_iter):
+            assign = self._assign(data, centroids)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=self.nlist)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            nonempty = counts > 0
+            sums = np.add.reduceat(data[order], starts[nonempty], axis=0)
+            centroids[nonempty] = _normalize_rows(sums)
+            # Re-seed empty clusters with random points so every list gets used.
+            if not nonempty.all():
+                centroids[~nonempty] = data[rng.choice(len(data), int((~nonempty).sum()), replace=False)]
+        return centroids
+
+    def _assign(self, data, centroids=None, chunk_size=8192):
+        centroids = self.centroids if centroids is None else centroids
+        assign = np.empty(len(data), dtype=np.intp)
+        for start in range(0, len(data), chunk_size):
+            chunk = np.asarray(data[start:start + chunk_size], dtype=np.float32)
+            assign[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+        return assign
+
+    def _set_lists(self, assign):
+        # CSR layout: the ids of list i are order[offsets[i]:offsets[i + 1]].
+        self.order = np.argsort(assign, kind="stable").astype(np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=self.nlist)))).astype(np.int64)
+
+    def assignments(self):
+        """Cluster id of every row, recovered from the inverted lists."""
+        assign = np.empty(len(self.order), dtype=np.intp)
+        assign[self.order] = np.repeat(np.arange(self.nlist), np.diff(self.offsets))
+        return assign
+
+    def updated(self, matrix, keep=None):
+        """
+        Index over `matrix`, which holds the old rows listed in `keep` (all
+        of them when None), in order, followed by newly appended rows. New
+        rows join their closest existing cluster and removed rows leave
+        theirs; the centroids are not retrained, so after large changes a
+        full rebuild keeps the lists balanced.
+        """
+        assign = self.assignments()
+        if keep is not None:
+            assign = assign[keep]
+        index = copy.copy(self)
+        index.matrix = matrix
+        index._set_lists(np.concatenate([assign, self._assign(matrix[len(assign):])]))
+        return index
+
+    def search(self, queries, k):
+        k = min(k, len(self.matrix))
+        indices, scores = _empty_result(len(queries), max(k, 0))
+        if k <= 0:
+            return indices, scores
+        probes = _top_k(queries @ self.centroids.T, min(self.nprobe, self.nlist))
+        for row, lists in enumerate(probes):
+            candidates = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+            if not len(candidates):
+                continue
+            candidates.sort()
+            cand_scores = _inner_products(self.matrix, queries[row:row + 1], candidates)[0]
+            best = _top_k(cand_scores[None, :], k)[0]
+            indices[row, :len(best)] = candidates[best]
+            scores[row, :len(best)] = cand_scores[best]
+        return indices, scores
+
+    def save(self, path):
+        np.savez(os.path.join(path, "ivf.npz"), centroids=self.centroids, order=self.order, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path, matrix, nprobe=IVF_NPROBE, **params):
+        data = np.load(os.path.join(path, "ivf.npz"))
+        index = cls.__new__(cls)
+        index.matrix = matrix
+        index.centroids = data["centroids"]
+        index.order = data["order"]
+        index.offsets = data["offsets"]
+        index.nlist = len(index.centroids)
+        index.nprobe = nprobe
+        index.n_iter = params.get("n_iter", 10)
+        index.seed = params.get("seed", 0)
+        return index
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (ExactIndex, IVFIndex)}
+
+
+def resolve_kind(kind, n_rows):
+    if kind == "auto":
+        return "ivf" if n_rows > ANN_MIN_ROWS else "exact"
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {kind}")
+    return kind
+
+
+def build_index(matrix, kind=INDEX_KIND, **params):
+    """Build a search index of type `kind` ("exact", "ivf" or "auto") over `matrix`."""
+    return INDEX_TYPES[resolve_kind(kind, len(matrix))](matrix, **params)
+
+
+def load_index(path, matrix, info, kind=INDEX_KIND, **params):
+    """
+    Load the index saved next to `matrix`, described by `info` ({"kind", "params"}).
+    Falls back to building a fresh one when a different kind is requested.
+    """
+    wanted = resolve_kind(kind, len(matrix))
+    if info and info.get("kind") == wanted:
+        saved = {key: value for key, value in info.get("params", {}).items() if key != "nprobe"}
+        return INDEX_TYPES[wanted].load(path, matrix, **{**saved, **params})
+    return INDEX_TYPES[wanted](matrix, **params)
+
+
+# ---------- recall / latency evaluation ----------
+def evaluate(dataset_path, k=10, n_queries=500, nlists=(None,), nprobes=(1, 4, 8, 16, 32), dtypes=(), seed=0):
+    """
+    Compare IVF settings, and exact search over quantized embeddings (see
+    compact.QuantizedMatrix), against exact float32 search on a dataset's
+    questions.
+
+    Queries are sampled from the dataset itself. Returns one row per
+    setting with recall@k and per-query latency in milliseconds.
+    """
+    import pandas as pd
+    from .chatbot import embed_texts
+    from .compact import QuantizedMatrix
+
+    questions = pd.read_csv(dataset_path)["question"].astype(str).tolist()
+    matrix = embed_texts(questions)
+    rng = np.random.default_rng(seed)
+    queries = matrix[rng.choice(len(matrix), min(n_queries, len(matrix)), replace=False)]
+
+    def timed_search(index):
+        latencies = []
+        results = []
+        for q in queries:
+            start = time.perf_counter()
+            results.append(index.search(q[None, :], k)[0][0])
+            latencies.append((time.perf_counter() - start) * 1000)
+        return np.array(results), np.array(latencies)
+
+    def recall(found, truth):
+        return float(np.mean([len(set(a[a >= 0]) & set(b[b >= 0])) / max(1, (b >= 0).sum())
+                              for a, b in zip(found, truth)]))
+
+    truth, exact_ms = timed_search(ExactIndex(matrix))
+    rows = [{"index": "exact", "recall": 1.0, "p50_ms": float(np.percentile(exact_ms, 50)),
+             "p99_ms": float(np.percentile(exact_ms, 99))}]
+    for dtype in dtypes:
+        quantized = QuantizedMatrix.quantize(matrix, dtype)
+        found, ms = timed_search(ExactIndex(quantized))
+        rows.append({"index": "exact", "dtype": dtype, "bytes_per_row": quantized.nbytes / max(1, len(quantized)),
+                     "recall": recall(found, truth), "p50_ms": float(np.percentile(ms, 50)),
+                     "p99_ms": float(np.percentile(ms, 99))})
+    for nlist in nlists:
+        start = time.perf_counter()
+        index = IVFIndex(matrix, nlist=nlist, seed=seed)
+        build_seconds = time.perf_counter() - start
+        for nprobe in nprobes:
+            index.nprobe = nprobe
+            found, ms = timed_search(index)
+            rows.append({"index": "ivf", "nlist": index.nlist, "nprobe": nprobe,
+                         "build_seconds": round(build_seconds, 3), "recall": recall(found, truth),
+                         "p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99))})
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recall vs latency of the IVF index and quantized embeddings "
+                                                 "against exact search")
+    parser.add_argument("dataset", help="CSV file with a 'question' column")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--nlist", type=int, action="append", help="number of clusters (repeatable)")
+    parser.add_argument("--nprobe", default="1,4,8,16,32", help="comma-separated nprobe values")
+    parser.add_argument("--dtype", action="append", choices=("float16", "int8"),
+                        help="also score exact search over embeddings stored as this type (repeatable)")
+    args = parser.parse_args()
+
+    results = evaluate(args.dataset, k=args.k, n_queries=args.queries, nlists=args.nlist or (None,),
+                       nprobes=[int(n) for n in args.nprobe.split(",")], dtypes=args.dtype or ())
+    for row in results:
+        print(json.dumps(row))
@@ -0,0 +1,67 @@
+"""
+Cost of the auth path: PBKDF2 hash/verify time per iteration count, and
+token checks served from the session cache versus the sessions table.
+
+    python benchmarks/auth_bench.py --iterations 100000 300000 600000
+
+Runs against a throwaway database, never backend/chatbot.db.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import auth, database  # noqa: E402
+
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_hashing(iteration_counts, repeat):
+    results = []
+    for iterations in iteration_counts:
+        auth.PBKDF2_ITERATIONS = iterations
+        stored = auth.hash_password("correct horse battery staple", iterations)
+        results.append({
+            "iterations": iterations,
+            "hash_ms": round(time_per_call(lambda: auth.hash_password("pw", iterations), repeat), 2),
+            "verify_ms": round(time_per_call(lambda: auth.verify_password("correct horse battery staple", stored),
+                                             repeat), 2),
+        })
+    return results
+
+
+def bench_sessions(lookups):
+    store = auth.SessionStore()
+    token, _ = store.create("bench")
+    cached_ms = time_per_call(lambda: store.get(token), lookups)
+
+    def uncached():
+        store._cache.clear()
+        store.get(token)
+
+    return {"cached_lookup_us": round(cached_ms * 1000, 2),
+            "db_lookup_us": round(time_per_call(uncached, lookups) * 1000, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark password hashing and session lookups")
+    parser.add_argument("--iterations", type=int, nargs="+", default=[100000, 300000, 600000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_db()
+        result = {"hashing": bench_hashing(args.iterations, args.repeat), "sessions": bench_sessions(args.lookups)}
+        database.pool.close_all()
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,90 @@
+"""
+Cold-start check for the API: how long `import backend.main` takes and
+whether it pulls in heavy dependencies, which should only load on first
+use or during the startup warm-up (see /ready).
+
+Runs `python -X importtime` in a fresh interpreter and a scratch working
+directory, prints the slowest imports and exits 1 when a heavy module was
+imported or the import exceeds the budget.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --max-seconds 0.8 --top 30
+"""
+import os
+import sys
+import tempfile
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Top-level packages that must not be imported by `import backend.main`
+HEAVY_MODULES = ("numpy", "pandas", "pyarrow", "spacy", "thinc", "torch", "sklearn")
+
+
+def parse_importtime(output):
+    """[(module, self_us, cumulative_us, depth)] from `-X importtime` output, in import order."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():  # the header line
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def _importtime(code, workdir, env):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=workdir, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{code!r} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def measure(module="backend.main", runs=3):
+    """
+    Import `module` in `runs` fresh interpreters; returns the fastest run's
+    seconds, module count, heavy modules imported and per-module rows.
+    Modules a bare interpreter imports at startup (site, encodings, ...)
+    are not counted.
+    """
+    best = None
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))}
+    with tempfile.TemporaryDirectory(prefix="bot_import_") as workdir:
+        startup = {row[0] for row in _importtime("pass", workdir, env)}
+        for _ in range(runs):
+            rows = [row for row in _importtime(f"import {module}", workdir, env) if row[0] not in startup]
+            total = sum(row[2] for row in rows if row[3] == 0)
+            if best is None or total < best[0]:
+                best = (total, rows)
+    total, rows = best
+    imported = {row[0].split(".", 1)[0] for row in rows}
+    return {"import_seconds": round(total / 1e6, 4), "modules": len(rows),
+            "heavy_modules": [name for name in HEAVY_MODULES if name in imported], "rows": rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the API's import time and check for heavy imports")
+    parser.add_argument("--module", default="backend.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=20, help="slowest imports to list")
+    parser.add_argument("--max-seconds", type=float, default=1.0, help="fail when the import takes longer")
+    args = parser.parse_args()
+
+    result = measure(args.module, args.runs)
+    print(f"{'module':<48} {'self ms':>9} {'cumulative ms':>14}")
+    for name, self_us, cumulative_us, depth in sorted(result["rows"], key=lambda row: -row[2])[:args.top]:
+        print(f"{'  ' * depth + name:<48} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+    print(f"\nimport {args.module}: {result['import_seconds']:.3f}s, {result['modules']} modules")
+
+    failed = False
+    if result["heavy_modules"]:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(result['heavy_modules'])}")
+        failed = True
+    if result["import_seconds"] > args.max_seconds:
+        print(f"FAIL: import took longer than {args.max_seconds}s")
+        failed = True
+    sys.exit(1 if failed else 0)
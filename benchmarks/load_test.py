@@ -0,0 +1,101 @@
+"""
+Concurrent load test for /annotate and /chat.
+
+Fires `--requests` calls with `--concurrency` in flight against a running
+backend and reports latency percentiles and throughput:
+
+    uvicorn backend.main:app
+    python benchmarks/load_test.py --bot-id 1 --username alice --password secret --concurrency 32
+"""
+import time
+import json
+import random
+import asyncio
+import argparse
+
+import httpx
+import numpy as np
+
+SENTENCES = [
+    "Book a flight from Delhi to Mumbai",
+    "I want to cancel my ticket to Goa",
+    "What is the weather in Chennai tomorrow",
+    "Reserve a hotel in Jaipur for two nights",
+    "Can you book a train to Kolkata on Friday",
+    "Show me flights to Hyderabad next week",
+    "Change my booking to Bangalore",
+    "Is there a bus from Pune to Mumbai tonight",
+]
+
+
+def percentiles(latencies_ms):
+    if not latencies_ms:
+        return {}
+    values = np.asarray(latencies_ms)
+    stats = {f"p{p}": round(float(np.percentile(values, p)), 2) for p in (50, 90, 99)}
+    stats["mean"] = round(float(values.mean()), 2)
+    stats["max"] = round(float(values.max()), 2)
+    return stats
+
+
+async def run(url, endpoint, bot_id, total, concurrency, token, seed=0, transport=None):
+    """Run the load and return throughput and latency stats; `transport` lets callers test an app in-process."""
+    rng = random.Random(seed)
+    if endpoint == "annotate":
+        path = "/annotate"
+        payloads = [{"sentence": rng.choice(SENTENCES), "bot_id": bot_id} for _ in range(total)]
+    else:
+        path = f"/chat/{bot_id}"
+        payloads = [{"message": rng.choice(SENTENCES), "top_k": 3} for _ in range(total)]
+
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            payload = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, data=payload)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits, headers=headers,
+                                 transport=transport) as client:
+        # One warm-up call so model loading is not measured
+        await client.post(path, data=payloads[0])
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {"endpoint": endpoint, "requests": total, "concurrency": concurrency, "errors": errors,
+            "seconds": round(elapsed, 3), "requests_per_sec": round(len(latencies) / max(elapsed, 1e-9), 1),
+            "latency_ms": percentiles(latencies)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /annotate or /chat latency under concurrent load")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--bot-id", type=int, required=True)
+    parser.add_argument("--username", required=True, help="owner of the bot; used to log in")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--endpoint", choices=("annotate", "chat"), default="annotate")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    login = httpx.post(f"{args.url}/login", data={"username": args.username, "password": args.password})
+    login.raise_for_status()
+    result = asyncio.run(run(args.url, args.endpoint, args.bot_id, args.requests, args.concurrency,
+                             login.json()["token"]))
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,245 @@
+"""
+Benchmark harness for the chatbot, NER training and the API.
+
+Runs offline on synthetic datasets (see synthetic.py) inside a temporary
+working directory with its own database, uploads and model store, so the
+real backend/chatbot.db and uploads/ are never touched. Models come from
+NER_MODEL / VECTORS_MODEL as for the server.
+
+    python benchmarks/run.py --out results.json
+    python benchmarks/run.py --baseline results.json      # exit 1 on regressions
+
+Suites:
+  embed   questions embedded per second (embed_texts)
+  query   training time, model bytes per question and single-query latency
+          percentiles per dataset size
+  ner     NER training examples/sec and best F1
+  api     /annotate and /chat requests/sec and latency, in-process through
+          httpx's ASGI transport (no server needed)
+  startup seconds to import the API in a fresh interpreter and the heavy
+          modules it pulls in (see import_time.py)
+Peak RSS is recorded after every suite.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import platform
+import tempfile
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from synthetic import ner_rows, qa_rows, write_csv  # noqa: E402
+from load_test import percentiles  # noqa: E402
+
+SUITES = ("embed", "query", "ner", "api", "startup")
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def query_texts(n):
+    return [row["question"].rsplit(" #", 1)[0] for row in qa_rows(n, seed=1)]
+
+
+# ---------- suites ----------
+def bench_embed(rows):
+    from backend.chatbot import embed_texts
+
+    texts = [row["question"] for row in qa_rows(rows)]
+    start = time.perf_counter()
+    embed_texts(texts)
+    seconds = time.perf_counter() - start
+    return {"texts": rows, "seconds": round(seconds, 3), "texts_per_sec": round(rows / seconds, 1)}
+
+
+def bench_query(sizes, queries):
+    from backend.chatbot import ChatBotModel
+
+    results = {}
+    for size in sizes:
+        path = write_csv(qa_rows(size), f"qa_{size}.csv")
+        start = time.perf_counter()
+        model = ChatBotModel(path)
+        train_seconds = time.perf_counter() - start
+        latencies = []
+        for text in query_texts(queries):
+            start = time.perf_counter()
+            model.search(text, 3)
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[str(size)] = {"index": model.index.kind, "embedding_dtype": model.question_matrix.dtype,
+                              "train_seconds": round(train_seconds, 3),
+                              "bytes_per_question": model.bytes_per_question(), "latency_ms": percentiles(latencies)}
+    return results
+
+
+def bench_ner(rows, epochs):
+    from backend.chatbot import train_spacy_model
+
+    path = write_csv(ner_rows(rows), f"ner_{rows}.csv")
+    events = []
+    start = time.perf_counter()
+    _, metrics = train_spacy_model(path, output_path=os.path.join("models", "ner_bench"), progress=events.append,
+                                   max_epochs=epochs, patience=epochs)
+    seconds = time.perf_counter() - start
+    per_epoch = [e["examples_per_sec"] for e in events]
+    return {"rows": rows, "epochs": metrics["epochs"], "f1": metrics["f1"], "seconds": round(seconds, 3),
+            "examples_per_sec": round(sum(per_epoch) / len(per_epoch), 1)}
+
+
+def bench_api(size, total, concurrency):
+    import httpx
+    from load_test import run
+    from backend.main import app
+    from backend.database import init_db
+    from backend.inference import inference
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            await client.post("/register", data={"username": "bench", "password": "bench"})
+            token = (await client.post("/login", data={"username": "bench", "password": "bench"})).json()["token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            path = write_csv(qa_rows(size), f"api_{size}.csv")
+            with open(path, "rb") as f:
+                response = await client.post("/create_bot", data={"name": "bench"}, headers=headers,
+                                             files={"file": (os.path.basename(path), f)})
+            bot_id = response.json()["bot_id"]
+            await client.post(f"/train_bot/{bot_id}", headers=headers)
+        results = {"dataset_rows": size}
+        for endpoint in ("annotate", "chat"):
+            result = await run("http://bench", endpoint, bot_id, total, concurrency, token, transport=transport)
+            results[endpoint] = {k: result[k] for k in ("requests", "concurrency", "errors", "requests_per_sec",
+                                                        "latency_ms")}
+        return results
+
+    init_db()  # the ASGI transport does not run the startup hook
+    inference.start()
+    try:
+        return asyncio.run(main())
+    finally:
+        inference.shutdown()
+
+
+def bench_startup(runs):
+    from import_time import measure
+
+    result = measure("backend.main", runs)
+    return {"import_seconds": result["import_seconds"], "modules": result["modules"],
+            "heavy_modules": result["heavy_modules"]}
+
+
+# ---------- baseline comparison ----------
+def flatten(result, prefix=""):
+    flat = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def direction(metric):
+    """+1 if higher is better, -1 if lower is better, 0 for informational values."""
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf == "max":  # a single outlier; too noisy to gate on
+        return 0
+    if leaf.endswith("per_sec"):
+        return 1
+    if ".latency_ms." in f".{metric}." or leaf in ("seconds", "train_seconds", "import_seconds", "peak_rss_mb",
+                                                   "bytes_per_question"):
+        return -1
+    return 0
+
+
+def compare(current, baseline, tolerance):
+    """Rows of (metric, baseline, current, relative change, regressed) for metrics present in both runs."""
+    current, baseline = flatten(current["results"]), flatten(baseline["results"])
+    rows = []
+    for metric, new in current.items():
+        old = baseline.get(metric)
+        sign = direction(metric)
+        if old is None or not sign or not old:
+            continue
+        change = (new - old) / abs(old)
+        rows.append((metric, old, new, change, sign * change < -tolerance))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmark suites and optionally compare to a baseline")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--embed-rows", type=int, default=20000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="dataset sizes for the query suite")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--ner-rows", type=int, default=2000)
+    parser.add_argument("--ner-epochs", type=int, default=3)
+    parser.add_argument("--api-rows", type=int, default=5000)
+    parser.add_argument("--api-requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--import-runs", type=int, default=3, help="fresh interpreters for the startup suite")
+    parser.add_argument("--out", help="write the results as JSON here")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown before failing")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out) if args.out else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix="bot_bench_") as workdir:
+        os.chdir(workdir)
+        from backend import database
+        database.DB_PATH = os.path.join(workdir, "bench.db")
+
+        from backend.nlp_registry import NER_MODEL, VECTORS_MODEL
+        report = {
+            "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                     "platform": platform.platform(), "cpus": os.cpu_count(), "ner_model": NER_MODEL,
+                     "vectors_model": VECTORS_MODEL, "args": {k: v for k, v in vars(args).items()
+                                                              if k not in ("out", "baseline")}},
+            "results": {},
+        }
+        runners = {
+            "embed": lambda: bench_embed(args.embed_rows),
+            "query": lambda: bench_query(args.sizes, args.queries),
+            "ner": lambda: bench_ner(args.ner_rows, args.ner_epochs),
+            "api": lambda: bench_api(args.api_rows, args.api_requests, args.concurrency),
+            "startup": lambda: bench_startup(args.import_runs),
+        }
+        for suite in args.suites:
+            print(f"running {suite}...", file=sys.stderr)
+            result = runners[suite]()
+            result["peak_rss_mb"] = peak_rss_mb()
+            report["results"][suite] = result
+        database.pool.close_all()
+
+    text = json.dumps(report, indent=2)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if baseline is not None:
+        rows = compare(report, baseline, args.tolerance)
+        print(f"\n{'metric':<44} {'baseline':>12} {'current':>12} {'change':>8}")
+        for metric, old, new, change, regressed in rows:
+            print(f"{metric:<44} {old:>12.2f} {new:>12.2f} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+        if any(row[4] for row in rows):
+            sys.exit(1)
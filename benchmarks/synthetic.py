@@ -0,0 +1,84 @@
+"""
+Synthetic datasets for the benchmarks: question/answer CSVs for the
+chatbot and text/entities CSVs for NER training, generated from templates
+with a fixed seed so runs are comparable.
+
+    python benchmarks/synthetic.py qa 50000 qa.csv
+    python benchmarks/synthetic.py ner 5000 ner.csv
+"""
+import csv
+import json
+import random
+import argparse
+
+CITIES = ["Delhi", "Mumbai", "Chennai", "Kolkata", "Goa", "Jaipur", "Pune", "Hyderabad", "Kochi", "Bangalore",
+          "Paris", "London", "Tokyo", "Berlin", "Madrid", "Rome", "Dubai", "Singapore", "Sydney", "Toronto"]
+DAYS = ["today", "tomorrow", "tonight", "on Monday", "on Friday", "next week", "this weekend", "on August 15th"]
+QUESTIONS = [
+    ("Book a flight from {a} to {b} {day}", "Your flight from {a} to {b} {day} is booked."),
+    ("Cancel my ticket to {b}", "Your ticket to {b} has been cancelled."),
+    ("What is the weather in {a} {day}", "It looks sunny in {a} {day}."),
+    ("Find a hotel in {b} for {n} nights", "Here are hotels in {b} for {n} nights."),
+    ("Is there a train from {a} to {b} {day}", "Trains from {a} to {b} run {day}."),
+    ("Show restaurants near {a}", "These restaurants are near {a}."),
+    ("Change my booking to {b} {day}", "Your booking is now for {b} {day}."),
+    ("How long is the flight from {a} to {b}", "The flight from {a} to {b} takes about {n} hours."),
+]
+NER_TEMPLATES = ["Book a flight from {a} to {b}", "I want to travel to {b} next week", "Cancel my trip to {a}",
+                 "Is it raining in {a}", "Hotels in {b} near the airport", "Train from {a} to {b} please"]
+
+
+def qa_rows(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        question, answer = rng.choice(QUESTIONS)
+        slots = {"a": rng.choice(CITIES), "b": rng.choice(CITIES), "day": rng.choice(DAYS), "n": rng.randint(1, 9)}
+        # The row number keeps every question distinct, as in a real dataset
+        yield {"question": f"{question.format(**slots)} #{i}", "answer": answer.format(**slots)}
+
+
+def ner_rows(n, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        template = rng.choice(NER_TEMPLATES)
+        slots = {"a": rng.choice(CITIES), "b": rng.choice(CITIES)}
+        text, entities, cursor = "", [], 0
+        # Fill the template left to right, recording each city's offsets
+        for literal, field in _split(template):
+            text += literal
+            if field:
+                start = len(text)
+                text += slots[field]
+                entities.append([start, len(text), "GPE"])
+        yield {"text": text, "entities": json.dumps(entities)}
+
+
+def _split(template):
+    parts, rest = [], template
+    while "{" in rest:
+        literal, _, tail = rest.partition("{")
+        field, _, rest = tail.partition("}")
+        parts.append((literal, field))
+    parts.append((rest, None))
+    return parts
+
+
+def write_csv(rows, path):
+    rows = iter(rows)
+    first = next(rows)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(first))
+        writer.writeheader()
+        writer.writerow(first)
+        writer.writerows(rows)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic benchmark dataset")
+    parser.add_argument("kind", choices=("qa", "ner"))
+    parser.add_argument("rows", type=int)
+    parser.add_argument("out")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_csv((qa_rows if args.kind == "qa" else ner_rows)(args.rows, args.seed), args.out)
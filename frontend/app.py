@@ -2,22 +2,26 @@ import streamlit as st
 import requests
 import pandas as pd
 import io
-import sys
-import os
 import json
 
-# Add backend folder to path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend")))
-from database import get_connection, init_db
-
-# Initialize database
-init_db()
-
 # ----------------------------
 # 🌐 Backend URL
 # ----------------------------
 BACKEND_URL = "http://127.0.0.1:8000"
 
+
+def auth_headers():
+    """Bearer token issued by /login; sent with every workspace request."""
+    return {"Authorization": f"Bearer {st.session_state.token}"}
+
+
+def require_session(res):
+    """Back to the login page when the backend rejects the token (e.g. it expired)."""
+    if res.status_code == 401:
+        for key in ("token", "username"):
+            st.session_state.pop(key, None)
+        st.rerun()
+
 # ----------------------------
 # 🔐 Login / Register Page
 # ----------------------------
@@ -67,13 +71,14 @@ def workspace():
     with tabs[0]:
         st.subheader("Upload Dataset")
         bot_name = st.text_input("Bot Name")
-        dataset = st.file_uploader("Upload your dataset (CSV/JSON)", type=["csv", "json"])
+        dataset = st.file_uploader("Upload your dataset (CSV/JSON/JSONL)", type=["csv", "json", "jsonl"])
         if st.button("Upload"):
             if not bot_name or not dataset:
                 st.warning("Please provide bot name and dataset file.")
             else:
-                data = {"name": bot_name, "username": st.session_state.username}
-                res = requests.post(f"{BACKEND_URL}/create_bot", data=data, files={"file": dataset})
+                res = requests.post(f"{BACKEND_URL}/create_bot", data={"name": bot_name}, files={"file": dataset},
+                                    headers=auth_headers())
+                require_session(res)
                 if res.status_code == 200:
                     st.success("✅ Bot created successfully and dataset uploaded!")
                     st.session_state.dataset_name = dataset.name
@@ -83,7 +88,8 @@ def workspace():
     # --- 2️⃣ Annotate ---
     with tabs[1]:
         st.subheader("🧠 Annotation & Model Integration")
-        res = requests.get(f"{BACKEND_URL}/bots", params={"username": st.session_state.username})
+        res = requests.get(f"{BACKEND_URL}/bots", headers=auth_headers())
+        require_session(res)
         if res.status_code != 200 or not res.json():
             st.warning("⚠️ No bots found. Please create one in the Upload tab first.")
             return
@@ -96,7 +102,7 @@ def workspace():
 
         # Select sentence
         st.markdown("### ✍️ Text Annotation")
-        dataset_preview = requests.get(f"{BACKEND_URL}/dataset_preview/{bot_id}")
+        dataset_preview = requests.get(f"{BACKEND_URL}/dataset_preview/{bot_id}", headers=auth_headers())
         sentences = [row.get("question") or row.get("sentence") for row in dataset_preview.json()] if dataset_preview.status_code == 200 else []
         selected_sentence = st.selectbox("Select sentence from dataset:", sentences)
         sentence = st.text_area("Sentence", selected_sentence, height=70)
@@ -106,7 +112,8 @@ def workspace():
             if not sentence.strip():
                 st.warning("Please enter or select a sentence.")
             else:
-                res = requests.post(f"{BACKEND_URL}/annotate", data={"sentence": sentence, "bot_id": bot_id})
+                res = requests.post(f"{BACKEND_URL}/annotate", data={"sentence": sentence, "bot_id": bot_id},
+                                    headers=auth_headers())
                 if res.status_code == 200:
                     result = res.json()
                     intent = result["intent"]
@@ -117,36 +124,30 @@ def workspace():
                     st.json(entities)
 
                     # --- Save annotation to DB ---
-                    conn = get_connection()
-                    cur = conn.cursor()
-                    cur.execute(
-                        "INSERT INTO annotations (bot_id, sentence, intent, entities) VALUES (?, ?, ?, ?)",
-                        (bot_id, sentence, intent, json.dumps(entities))
-                    )
-                    conn.commit()
-                    conn.close()
-                    st.success("✅ Annotation saved to database!")
-
-                    # --- Smart Intent Highlight ---
-                    sentence_lower = sentence.lower()
-                    intent_keywords = {
-                        "book_flight": ["book", "flight", "ticket", "plane"],
-                        "check_weather": ["weather", "temperature", "rain", "forecast"],
-                        "find_restaurant": ["restaurant", "food", "eat", "dinner", "lunch"]
-                    }
-                    active_intents = [i for i, words in intent_keywords.items() if any(w in sentence_lower for w in words)]
+                    save = requests.post(f"{BACKEND_URL}/save_annotation",
+                                         json={"bot_id": bot_id, "sentence": sentence, "intent": intent, "entities": entities},
+                                         headers=auth_headers())
+                    if save.status_code == 200:
+                        st.success("✅ Annotation saved to database!")
+                    else:
+                        st.error(save.json().get("detail", "Saving annotation failed"))
+
+                    # --- Ranked intents (trained classifier, or closest dataset questions) ---
+                    top_intents = result.get("intents", [])[:3]
 
                     # --- Normalize entity labels ---
                     entity_mapping = {"gpe": "location", "loc": "location", "org": "organization", "date": "date", "person": "person", "time": "date"}
                     entity_labels = [entity_mapping.get(e["label"].lower(), e["label"].lower()) for e in entities]
 
                     # --- Render Intent Buttons ---
-                    st.markdown("### 🎯 Select Intent")
+                    source = "classifier" if result.get("intent_source") == "classifier" else "dataset match"
+                    st.markdown(f"### 🎯 Select Intent ({source})")
                     intent_cols = st.columns(3)
-                    for idx, i in enumerate(["book_flight", "check_weather", "find_restaurant"]):
-                        color = "#6ee7b7" if i in active_intents else "#f0f0f0"
+                    for idx, candidate in enumerate(top_intents):
+                        color = "#6ee7b7" if idx == 0 else "#f0f0f0"
                         intent_cols[idx].markdown(
-                            f"<div style='background-color:{color};padding:10px;border-radius:8px;text-align:center;'>🧠 {i}</div>",
+                            f"<div style='background-color:{color};padding:10px;border-radius:8px;text-align:center;'>"
+                            f"🧠 {candidate['intent']} ({candidate['score']})</div>",
                             unsafe_allow_html=True
                         )
 
@@ -163,18 +164,31 @@ def workspace():
     # --- 3️⃣ Train & Test ---
     with tabs[2]:
         st.subheader("Train & Test Bot")
-        st.info("🚀 Training placeholder – ML model integration comes later.")
-        dataset = st.file_uploader("Upload dataset to train model", type=["csv"])
+        res = requests.get(f"{BACKEND_URL}/bots", headers=auth_headers())
+        require_session(res)
+        bots = res.json() if res.status_code == 200 else []
+        if not bots:
+            st.warning("⚠️ No bots found. Please create one in the Upload tab first.")
+            return
+        train_bot_name = st.selectbox("Select Bot", [b["name"] for b in bots], key="train_bot_select")
+        train_bot_id = next(b["id"] for b in bots if b["name"] == train_bot_name)
 
         if st.button("Train"):
-            if not dataset:
-                st.warning("Please upload a dataset file.")
+            res = requests.post(f"{BACKEND_URL}/train_bot/{train_bot_id}", headers=auth_headers())
+            if res.status_code == 200:
+                result = res.json()
+                st.success(f"✅ Model trained on {result['questions']} questions in {result['train_seconds']}s")
             else:
-                res = requests.post(f"{BACKEND_URL}/train_bot", files={"dataset": dataset})
-                if res.status_code == 200:
-                    st.success(f"✅ Model trained successfully! Accuracy: {res.json()['accuracy']}%")
-                else:
-                    st.error("Training failed.")
+                st.error(res.json().get("detail", "Training failed."))
+
+        if st.button("Train Intent Classifier"):
+            res = requests.post(f"{BACKEND_URL}/train_intent/{train_bot_id}", headers=auth_headers())
+            if res.status_code == 200:
+                result = res.json()
+                st.success(f"✅ Intent classifier trained on {result['examples']} annotations "
+                           f"({result['intents']} intents, dev accuracy {result['dev_accuracy']})")
+            else:
+                st.error(res.json().get("detail", "Training failed."))
 
         st.write("---")
         st.subheader("Test Bot Response")
@@ -183,7 +197,16 @@ def workspace():
             if not message:
                 st.warning("Please enter a message.")
             else:
-                st.info("🤖 (Simulated) Bot Reply: *Response from model will appear here later.*")
+                res = requests.post(f"{BACKEND_URL}/chat/{train_bot_id}", data={"message": message, "top_k": 3},
+                                    headers=auth_headers())
+                if res.status_code == 200:
+                    result = res.json()
+                    st.info(f"🤖 Bot Reply: {result['reply']}")
+                    if result["matches"]:
+                        st.markdown("🔎 Closest questions:")
+                        st.json(result["matches"])
+                else:
+                    st.error(res.json().get("detail", "Chat failed."))
 
 
 # ----------------------------
@@ -0,0 +1,57 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """API client on a fresh database in a scratch working directory (uploads/, models/)."""
+    from backend import auth, database
+    from backend.main import app
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uploads").mkdir()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(auth, "PBKDF2_ITERATIONS", 1000)
+    database.pool.close_all()
+    database.init_db()
+    yield TestClient(app)
+    database.pool.close_all()
+
+
+@pytest.fixture
+def login(client):
+    """login(username) registers the user and returns their Authorization header."""
+    def _login(username="alice", password="secret"):
+        client.post("/register", data={"username": username, "password": password})
+        token = client.post("/login", data={"username": username, "password": password}).json()["token"]
+        return {"Authorization": f"Bearer {token}"}
+    return _login
+
+
+@pytest.fixture
+def create_bot(client):
+    """create_bot(headers, content, filename) uploads a dataset and returns the new bot id."""
+    def _create_bot(headers, content=b"question,answer\nhi,hello\nbye,see you\n", filename="qa.csv", name="bot"):
+        response = client.post("/create_bot", data={"name": name}, files={"file": (filename, content)},
+                               headers=headers)
+        assert response.status_code == 200, response.text
+        return response.json()["bot_id"]
+    return _create_bot
+
+
+@pytest.fixture
+def vectors_model(tmp_path, monkeypatch):
+    """A tiny spaCy pipeline with 8-d vectors for a few words, installed as VECTORS_MODEL."""
+    import numpy as np
+    import spacy
+    from backend import chatbot, inference, intent_classifier
+
+    nlp = spacy.blank("en")
+    rng = np.random.default_rng(0)
+    for word in "hi hello bye thanks book cancel flight hotel weather today rain".split():
+        nlp.vocab.set_vector(word, rng.normal(size=8).astype(np.float32))
+    path = str(tmp_path / "vectors_model")
+    nlp.to_disk(path)
+    for module in (chatbot, inference, intent_classifier):
+        monkeypatch.setattr(module, "VECTORS_MODEL", path)
+    return path
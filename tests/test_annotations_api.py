@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+from backend import annotations, database
+
+
+def test_bulk_insert_and_export(client, login, create_bot):
+    headers = login()
+    bot_id = create_bot(headers)
+    body = "\n".join(json.dumps({"sentence": f"hello {i}", "intent": "greet"}) for i in range(5))
+    response = client.post(f"/annotations/bulk?bot_id={bot_id}", content=body,
+                           headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert response.json() == {"inserted": 5, "rejected": []}
+
+    exported = client.get(f"/annotations/export/{bot_id}", headers=headers).text.splitlines()
+    assert [json.loads(line)["sentence"] for line in exported] == [f"hello {i}" for i in range(5)]
+
+
+def test_bulk_body_over_the_cap_is_rejected(client, login, create_bot, monkeypatch):
+    headers = login()
+    bot_id = create_bot(headers)
+    monkeypatch.setattr(annotations, "MAX_BULK_BYTES", 100)
+    body = "\n".join(json.dumps({"sentence": f"hello {i}"}) for i in range(20))
+    response = client.post(f"/annotations/bulk?bot_id={bot_id}", content=body, headers=headers)
+    assert response.status_code == 413
+
+    # No Content-Length: the cap is enforced while the body streams in
+    response = client.post(f"/annotations/bulk?bot_id={bot_id}", content=(line.encode() for line in body.split("\n")),
+                           headers=headers)
+    assert response.status_code == 413
+
+
+def test_bulk_rejects_other_users_bots(client, login, create_bot):
+    alice_bot = create_bot(login("alice"))
+    bob = login("bob")
+    response = client.post(f"/annotations/bulk?bot_id={alice_bot}", json=[{"sentence": "hi"}], headers=bob)
+    assert response.status_code == 404
+
+    # bot_id inside a record is checked too
+    bob_bot = create_bot(bob)
+    response = client.post(f"/annotations/bulk?bot_id={bob_bot}", json=[{"sentence": "hi", "bot_id": alice_bot}],
+                           headers=bob)
+    assert response.status_code == 404
+
+
+def test_export_does_not_hold_a_connection_between_batches(client, login, create_bot, monkeypatch):
+    headers = login()
+    bot_id = create_bot(headers)
+    annotations.insert_annotations([{"bot_id": bot_id, "sentence": f"s{i}"} for i in range(25)])
+    # A single pooled connection: a paused export that kept it would starve every other request
+    monkeypatch.setattr(database, "pool", database.ConnectionPool(size=1))
+    monkeypatch.setattr(database, "BUSY_TIMEOUT_MS", 500)
+
+    rows = annotations.iter_annotations(bot_id, batch_size=10)
+    first = next(rows)
+    response = client.post("/save_annotation", json={"bot_id": bot_id, "sentence": "added mid-export"},
+                           headers=headers)
+    assert response.status_code == 200
+    sentences = [first["sentence"]] + [row["sentence"] for row in rows]
+    assert sentences == [f"s{i}" for i in range(25)] + ["added mid-export"]
+    database.pool.close_all()
+
+
+@pytest.fixture
+def ruler_ner_model(tmp_path, monkeypatch):
+    """A blank English pipeline whose entity_ruler tags city names, installed as NER_MODEL."""
+    import spacy
+    from backend import chatbot
+
+    nlp = spacy.blank("en")
+    nlp.add_pipe("entity_ruler").add_patterns([{"label": "CITY", "pattern": city} for city in ("Paris", "Rome")])
+    path = str(tmp_path / "ner_model")
+    nlp.to_disk(path)
+    monkeypatch.setattr(chatbot, "NER_MODEL", path)
+    return path
+
+
+def test_annotate_dataset_prelabels_new_sentences(client, login, create_bot, ruler_ner_model, monkeypatch):
+    bot_id = create_bot(login())
+    annotations.insert_annotations([{"bot_id": bot_id, "sentence": "fly to Rome"}])
+    dataset = "fly to Paris\nfly to Rome\nhello\nfly to Paris\n"
+    path = os.path.join("uploads", "sentences.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("sentence\n" + dataset)
+    monkeypatch.setattr(annotations, "INSERT_BATCH_SIZE", 1)
+    reports = []
+
+    summary = annotations.annotate_dataset(bot_id, path, batch_size=2, progress=reports.append)
+
+    assert (summary["sentences"], summary["inserted"], summary["skipped"]) == (4, 2, 2)
+    assert [report["inserted"] for report in reports] == [1, 2]
+    rows = {row["sentence"]: row["entities"] for row in annotations.iter_annotations(bot_id)}
+    assert rows["fly to Paris"] == [{"text": "Paris", "label": "CITY", "start": 7, "end": 12}]
+    assert rows["hello"] == []
+    assert rows["fly to Rome"] == []  # the existing annotation was left alone
+
+    summary = annotations.annotate_dataset(bot_id, path, skip_existing=False)
+    assert summary["inserted"] == 3  # duplicates within the file are still dropped
@@ -0,0 +1,78 @@
+from backend import auth, database
+
+
+def test_logout_revokes_the_token(client, login):
+    headers = login()
+    assert client.get("/bots", headers=headers).status_code == 200
+
+    assert client.post("/logout", headers=headers).status_code == 200
+
+    response = client.get("/bots", headers=headers)
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+
+def test_cached_token_is_served_without_the_database(client, monkeypatch):
+    store = auth.SessionStore()
+    token, _ = store.create("alice")
+    assert store.get(token) == "alice"
+
+    def no_database():
+        raise AssertionError("queried the sessions table")
+    monkeypatch.setattr(auth, "connection", no_database)
+    assert store.get(token) == "alice"
+    assert store.stats()["hits"] == 2
+
+
+def test_expired_sessions_are_rejected_and_purged(client, monkeypatch):
+    store = auth.SessionStore(ttl=60)
+    token, expires_at = store.create("alice")
+    now = expires_at + 1
+    monkeypatch.setattr(auth.time, "time", lambda: now)
+
+    assert store.get(token) is None
+    assert store.stats()["expired"] == 1
+    assert store.purge_expired() == 1
+    with database.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 0
+
+
+def test_revocation_by_another_worker_applies_after_revalidation(client, monkeypatch):
+    worker_a = auth.SessionStore(revalidate=30)
+    worker_b = auth.SessionStore(revalidate=30)
+    token, _ = worker_a.create("alice")
+    assert worker_b.get(token) == "alice"
+
+    worker_a.revoke(token)
+    assert worker_a.get(token) is None
+    assert worker_b.get(token) == "alice"  # still trusted from worker B's cache
+
+    now = auth.time.time() + 31
+    monkeypatch.setattr(auth.time, "time", lambda: now)
+    assert worker_b.get(token) is None
+    assert worker_b.stats()["revalidated"] == 1
+
+
+def test_session_survives_a_cache_miss(client):
+    token, _ = auth.SessionStore().create("alice")
+    # A fresh store stands in for a restarted worker: the token is found in the table
+    restarted = auth.SessionStore(max_entries=1)
+    assert restarted.get(token) == "alice"
+    assert restarted.stats()["misses"] == 1
+
+    restarted.create("bob")
+    assert restarted.stats()["cached"] == 1  # alice's entry was evicted
+    assert restarted.get(token) == "alice"
+
+
+def test_legacy_plaintext_password_is_rehashed_on_login(client):
+    with database.connection() as conn:
+        conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", ("carol", "plain"))
+
+    assert client.post("/login", data={"username": "carol", "password": "wrong"}).status_code == 401
+    assert client.post("/login", data={"username": "carol", "password": "plain"}).status_code == 200
+
+    with database.connection() as conn:
+        stored = conn.execute("SELECT password FROM users WHERE username='carol'").fetchone()[0]
+    assert stored.startswith(auth.HASH_SCHEME + "$")
+    assert auth.verify_password("plain", stored) == (True, False)
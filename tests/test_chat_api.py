@@ -0,0 +1,117 @@
+import pytest
+
+
+@pytest.mark.parametrize("top_k", [0, -1, 51, 50_000_000])
+def test_chat_rejects_top_k_out_of_range(client, login, create_bot, top_k):
+    headers = login()
+    bot_id = create_bot(headers)
+
+    response = client.post(f"/chat/{bot_id}", data={"message": "hi", "top_k": top_k}, headers=headers)
+
+    assert response.status_code == 400
+    assert "top_k" in response.json()["detail"]
+
+
+def test_predict_intents_rejects_top_k_out_of_range(client, login, create_bot):
+    headers = login()
+    bot_id = create_bot(headers)
+
+    response = client.post(f"/predict_intents/{bot_id}", json={"sentences": ["hi"], "top_k": 51}, headers=headers)
+
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def pool_embed(monkeypatch):
+    """Stands in for the inference pool's embed_texts; embedding inside the API process fails the test."""
+    import numpy as np
+    from backend import chatbot, main
+    from backend.model_cache import ModelCache
+
+    calls = []
+
+    def embed_texts(texts, batch_size=256):
+        texts = list(texts)
+        calls.append(texts)
+        vectors = np.stack([np.random.default_rng(sum(map(ord, t))).normal(size=8) for t in texts]).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def in_process(*args, **kwargs):
+        pytest.fail("embedded in the API process")
+
+    monkeypatch.setattr(main.inference, "embed_texts", embed_texts)
+    monkeypatch.setattr(chatbot, "embed_texts", in_process)
+    monkeypatch.setattr(main, "model_cache", ModelCache())
+    return calls
+
+
+def test_training_and_row_edits_embed_in_the_inference_pool(client, login, create_bot, pool_embed):
+    headers = login()
+    bot_id = create_bot(headers)
+
+    response = client.post(f"/train_bot/{bot_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert pool_embed == [["hi", "bye"]]
+
+    response = client.post(f"/bots/{bot_id}/rows", json={"rows": [{"question": "thanks", "answer": "welcome"}]},
+                           headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["questions"] == 3
+    assert pool_embed[1:] == [["thanks"]]
+
+    response = client.request("DELETE", f"/bots/{bot_id}/rows", json={"questions": ["bye"]}, headers=headers)
+    assert response.json()["questions"] == 2
+    assert len(pool_embed) == 2  # removing rows embeds nothing
+
+
+@pytest.mark.parametrize("n_process", [0, 5, 64])
+def test_annotate_batch_caps_n_process(client, login, create_bot, n_process):
+    headers = login()
+    bot_id = create_bot(headers)
+
+    response = client.post(f"/annotate_batch/{bot_id}", data={"n_process": n_process}, headers=headers)
+
+    assert response.status_code == 400
+    assert "n_process" in response.json()["detail"]
+
+
+QA = b"question,answer\nhi,Hello there!\nbook flight,Where to?\ncancel flight,Which booking?\nweather today,Sunny.\n"
+
+
+@pytest.fixture
+def local_inference(monkeypatch, vectors_model):
+    """Inference on a thread of the test process, so the tiny vectors model applies, and an empty model cache."""
+    from backend import main
+    from backend.inference import InferencePool
+    from backend.model_cache import ModelCache
+
+    pool = InferencePool(workers=0)
+    monkeypatch.setattr(main, "inference", pool)
+    monkeypatch.setattr(main, "model_cache", ModelCache())
+    yield pool
+    pool.shutdown()
+
+
+def test_chat_answers_from_the_cached_model(client, login, create_bot, local_inference):
+    from backend import main
+
+    headers = login()
+    bot_id = create_bot(headers, content=QA)
+
+    response = client.post(f"/chat/{bot_id}", data={"message": "book a flight"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["reply"] == "Where to?"
+    response = client.post(f"/chat/{bot_id}", data={"message": "weather today", "top_k": 2}, headers=headers).json()
+    assert response["reply"] == "Sunny."
+    assert len(response["matches"]) == 2
+    # Trained on the first message, served from the cache afterwards
+    assert main.model_cache.stats()["models"] == 1
+    assert main.model_cache.stats()["hits"] >= 1
+
+
+def test_chat_with_another_users_bot_is_not_found(client, login, create_bot, local_inference):
+    bot_id = create_bot(login("alice"), content=QA)
+
+    response = client.post(f"/chat/{bot_id}", data={"message": "hi"}, headers=login("bob"))
+
+    assert response.status_code == 404
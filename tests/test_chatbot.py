@@ -0,0 +1,73 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from backend import chatbot
+
+QA = "question,answer\nhi,Hello there!\nbook flight,Where to?\ncancel flight,Which booking?\nweather today,Sunny.\n"
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the columnar copy goes under uploads/
+    path = tmp_path / "qa.csv"
+    path.write_text(QA)
+    return str(path)
+
+
+def test_embed_texts_batches_and_reuses_duplicates(vectors_model):
+    import spacy
+
+    texts = ["book flight", "hi", "book flight", "weather today", "xyzzy"]
+    vectors = chatbot.embed_texts(texts, batch_size=2)
+
+    nlp = spacy.load(vectors_model)
+    for text, row in zip(texts[:4], vectors):
+        expected = nlp(text).vector
+        np.testing.assert_allclose(row, expected / np.linalg.norm(expected), rtol=1e-5)
+    assert not vectors[4].any()  # no known words: a zero row, not NaN
+    np.testing.assert_allclose(vectors, chatbot.embed_texts(texts, batch_size=256))
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_model_answers_with_the_closest_question(vectors_model, dataset, dtype):
+    model = chatbot.ChatBotModel(dataset, embedding_dtype=dtype, batch_size=2)
+
+    assert model.get_response("book a flight") == "Where to?"
+    assert model.get_responses(["hi", "weather today"]) == ["Hello there!", "Sunny."]
+    assert model.get_response("xyzzy") == chatbot.FALLBACK_ANSWER
+    matches = model.search("cancel flight", top_k=2)
+    assert [m["answer"] for m in matches] == ["Which booking?", "Where to?"]
+    assert matches[0]["score"] == pytest.approx(1.0, abs=0.01)
+
+
+def test_trained_model_is_saved_and_memory_mapped(vectors_model, dataset, tmp_path):
+    store = str(tmp_path / "store")
+    trained = chatbot.train_bot(dataset, store_dir=store)
+    path = chatbot.artifact_path(dataset, store)
+
+    assert trained.meta["dataset_sha256"] == chatbot.dataset_hash(dataset) == os.path.basename(path)
+    assert trained.meta["rows"] == 4
+    assert isinstance(trained.question_matrix.data, np.memmap)
+
+    # Same contents: the artifact is loaded instead of embedding again
+    def embed(texts):
+        pytest.fail("re-embedded a dataset that has an artifact")
+    again = chatbot.train_bot(dataset, store_dir=store, embed=embed)
+    assert again.get_response("book flight") == trained.get_response("book flight") == "Where to?"
+
+
+def test_artifact_of_another_version_is_refused(vectors_model, dataset, tmp_path):
+    store = str(tmp_path / "store")
+    chatbot.train_bot(dataset, store_dir=store)
+    path = chatbot.artifact_path(dataset, store)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    meta["artifact_version"] = chatbot.ARTIFACT_VERSION + 1
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    with pytest.raises(ValueError, match="artifact version"):
+        chatbot.ChatBotModel.load(path)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from backend.compact import PackedStrings, QuantizedMatrix
+
+
+def _unit_rows(n=500, dim=64, seed=0):
+    rows = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("dtype, atol", [("float32", 0), ("float16", 1e-3), ("int8", None)])
+def test_round_trip_error(dtype, atol):
+    rows = _unit_rows()
+    matrix = QuantizedMatrix.quantize(rows, dtype)
+    assert matrix.dtype == dtype
+    if atol is None:
+        # int8: every element within half a quantization step of its row
+        atol = matrix.scales[:, None] / 2 + 1e-7
+    assert np.all(np.abs(matrix[:] - rows) <= atol)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_scores_stay_cosines(dtype):
+    rows = _unit_rows()
+    matrix = QuantizedMatrix.quantize(rows, dtype)
+    scores = matrix.dot(rows)
+
+    assert scores.max() <= 1.0 and scores.min() >= -1.0
+    assert np.allclose(np.diag(scores), 1.0, atol=0.01)
+    assert np.abs(scores - rows @ rows.T).max() < 0.01
+
+
+def test_take_append_and_memory_mapped_load(tmp_path):
+    rows = _unit_rows(10)
+    matrix = QuantizedMatrix.quantize(rows[:6], "int8").take([0, 2]).append(rows[6:])
+    matrix.save(str(tmp_path), "vectors")
+    loaded = QuantizedMatrix.load(str(tmp_path), "vectors")
+
+    assert isinstance(loaded.data, np.memmap)
+    assert loaded.shape == (6, 64)
+    assert np.allclose(loaded[:], rows[[0, 2, 6, 7, 8, 9]], atol=0.01)
+
+
+def test_packed_strings():
+    strings = ["hello", "", "héllo wörld", "日本語"]
+    packed = PackedStrings.from_list(strings)
+
+    assert list(packed) == strings
+    assert packed[-1] == "日本語"
+    assert list(packed.take([3, 0])) == ["日本語", "hello"]
+    with pytest.raises(IndexError):
+        packed[4]
@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+from backend import database
+
+
+class FlakyConnection:
+    """A pooled connection whose rollback can be made to fail."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.fail_rollback = False
+        self.closed = False
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise sqlite3.OperationalError("disk I/O error")
+        self.conn.rollback()
+
+    def close(self):
+        self.closed = True
+        self.conn.close()
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(database, "BUSY_TIMEOUT_MS", 300)
+    get_connection = database.get_connection
+    monkeypatch.setattr(database, "get_connection", lambda: FlakyConnection(get_connection()))
+    pool = database.ConnectionPool(size=1)
+    yield pool
+    pool.close_all()
+
+
+def test_connections_are_reused_in_wal_mode(pool):
+    with pool.connection() as first:
+        assert first.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    with pool.connection() as second:
+        assert second is first
+
+
+def test_error_rolls_back_and_keeps_the_connection(pool):
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise ValueError("boom")
+    with pool.connection() as again:
+        assert again is conn
+        assert again.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_connection_whose_rollback_fails_is_discarded(pool):
+    with pytest.raises(ValueError):  # the original error, not the rollback's
+        with pool.connection() as broken:
+            broken.fail_rollback = True
+            raise ValueError("boom")
+
+    assert broken.closed
+    with pool.connection() as conn:  # the only slot was freed
+        assert conn is not broken
+
+
+def test_exhausted_pool_times_out(pool):
+    with pool.connection():
+        with pytest.raises(sqlite3.OperationalError, match="Timed out"):
+            with pool.connection():
+                pass
+
+
+def test_failed_connect_does_not_leak_a_slot(pool, monkeypatch):
+    get_connection = database.get_connection
+
+    def fail():
+        raise sqlite3.OperationalError("unable to open database file")
+    monkeypatch.setattr(database, "get_connection", fail)
+    with pytest.raises(sqlite3.OperationalError, match="unable to open"):
+        with pool.connection():
+            pass
+
+    monkeypatch.setattr(database, "get_connection", get_connection)
+    with pool.connection() as conn:
+        assert conn.execute("SELECT 1").fetchone() == (1,)
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+import spacy
+
+from backend import dataset_reader
+
+
+@pytest.fixture
+def nlp():
+    return spacy.blank("en")
+
+
+@pytest.mark.parametrize("value, reason", [
+    ("[(0, 5, 'CITY')", "not a valid JSON or Python literal"),
+    ("__import__('os').system('true')", "not a valid JSON or Python literal"),
+    ('{"start": 0, "end": 5, "label": "CITY"}', "must be a list"),
+    ("[[0, 5]]", r"not a \(start, end, label\) triple"),
+    ('[["0", 5, "CITY"]]', "non-integer offsets"),
+    ("[[true, 5, \"CITY\"]]", "non-integer offsets"),
+    ('[[0, 5, ""]]', "no label"),
+    ("[[0, 5, 7]]", "no label"),
+])
+def test_parse_entities_rejects_malformed_values(value, reason):
+    with pytest.raises(ValueError, match=reason):
+        dataset_reader.parse_entities(value)
+
+
+def test_parse_entities_accepts_json_literals_and_dicts():
+    assert dataset_reader.parse_entities('[[0, 5, "CITY"]]') == [(0, 5, "CITY")]
+    assert dataset_reader.parse_entities("[(0, 5, 'CITY')]") == [(0, 5, "CITY")]
+    assert dataset_reader.parse_entities([{"start": 0, "end": 5, "label": "CITY"}]) == [(0, 5, "CITY")]
+    assert dataset_reader.parse_entities("") == []
+
+
+@pytest.mark.parametrize("spans, reason", [
+    ([(0, 99, "CITY")], "outside the text"),
+    ([(-1, 5, "CITY")], "outside the text"),
+    ([(5, 5, "CITY")], "outside the text"),
+    ([(0, 3, "CITY")], "does not align"),
+    ([(0, 5, "CITY"), (0, 10, "PLACE")], "overlap"),
+])
+def test_make_doc_rejects_bad_spans(nlp, spans, reason):
+    with pytest.raises(ValueError, match=reason):
+        dataset_reader.make_doc(nlp, "Paris trip please", spans)
+
+
+def test_read_docs_keeps_valid_rows_and_reports_the_rest(tmp_path, nlp):
+    dataset = tmp_path / "ner.jsonl"
+    rows = [
+        {"text": "fly to Paris", "entities": [[7, 12, "CITY"]]},
+        {"text": "fly to Rome", "entities": [[7, 99, "CITY"]]},
+        {"text": "", "entities": []},
+        {"text": "fly to Oslo", "entities": "os.system('true')"},
+        {"text": "fly to Oslo", "entities": [[0, 3, "VERB"], [0, 6, "ACTION"]]},
+    ]
+    dataset.write_text("\n".join(json.dumps(row) for row in rows) + "\nnot json\n")
+
+    docs, rejected = dataset_reader.read_docs(str(dataset), nlp, chunk_size=2)
+
+    assert [[(ent.text, ent.label_) for ent in doc.ents] for doc in docs] == [[("Paris", "CITY")]]
+    assert [item["row"] for item in rejected] == [2, 3, 4, 5, 6]
+    assert "outside the text" in rejected[0]["reason"]
+    assert rejected[1]["reason"] == rejected[4]["reason"] == "missing text"
+    assert "not a valid" in rejected[2]["reason"]
+    assert rejected[3]["reason"] == "entity spans overlap"
+
+
+def test_csv_without_entities_column_is_a_dataset_error(tmp_path, nlp):
+    dataset = tmp_path / "ner.csv"
+    dataset.write_text("text\nfly to Paris\n")
+    with pytest.raises(dataset_reader.DatasetError):
+        dataset_reader.read_docs(str(dataset), nlp)
+
+
+def test_load_training_docs_caches_docs_and_rejections(tmp_path, nlp, monkeypatch):
+    dataset = tmp_path / "ner.csv"
+    dataset.write_text('text,entities\nfly to Paris,"[(7, 12, \'CITY\')]"\nfly to Rome,"[(7, 99, \'CITY\')]"\n')
+    cache_dir = str(tmp_path / "docbin")
+
+    docs, rejected = dataset_reader.load_training_docs(str(dataset), nlp, cache_dir=cache_dir)
+    assert len(docs) == 1 and [item["row"] for item in rejected] == [2]
+
+    def parse_again(*args, **kwargs):
+        pytest.fail("re-parsed a cached dataset")
+    monkeypatch.setattr(dataset_reader, "read_docs", parse_again)
+    cached_docs, cached_rejected = dataset_reader.load_training_docs(str(dataset), nlp, cache_dir=cache_dir)
+    assert [(ent.text, ent.label_) for ent in cached_docs[0].ents] == [("Paris", "CITY")]
+    assert cached_rejected == rejected
+
+    with pytest.raises(dataset_reader.DatasetError):
+        dataset_reader.load_training_docs(str(tmp_path / "missing.csv"), nlp, cache_dir=cache_dir)
@@ -0,0 +1,53 @@
+import os
+import threading
+
+import pytest
+
+from backend import dataset_store
+
+
+@pytest.fixture(params=["parquet", "pickle"])
+def store_dir(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_store, "COLUMNAR_DIR", str(tmp_path / "columnar"))
+    if request.param == "pickle":
+        monkeypatch.setattr(dataset_store, "_pq", None)
+    return tmp_path / "columnar"
+
+
+def test_concurrent_conversions_of_one_file_all_succeed(tmp_path, store_dir, monkeypatch):
+    dataset = tmp_path / "qa.csv"
+    dataset.write_text("question,answer\nhi,hello\nbye,see you\n")
+    threads = 4
+    # Every thread parses before any of them stores, so all race on the same destination
+    barrier = threading.Barrier(threads)
+    read_dataset = dataset_store.read_dataset
+
+    def parse_together(path, **kwargs):
+        df = read_dataset(path, **kwargs)
+        barrier.wait(timeout=10)
+        return df
+    monkeypatch.setattr(dataset_store, "read_dataset", parse_together)
+
+    results, errors = [], []
+
+    def run():
+        try:
+            results.append(dataset_store.convert(str(dataset)))
+        except Exception as e:  # noqa: BLE001 - reported below
+            errors.append(e)
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    assert len(set(results)) == 1
+    assert os.listdir(store_dir) == [os.path.basename(results[0])]
+    assert dataset_store.DatasetStore().column(str(dataset), "answer") == ["hello", "see you"]
+
+
+def test_mixed_type_column_is_stored_as_strings(tmp_path, store_dir):
+    dataset = tmp_path / "rows.json"
+    dataset.write_text('[{"q": "a", "v": 1}, {"q": "b", "v": "two"}, {"q": "c", "v": null}]')
+    assert dataset_store.DatasetStore().column(str(dataset), "v") == ["1", "two", None]
@@ -0,0 +1,114 @@
+import os
+import json
+import asyncio
+
+from backend.dataset_upload import release_upload, store_upload
+
+
+def _received(upload_dir, name, content=b"question,answer\nhi,hello\n"):
+    incoming = os.path.join(upload_dir, ".incoming")
+    os.makedirs(incoming, exist_ok=True)
+    path = os.path.join(incoming, name)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def test_release_keeps_shared_legacy_dataset(tmp_path, monkeypatch):
+    # Datasets uploaded before content-addressed storage sit directly in the
+    # upload directory, and one file may back many bots.
+    monkeypatch.chdir(tmp_path)
+    legacy = tmp_path / "travel_bot.csv"
+    legacy.write_text("question,answer\nhi,hello\n")
+
+    assert release_upload("travel_bot.csv", str(tmp_path)) is False
+    assert legacy.exists()
+
+
+def test_release_deletes_object_after_last_link(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    upload_dir = str(tmp_path)
+    first = store_upload(_received(upload_dir, "a.csv"), "abc", 1, upload_dir)
+    second = store_upload(_received(upload_dir, "b.csv"), "abc", 2, upload_dir)
+    object_path = tmp_path / "objects" / "abc.csv"
+
+    assert release_upload(first, upload_dir) is True
+    assert object_path.exists()
+    assert (tmp_path / second).exists()
+
+    assert release_upload(second, upload_dir) is True
+    assert not object_path.exists()
+
+
+BOUNDARY = "testboundary"
+
+
+def _form_parts(name, filename, content, chunk_size=1024):
+    """A multipart/form-data body in chunks."""
+    yield (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"name\"\r\n\r\n{name}\r\n"
+           f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+           "Content-Type: text/csv\r\n\r\n").encode()
+    for start in range(0, len(content), chunk_size):
+        yield content[start:start + chunk_size]
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _post_chunked(headers, parts):
+    """
+    POST /create_bot straight to the ASGI app with a chunked body (no
+    Content-Length), as a server hands it over; the test client would buffer
+    it. Returns (status, body, chunks the app read).
+    """
+    from backend.main import app
+
+    parts, pulled, sent = iter(parts), [], []
+
+    async def receive():
+        chunk = next(parts, None)
+        if chunk is not None:
+            pulled.append(chunk)
+        return {"type": "http.request", "body": chunk or b"", "more_body": chunk is not None}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+             "path": "/create_bot", "raw_path": b"/create_bot", "query_string": b"", "root_path": "",
+             "client": ("testclient", 50000), "server": ("testserver", 80),
+             "headers": [(k.lower().encode(), v.encode()) for k, v in {
+                 **headers, "Content-Type": f"multipart/form-data; boundary={BOUNDARY}",
+                 "Transfer-Encoding": "chunked"}.items()]}
+    asyncio.run(app(scope, receive, send))
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return sent[0]["status"], json.loads(body), len(pulled)
+
+
+def test_create_bot_from_a_chunked_body(client, login):
+    content = b"question,answer\n" + b"".join(b"q%d,a%d\n" % (i, i) for i in range(500))
+    status, body, _ = _post_chunked(login(), _form_parts("chunked", "qa.csv", content))
+
+    assert status == 200, body
+    assert body["size_bytes"] == len(content)
+    assert os.listdir(os.path.join("uploads", ".incoming")) == []
+
+
+def test_chunked_upload_over_the_limit_is_refused_while_streaming(client, login, monkeypatch):
+    from backend import main
+
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 10_000)
+    content = b"question,answer\n" + b"q,a\n" * 100_000
+    status, body, pulled = _post_chunked(login(), _form_parts("big", "qa.csv", content))
+
+    assert status == 413, body
+    assert pulled < 20  # reading stopped at the limit instead of draining all ~400 chunks
+    assert os.listdir(os.path.join("uploads", ".incoming")) == []
+
+
+def test_create_bot_rejects_invalid_forms(client, login):
+    headers = login()
+    response = client.post("/create_bot", data={"name": "bot"}, files={"file": ("qa.txt", b"hello")}, headers=headers)
+    assert response.status_code == 400
+    response = client.post("/create_bot", data={"name": "bot"}, headers=headers)
+    assert response.status_code == 400
+    response = client.post("/create_bot", files={"file": ("qa.csv", b"question,answer\nhi,hello\n")}, headers=headers)
+    assert response.status_code == 422
@@ -0,0 +1,18 @@
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_api_leaves_heavy_dependencies_unloaded(tmp_path):
+    # A fresh interpreter, since this test session may have imported them already
+    code = ("import backend.main, sys, json; "
+            "print(json.dumps([m for m in ('spacy', 'pandas', 'numpy', 'pyarrow') if m in sys.modules]))")
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))}
+    proc = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True,
+                          timeout=120)
+
+    assert proc.returncode == 0, proc.stderr
+    assert json.loads(proc.stdout.splitlines()[-1]) == []
@@ -0,0 +1,88 @@
+import pytest
+
+from backend import annotations
+from backend.intent_classifier import IntentClassifier, IntentClassifierCache, train_intent_classifier
+
+VOCAB = "hi hello hey there book flight ticket cancel booking refund".split()
+
+
+@pytest.fixture
+def embed():
+    """Bag-of-words vectors over VOCAB; records every batch it is asked to embed."""
+    import numpy as np
+
+    calls = []
+
+    def embed_texts(texts):
+        texts = list(texts)
+        calls.append(texts)
+        vectors = np.zeros((len(texts), len(VOCAB)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                if word in VOCAB:
+                    vectors[row, VOCAB.index(word)] += 1
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+    embed_texts.calls = calls
+    return embed_texts
+
+
+def annotate(bot_id, pairs):
+    annotations.insert_annotations([{"bot_id": bot_id, "sentence": s, "intent": i} for s, i in pairs])
+
+
+GREET_AND_BOOK = [("Hi there", "greet"), ("hello", "greet"), ("hey there", "greet"),
+                  ("book a flight", "book"), ("book a ticket", "book"), ("flight ticket", "book"),
+                  ("no intent yet", "")]
+
+
+def test_trained_classifier_predicts_and_caches(client, tmp_path, embed):
+    annotate(1, GREET_AND_BOOK)
+    path = str(tmp_path / "intent")
+
+    classifier, metrics = train_intent_classifier(1, path, embed=embed)
+
+    assert (metrics["examples"], metrics["intents"], metrics["train_accuracy"]) == (6, 2, 1.0)
+    assert embed.calls[0][0] == "hi there"  # embedded in normalized form
+    results = classifier.predict(["HELLO  there", "a flight please"], top_k=2, embed=embed)
+    assert [r[0]["intent"] for r in results] == ["greet", "book"]
+    assert results[0][0]["score"] > results[0][1]["score"]
+
+    # Repeats differing only in case and spacing are answered from the cache
+    calls = len(embed.calls)
+    assert classifier.predict(["hello there"], top_k=2, embed=embed) == results[:1]
+    assert len(embed.calls) == calls
+    assert classifier.stats()["hits"] == 1
+
+    loaded = IntentClassifier.load(path)
+    assert loaded.predict(["a flight please"], top_k=2, embed=embed) == results[1:]
+
+
+def test_retraining_embeds_only_new_annotations(client, tmp_path, embed):
+    annotate(1, GREET_AND_BOOK)
+    path = str(tmp_path / "intent")
+    train_intent_classifier(1, path, embed=embed)
+
+    annotate(1, [("cancel my booking", "cancel"), ("refund booking", "cancel")])
+    classifier, metrics = train_intent_classifier(1, path, embed=embed)
+
+    assert embed.calls[1:] == [["cancel my booking", "refund booking"]]
+    assert (metrics["examples"], metrics["new_examples"], metrics["intents"]) == (8, 2, 3)
+    assert classifier.labels == ["greet", "book", "cancel"]
+    assert classifier.predict(["cancel booking"], embed=embed)[0][0]["intent"] == "cancel"
+
+
+def test_training_needs_two_intents(client, tmp_path, embed):
+    annotate(1, [("hello", "greet"), ("hi", "greet")])
+    with pytest.raises(ValueError, match="two different intents"):
+        train_intent_classifier(1, str(tmp_path / "intent"), embed=embed)
+
+
+def test_cache_serves_the_latest_training(client, tmp_path, embed):
+    annotate(1, GREET_AND_BOOK)
+    cache = IntentClassifierCache(model_dir=str(tmp_path / "intent"))
+    assert cache.get(1) is None
+
+    cache.train(1, embed=embed)
+    classifier = cache.get(1)
+    assert classifier is not None and cache.get(1) is classifier
+    assert IntentClassifierCache(model_dir=str(tmp_path / "intent")).get(1).labels == ["greet", "book"]
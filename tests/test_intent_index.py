@@ -0,0 +1,70 @@
+import pytest
+
+from backend import dataset_store
+from backend.dataset_reader import DatasetError
+from backend.intent_index import IntentIndex, IntentIndexCache, tokenize
+
+QUESTIONS = [
+    "book a flight to paris",
+    "cancel my flight",
+    "book a hotel",
+    "what is the weather today",
+    "book a flight",  # duplicate terms in a shorter question
+    "book a flight",
+    "",
+]
+
+
+def test_tokenize_drops_stop_words_and_punctuation():
+    assert tokenize("Can I book a Flight to Paris, please?") == ["book", "flight", "paris"]
+
+
+def test_search_ranks_by_bm25():
+    index = IntentIndex(QUESTIONS)
+    assert len(index) == 5  # duplicates and blanks dropped
+
+    results = index.search("book flight", top_k=3)
+
+    # The short question matching both terms wins; a longer one matching both is next
+    assert [r["intent"] for r in results] == ["book a flight", "book a flight to paris", "cancel my flight"]
+    assert results[0]["score"] > results[1]["score"] > results[2]["score"] > 0
+    # A rarer term outweighs a common one
+    assert index.search("hotel")[0]["intent"] == "book a hotel"
+    assert index.search("paris flight")[0]["intent"] == "book a flight to paris"
+
+
+def test_search_without_shared_terms_is_empty():
+    index = IntentIndex(QUESTIONS)
+    assert index.search("the to a please") == []
+    assert index.search("submarine") == []
+    assert IntentIndex([]).search("book") == []
+
+
+def test_search_returns_all_candidates_when_top_k_exceeds_them():
+    results = IntentIndex(QUESTIONS).search("flight", top_k=50)
+    assert sorted(r["intent"] for r in results) == ["book a flight", "book a flight to paris", "cancel my flight"]
+
+
+def test_cache_rebuilds_when_the_dataset_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_store, "COLUMNAR_DIR", str(tmp_path / "columnar"))
+    dataset = tmp_path / "qa.csv"
+    dataset.write_text("question,answer\nbook a flight,Where to?\n")
+    cache = IntentIndexCache(max_bots=1)
+
+    index = cache.get(1, str(dataset))
+    assert cache.get(1, str(dataset)) is index
+
+    dataset.write_text("question,answer\nbook a flight,Where to?\nbook a hotel,Which city?\n")
+    rebuilt = cache.get(1, str(dataset))
+    assert rebuilt is not index and len(rebuilt) == 2
+
+    cache.get(2, str(dataset))  # evicts bot 1
+    assert cache.get(1, str(dataset)) is not rebuilt
+
+
+def test_cache_requires_a_question_column(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_store, "COLUMNAR_DIR", str(tmp_path / "columnar"))
+    dataset = tmp_path / "qa.csv"
+    dataset.write_text("prompt,answer\nhi,hello\n")
+    with pytest.raises(DatasetError):
+        IntentIndexCache().get(1, str(dataset))
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from backend import chatbot
+
+CITIES = ["Paris", "Delhi", "Tokyo", "Jaipur", "Berlin"]
+
+
+@pytest.fixture
+def ner_dataset(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the DocBin cache and default model path are relative
+    rows = []
+    for i in range(20):
+        city = CITIES[i % len(CITIES)]
+        text = f"Book a flight to {city} please"
+        rows.append({"text": text, "entities": [[17, 17 + len(city), "GPE"]]})
+    rows.append({"text": "Broken row", "entities": [[0, 99, "GPE"]]})  # span past the end of the text
+    path = tmp_path / "ner.jsonl"
+    path.write_text("\n".join(json.dumps(row) for row in rows))
+    return str(path)
+
+
+def test_training_stops_early_and_saves_the_best_epoch(ner_dataset, tmp_path):
+    import spacy
+
+    events = []
+    model_path, metrics = chatbot.train_spacy_model(ner_dataset, output_path=str(tmp_path / "ner"),
+                                                    progress=events.append, max_epochs=30, patience=2)
+
+    assert [event["epoch"] for event in events] == list(range(1, metrics["epochs"] + 1))
+    assert metrics["epochs"] < 30
+    assert metrics["epochs"] - metrics["best_epoch"] == 2
+    assert metrics["f1"] == max(event["f1"] for event in events)
+    assert (metrics["train_examples"], metrics["dev_examples"], metrics["rejected_rows"]) == (16, 4, 1)
+
+    doc = spacy.load(model_path)("Book a flight to Paris please")
+    assert [(ent.text, ent.label_) for ent in doc.ents] == [("Paris", "GPE")]
+
+
+def test_progress_callback_can_abort_training(ner_dataset, tmp_path):
+    from backend.jobs import JobCancelled
+
+    def cancel(event):
+        raise JobCancelled()
+
+    with pytest.raises(JobCancelled):
+        chatbot.train_spacy_model(ner_dataset, output_path=str(tmp_path / "ner"), progress=cancel)
+    assert not (tmp_path / "ner").exists()
@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/nlp_stats", "/intent_stats", "/model_cache_stats", "/inference_stats"])
+def test_stats_require_a_session(client, path):
+    assert client.get(path).status_code == 401
+
+
+def test_intent_stats_only_list_the_callers_bots(client, login, create_bot, monkeypatch):
+    from backend import main
+
+    alice, bob = login("alice"), login("bob")
+    alice_bot, bob_bot = create_bot(alice), create_bot(bob)
+    cached = {alice_bot: {"labels": 2, "cached": 5}, bob_bot: {"labels": 3, "cached": 7}}
+    monkeypatch.setattr(main.intent_classifiers, "stats", lambda: {"bots": 2, "classifiers": cached})
+
+    assert client.get("/intent_stats", headers=alice).json() == {
+        "bots": 1, "classifiers": {str(alice_bot): {"labels": 2, "cached": 5}}}
+
+
+def test_metrics_token(client, monkeypatch):
+    from backend import main
+
+    assert client.get("/metrics").status_code == 200
+
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "bot_id=" not in response.text
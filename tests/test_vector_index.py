@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from backend import vector_index
+from backend.compact import QuantizedMatrix
+from backend.vector_index import ExactIndex, IVFIndex, _normalize_rows, build_index, load_index
+
+
+def _clustered(n=2000, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    points = centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim))
+    return _normalize_rows(points.astype(np.float32))
+
+
+def test_ivf_probing_every_list_matches_exact_search():
+    matrix = _clustered()
+    queries = _clustered(50, seed=1)
+    ivf = IVFIndex(matrix, nlist=16, nprobe=16)
+
+    exact_indices, exact_scores = ExactIndex(matrix).search(queries, 10)
+    ivf_indices, ivf_scores = ivf.search(queries, 10)
+
+    np.testing.assert_array_equal(ivf_indices, exact_indices)
+    np.testing.assert_allclose(ivf_scores, exact_scores, rtol=1e-5)
+
+
+def test_ivf_recall_probing_half_the_lists():
+    matrix = _clustered()
+    queries = _clustered(50, seed=1)
+    exact, _ = ExactIndex(matrix).search(queries, 10)
+    approx, _ = IVFIndex(matrix, nlist=16, nprobe=8).search(queries, 10)
+
+    recall = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approx, exact)])
+    assert recall >= 0.95
+
+
+def test_huge_k_is_capped_at_the_number_of_rows():
+    matrix = _clustered(5)
+    for index in (ExactIndex(matrix), IVFIndex(matrix, nlist=2, nprobe=2)):
+        indices, scores = index.search(matrix[:1], 10 ** 12)
+        assert indices.shape == scores.shape == (1, 5)
+        assert sorted(indices[0]) == list(range(5))
+
+
+def test_empty_index_and_non_positive_k():
+    empty = np.zeros((0, 8), dtype=np.float32)
+    indices, _ = ExactIndex(empty).search(np.ones((2, 8), dtype=np.float32), 3)
+    assert indices.shape == (2, 0)
+    indices, _ = ExactIndex(_clustered(5, dim=8)).search(np.ones((1, 8), dtype=np.float32), 0)
+    assert indices.shape == (1, 0)
+
+
+def test_ivf_over_a_quantized_matrix_survives_save_and_load(tmp_path):
+    matrix = QuantizedMatrix.quantize(_clustered(), "int8")
+    queries = _clustered(20, seed=1)
+    index = build_index(matrix, "ivf", nlist=16, nprobe=4)
+    index.save(str(tmp_path))
+
+    # nprobe is a search-time setting, not taken from the saved params
+    loaded = load_index(str(tmp_path), matrix, {"kind": "ivf", "params": index.params()}, "ivf", nprobe=4)
+    assert isinstance(loaded, IVFIndex)
+    for found, expected in zip(loaded.search(queries, 5), index.search(queries, 5)):
+        np.testing.assert_array_equal(found, expected)
+    # Asking for another kind builds that one instead
+    assert isinstance(load_index(str(tmp_path), matrix, {"kind": "ivf", "params": {}}, "exact"), ExactIndex)
+
+
+def test_updated_ivf_finds_kept_and_appended_rows():
+    matrix = _clustered()
+    index = IVFIndex(matrix, nlist=16, nprobe=16)
+    keep = np.arange(0, len(matrix), 2)
+    extra = _clustered(10, seed=2)
+    revised = np.concatenate([matrix[keep], extra])
+
+    updated = index.updated(revised, keep)
+    assert sorted(updated.order.tolist()) == list(range(len(revised)))
+    indices, scores = updated.search(extra, 1)
+    np.testing.assert_array_equal(indices[:, 0], np.arange(len(keep), len(revised)))
+    np.testing.assert_allclose(scores[:, 0], 1.0, atol=1e-5)
+
+
+@pytest.mark.parametrize("rows, expected", [(100, ExactIndex), (300, IVFIndex)])
+def test_auto_switches_to_ivf_above_ann_min_rows(monkeypatch, rows, expected):
+    monkeypatch.setattr(vector_index, "ANN_MIN_ROWS", 200)
+    assert isinstance(build_index(_clustered(rows), "auto"), expected)